@@ -0,0 +1,27 @@
+import json
+from decoders import DelayDiscounting
+from decoders.impulsivity_process import ImpulsivityProcess
+
+file = 'SampleData/DelayDiscounting.json'
+with open(file) as fp:
+    dlist = json.load(fp)
+
+obj = ImpulsivityProcess()
+
+result = obj.delaydiscounting_score(dlist)
+# the delayed reward was last chosen at 1 year
+assert result['dd_delay_index'] == 23, f"expected 23"
+assert result['dd_ed50_hours'] == 365 * 24, f"expected {365 * 24}"
+assert result['dd_trials'] == 5, f"expected 5"
+
+# the batch scorer gives the same results as scoring each session, a
+# session where the delayed reward is never chosen has no results
+never = [dict(entry, delay=False) for entry in dlist]
+sessions = [dlist, dlist[:2], dlist[1:2], never, []]
+expected = [obj.delaydiscounting_score(session) for session in sessions]
+assert expected[3] == {}, f"expected no results"
+assert obj.delaydiscounting_score_batch(sessions) == expected, f"expected {expected}"
+
+# the decoder returns the results by column
+columns = DelayDiscounting.decode_batch(sessions)
+assert columns['dd_ed50_hours'] == [info.get('dd_ed50_hours', None) for info in expected]
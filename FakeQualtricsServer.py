@@ -0,0 +1,554 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Local stand-in for the qualtrics api used by LNPIQualtrics
+
+Implements the endpoints used by LNPIQualtrics (mailing lists, contacts,
+surveys, survey metadata, export-responses start/progress/file) with generated data so the
+client can be tested and benchmarked without a qualtrics account. Latency,
+export duration, page size and injected 429/5xx errors are configurable.
+
+Point LNPIQualtrics at it with BASE_URL in the account section of
+config_qualtrics.yaml, e.g.
+
+  BASE_URL: http://127.0.0.1:8080/API/v3
+
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import textwrap
+import threading
+import time
+import urllib.parse
+import zipfile
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+__version_info__ = ('0', '1', '1')
+__version__ = '.'.join(__version_info__)
+
+version_history = \
+"""
+0.1.1 - survey-definitions metadata with the lastModified of a survey
+0.1.0 - initial version, mailing lists, contacts, surveys and response exports
+"""
+
+SampleData = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SampleData')
+
+class FakeQualtricsData:
+    """
+    Generates the directory, surveys and responses served by the fake server
+
+    The data is generated from the seed so every run serves the same data.
+    Cognitive task cells are filled with the sessions in SampleData.
+    """
+
+    def __init__(self, surveys=3, responses=100, mailingLists=2, contacts=50,
+                 newResponses=0, seed=0, directoryId='POOL_fake'):
+        self.random = random.Random(seed)
+        self.directoryId = directoryId
+        self.numResponses = responses
+        # responses added to a survey each time an export is started
+        self.newResponses = newResponses
+        self.lock = threading.Lock()
+
+        self.taskData = self.loadTaskData()
+
+        self.mailingLists = []
+        self.contacts = {}
+        for i in range(mailingLists):
+            mailingListId = f"CG_fake{i+1:010d}"
+            self.mailingLists.append({
+                'mailingListId': mailingListId,
+                'name': f"Fake Mailing List {i+1}",
+                'ownerId': 'UR_fake',
+                'lastModifiedDate': 1700000000000,
+                'creationDate': 1700000000000,
+                'contactCount': contacts,
+            })
+            self.contacts[mailingListId] = [{
+                'contactId': f"CID_fake{i+1:03d}{j+1:07d}",
+                'firstName': f"First{j+1}",
+                'lastName': f"Last{j+1}",
+                'email': f"subject{j+1}@example.com",
+                'phone': None,
+                'extRef': f"S{j+1:04d}",
+                'language': 'EN',
+                'unsubscribed': False,
+            } for j in range(contacts)]
+
+        self.surveys = []
+        self.surveyInfo = {}
+        self.responses = {}
+        for i in range(surveys):
+            surveyId = f"SV_fake{i+1:010d}"
+            self.surveys.append({
+                'id': surveyId,
+                'name': f"Fake Survey {i+1}",
+                'ownerId': 'UR_fake',
+                'lastModified': f"2024-03-{i+1:02d}T12:00:00Z",
+                'creationDate': '2024-01-01T12:00:00Z',
+                'isActive': True,
+            })
+            self.surveyInfo[surveyId] = self.createSurveyInfo(surveyId, f"Fake Survey {i+1}")
+            self.responses[surveyId] = []
+            self.addResponses(surveyId, responses)
+
+    def loadTaskData(self):
+        """
+        load the sample task sessions, each as the json string found in an export
+        """
+        taskData = {}
+        with open(os.path.join(SampleData, 'GoStop.json')) as fp:
+            taskData['GoStop'] = json.dumps(json.load(fp))
+        with open(os.path.join(SampleData, 'sspan02.json')) as fp:
+            # stored as a json encoded string
+            taskData['SpatialSpan'] = json.loads(fp.read())
+        for task in ['IST', 'DelayDiscounting']:
+            with open(os.path.join(SampleData, f"{task}.json")) as fp:
+                taskData[task] = json.dumps(json.load(fp))
+        taskData['TrailsAB'] = json.dumps([
+            {'trial_type': 'trails', 'trailsType': 'A', 'time_elapsed': 21345, 'rt': 21000},
+            {'trial_type': 'trails', 'trailsType': 'B', 'time_elapsed': 45678, 'rt': 45000},
+        ])
+        return taskData
+
+    def createSurveyInfo(self, surveyId, name):
+        """
+        survey design in the form returned by /surveys/{surveyId}
+        """
+        mood = ['Very bad', 'Bad', 'Neutral', 'Good', 'Very good']
+        return {
+            'id': surveyId,
+            'name': name,
+            'ownerId': 'UR_fake',
+            'isActive': True,
+            'creationDate': '2024-01-01T12:00:00Z',
+            'lastModifiedDate': '2024-03-01T12:00:00Z',
+            'questions': {
+                'QID1': {
+                    'questionType': {'type': 'MC', 'selector': 'SAVR', 'subSelector': 'TX'},
+                    'questionText': 'How is your mood?',
+                    'questionName': 'QN01_mood',
+                    'choices': {str(k+1): {'recode': str(k+1), 'description': text, 'choiceText': text}
+                                for k, text in enumerate(mood)},
+                },
+                'QID2': {
+                    'questionType': {'type': 'TE', 'selector': 'SL', 'subSelector': None},
+                    'questionText': 'Any notes?',
+                    'questionName': 'QN02_notes',
+                },
+                'QID3': {
+                    'questionType': {'type': 'Slider', 'selector': 'HSLIDER', 'subSelector': None},
+                    'questionText': 'Rate your pain',
+                    'questionName': 'QN03_pain',
+                    'choices': {'1': {'recode': '1', 'description': 'pain', 'choiceText': 'pain'}},
+                },
+            },
+            'embeddedData': [{'name': task} for task in ['SpatialSpan', 'TrailsAB', 'GoStop',
+                                                                    'IST', 'DelayDiscounting']],
+        }
+
+    def addResponses(self, surveyId, count):
+        """
+        append count responses to a survey, recordedDate keeps increasing
+        """
+        with self.lock:
+            responses = self.responses[surveyId]
+            contacts = self.contacts[self.mailingLists[0]['mailingListId']] if self.mailingLists else []
+            start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+            for _ in range(count):
+                n = len(responses)
+                recorded = start + timedelta(hours=n)
+                email = contacts[n % len(contacts)]['email'] if contacts else None
+                values = {
+                    'startDate': (recorded - timedelta(minutes=10)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'endDate': recorded.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'status': 0,
+                    'progress': 100,
+                    'duration': self.random.randint(60, 900),
+                    'finished': 1,
+                    'recordedDate': recorded.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                    '_recordId': f"R_fake{n+1:011d}",
+                    'recipientEmail': email,
+                    'distributionChannel': 'email',
+                    'userLanguage': 'EN',
+                    'QID1': self.random.randint(1, 5),
+                    'QID2': self.random.choice(['', 'fine', 'tired today']),
+                    'QID3': [str(self.random.randint(0, 10))],
+                }
+                for task, payload in self.taskData.items():
+                    # some sessions are not completed
+                    values[task] = payload if self.random.random() < 0.9 else '-1'
+                responses.append({
+                    'responseId': f"R_fake{n+1:011d}",
+                    'values': values,
+                    'labels': {'QID1': 'mood'},
+                    'displayedFields': list(values.keys()),
+                    'displayedValues': {},
+                })
+
+    def exportResponses(self, surveyId, start=0, end=None, startDate=None):
+        """
+        the responses of an export, from index start up to end and recorded
+        on or after startDate
+        """
+        with self.lock:
+            responses = self.responses[surveyId][start:end]
+        if startDate is not None:
+            responses = [response for response in responses
+                         if response['values']['recordedDate'] >= startDate]
+        return responses
+
+class FakeQualtricsServer(ThreadingHTTPServer):
+    """
+    Threaded http server holding the fake data and the export jobs
+
+    latency - seconds added to every request
+    exportDuration - seconds an export takes to complete
+    pageSize - elements per page of the list endpoints
+    errorRate - fraction of requests answered with errorStatus
+    errorStatus - status of the injected errors, e.g. 429 or 503
+    retryAfter - Retry-After header sent with the injected errors, None for no header
+    apiToken - token required in x-api-token, None accepts any token
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, data=None, latency=0.0, exportDuration=1.0, pageSize=100,
+                 errorRate=0.0, errorStatus=429, retryAfter=1, apiToken=None, seed=0):
+        super().__init__(address, FakeQualtricsHandler)
+        self.data = data if data is not None else FakeQualtricsData(seed=seed)
+        self.latency = latency
+        self.exportDuration = exportDuration
+        self.pageSize = pageSize
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.retryAfter = retryAfter
+        self.apiToken = apiToken
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.exports = {}
+        self.files = {}
+        self.counter = 0
+        # requests received by method and path pattern
+        self.requestCounts = {}
+
+    @property
+    def baseUrl(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/API/v3"
+
+    def nextId(self, prefix):
+        with self.lock:
+            self.counter += 1
+            return f"{prefix}{self.counter:012d}"
+
+class FakeQualtricsHandler(BaseHTTPRequestHandler):
+    """
+    Routes the api requests to the fake data
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    routes = [
+        ('GET', r'/API/v3/directories/([^/]+)/mailinglists', 'getMailingLists'),
+        ('GET', r'/API/v3/directories/([^/]+)/mailinglists/([^/]+)/contacts', 'getContacts'),
+        ('GET', r'/API/v3/directories/([^/]+)/mailinglists/([^/]+)/contacts/([^/]+)', 'getContact'),
+        ('GET', r'/API/v3/surveys', 'getSurveys'),
+        ('GET', r'/API/v3/surveys/([^/]+)', 'getSurvey'),
+        ('GET', r'/API/v3/survey-definitions/([^/]+)/metadata', 'getSurveyMetadata'),
+        ('POST', r'/API/v3/surveys/([^/]+)/export-responses', 'startExport'),
+        ('GET', r'/API/v3/surveys/([^/]+)/export-responses/([^/]+)', 'getExportProgress'),
+        ('GET', r'/API/v3/surveys/([^/]+)/export-responses/([^/]+)/file', 'getExportFile'),
+    ]
+
+    def log_message(self, format, *args):
+        # quiet, the request counts are kept in server.requestCounts
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        self.query = urllib.parse.parse_qs(url.query)
+
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        for routeMethod, pattern, name in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if routeMethod == method and match:
+                break
+        else:
+            self.sendJson(404, error=f"no route for {method} {url.path}")
+            return
+
+        with server.lock:
+            key = f"{method} {pattern}"
+            server.requestCounts[key] = server.requestCounts.get(key, 0) + 1
+
+        if server.apiToken is not None and self.headers.get('x-api-token') != server.apiToken:
+            self.sendJson(401, error="invalid x-api-token")
+            return
+
+        if server.errorRate > 0 and server.random.random() < server.errorRate:
+            headers = {}
+            if server.retryAfter is not None:
+                headers['Retry-After'] = str(server.retryAfter)
+            self.sendJson(server.errorStatus, error="injected error", headers=headers)
+            return
+
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            self.sendJson(400, error="invalid json body")
+            return
+        getattr(self, name)(data, *match.groups())
+
+    def sendJson(self, status, result=None, error=None, headers=None):
+        meta = {'httpStatus': f"{status}", 'requestId': self.server.nextId('req_')}
+        if error is not None:
+            meta['error'] = {'errorMessage': error}
+        payload = json.dumps({'result': result, 'meta': meta}).encode()
+        self.sendBytes(status, payload, 'application/json', headers)
+
+    def sendBytes(self, status, payload, contentType, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def sendPage(self, elements):
+        """
+        send one page of elements with nextPage pointing at the next offset
+        """
+        pageSize = self.server.pageSize
+        offset = int(self.query.get('offset', ['0'])[0])
+        page = elements[offset:offset+pageSize]
+        nextPage = None
+        if offset + pageSize < len(elements):
+            query = {key: values[0] for key, values in self.query.items()}
+            query['offset'] = offset + pageSize
+            path = urllib.parse.urlparse(self.path).path
+            nextPage = f"http://{self.headers.get('Host')}{path}?{urllib.parse.urlencode(query)}"
+        self.sendJson(200, {'elements': page, 'nextPage': nextPage})
+
+    def getMailingLists(self, data, directoryId):
+        self.sendPage(self.server.data.mailingLists)
+
+    def getContacts(self, data, directoryId, mailingListId):
+        contacts = self.server.data.contacts.get(mailingListId, None)
+        if contacts is None:
+            self.sendJson(404, error=f"no mailing list {mailingListId}")
+            return
+        self.sendPage(contacts)
+
+    def getContact(self, data, directoryId, mailingListId, contactId):
+        for contact in self.server.data.contacts.get(mailingListId, []):
+            if contact['contactId'] == contactId:
+                result = dict(contact)
+                result['contactLookupId'] = 'CGC_' + contactId[len('CID_'):]
+                self.sendJson(200, result)
+                return
+        self.sendJson(404, error=f"no contact {contactId}")
+
+    def getSurveys(self, data):
+        self.sendPage(self.server.data.surveys)
+
+    def getSurvey(self, data, surveyId):
+        surveyInfo = self.server.data.surveyInfo.get(surveyId, None)
+        if surveyInfo is None:
+            self.sendJson(404, error=f"no survey {surveyId}")
+            return
+        self.sendJson(200, surveyInfo)
+
+    def getSurveyMetadata(self, data, surveyId):
+        surveys = [survey for survey in self.server.data.surveys if survey['id'] == surveyId]
+        if not surveys:
+            self.sendJson(404, error=f"no survey {surveyId}")
+            return
+        survey = surveys[0]
+        self.sendJson(200, {
+            'SurveyID': surveyId,
+            'SurveyName': survey['name'],
+            'SurveyStatus': 'Active' if survey['isActive'] else 'Inactive',
+            'SurveyCreationDate': survey['creationDate'],
+            'LastModified': survey['lastModified'],
+        })
+
+    def startExport(self, data, surveyId):
+        server = self.server
+        if surveyId not in server.data.surveyInfo:
+            self.sendJson(404, error=f"no survey {surveyId}")
+            return
+        if data.get('format', None) != 'json':
+            self.sendJson(400, error="only the json format is supported")
+            return
+
+        # a continuationToken holds the number of responses already exported
+        start = 0
+        startDate = None
+        continuationToken = data.get('continuationToken', None)
+        if continuationToken is not None:
+            match = re.fullmatch(rf"CT_{surveyId}_(\d+)", continuationToken)
+            if match is None:
+                self.sendJson(400, error="invalid continuationToken")
+                return
+            start = int(match.group(1))
+        else:
+            startDate = data.get('startDate', None)
+
+        if server.data.newResponses > 0:
+            server.data.addResponses(surveyId, server.data.newResponses)
+
+        progressId = server.nextId('ES_')
+        with server.lock:
+            server.exports[progressId] = {
+                'surveyId': surveyId,
+                'started': time.monotonic(),
+                'start': start,
+                'startDate': startDate,
+                'continuation': continuationToken is not None or data.get('allowContinuation', False),
+                'fileId': None,
+            }
+        self.sendJson(200, {'progressId': progressId, 'percentComplete': 0.0, 'status': 'inProgress'})
+
+    def getExportProgress(self, data, surveyId, progressId):
+        server = self.server
+        with server.lock:
+            export = server.exports.get(progressId, None)
+        if export is None or export['surveyId'] != surveyId:
+            self.sendJson(404, error=f"no export {progressId}")
+            return
+
+        elapsed = time.monotonic() - export['started']
+        if server.exportDuration > 0 and elapsed < server.exportDuration:
+            percent = round(100.0 * elapsed / server.exportDuration, 1)
+            self.sendJson(200, {'percentComplete': percent, 'status': 'inProgress'})
+            return
+
+        with server.lock:
+            if export['fileId'] is None:
+                export['fileId'] = f"{progressId[3:]}-def"
+                export['total'] = len(server.data.responses[surveyId])
+        result = {'fileId': export['fileId'], 'percentComplete': 100.0, 'status': 'complete'}
+        if export['continuation']:
+            result['continuationToken'] = f"CT_{surveyId}_{export['total']}"
+        self.sendJson(200, result)
+
+    def getExportFile(self, data, surveyId, fileId):
+        server = self.server
+        with server.lock:
+            exports = [export for export in server.exports.values() if export['fileId'] == fileId]
+        if not exports:
+            self.sendJson(404, error=f"no file {fileId}")
+            return
+        export = exports[0]
+
+        responses = server.data.exportResponses(surveyId, export['start'], export['total'],
+                                                export['startDate'])
+        name = server.data.surveyInfo[surveyId]['name']
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(f"{name}.json", json.dumps({'responses': responses}))
+        self.sendBytes(200, buffer.getvalue(), 'application/zip')
+
+def startServer(host='127.0.0.1', port=0, **kwargs):
+    """
+    start a FakeQualtricsServer on a background thread, port 0 picks a free port
+
+    returns the server, call server.shutdown() to stop it
+    """
+    server = FakeQualtricsServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+if __name__ == "__main__":
+
+    # provide a description of the program with format control
+    description = textwrap.dedent('''\
+        Local stand-in for the qualtrics api used by LNPIQualtrics.
+
+        Start the server and set BASE_URL in the account section of the config
+        file to the printed url, e.g.
+
+        $ ./FakeQualtricsServer.py --port 8080 --latency 0.05 --export-duration 5
+        $ ./LNPIQualtrics.py --config config_fake.yaml --env qualtrics_token_sample
+
+        Use --error-rate and --error-status to inject 429/5xx responses.
+    ''')
+
+    parser = argparse.ArgumentParser(
+        description=description, formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("--host", type=str, help="address to listen on, default 127.0.0.1",
+                        default='127.0.0.1')
+    parser.add_argument("--port", type=int, help="port to listen on, default 8080",
+                        default=8080)
+    parser.add_argument("--latency", type=float, help="seconds added to every request, default 0",
+                        default=0.0)
+    parser.add_argument("--export-duration", type=float, dest='export_duration',
+                        help="seconds a response export takes, default 1", default=1.0)
+    parser.add_argument("--page-size", type=int, dest='page_size',
+                        help="elements per page of the list endpoints, default 100", default=100)
+    parser.add_argument("--error-rate", type=float, dest='error_rate',
+                        help="fraction of requests answered with --error-status, default 0", default=0.0)
+    parser.add_argument("--error-status", type=int, dest='error_status',
+                        help="status of the injected errors, default 429", default=429)
+    parser.add_argument("--retry-after", type=float, dest='retry_after',
+                        help="Retry-After seconds sent with the injected errors, default 1", default=1)
+    parser.add_argument("--surveys", type=int, help="number of surveys, default 3", default=3)
+    parser.add_argument("--responses", type=int, help="responses per survey, default 100", default=100)
+    parser.add_argument("--new-responses", type=int, dest='new_responses',
+                        help="responses added to a survey by each export, default 0", default=0)
+    parser.add_argument("--mailing-lists", type=int, dest='mailing_lists',
+                        help="number of mailing lists, default 2", default=2)
+    parser.add_argument("--contacts", type=int, help="contacts per mailing list, default 50", default=50)
+    parser.add_argument("--seed", type=int, help="random seed for the generated data, default 0", default=0)
+    parser.add_argument("-H", "--history", action="store_true", help="Show program history")
+    parser.add_argument('-V', '--version', action='version', version=f'%(prog)s {__version__}')
+
+    args = parser.parse_args()
+
+    if args.history:
+        print(f"{os.path.basename(__file__) } Version: {__version__}")
+        print(version_history)
+        sys.exit(0)
+
+    data = FakeQualtricsData(surveys=args.surveys, responses=args.responses,
+                             mailingLists=args.mailing_lists, contacts=args.contacts,
+                             newResponses=args.new_responses, seed=args.seed)
+    server = FakeQualtricsServer((args.host, args.port), data=data,
+                                 latency=args.latency, exportDuration=args.export_duration,
+                                 pageSize=args.page_size, errorRate=args.error_rate,
+                                 errorStatus=args.error_status, retryAfter=args.retry_after,
+                                 seed=args.seed)
+    print(f"Fake qualtrics api at {server.baseUrl}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
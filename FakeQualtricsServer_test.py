@@ -0,0 +1,453 @@
+import copy
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+import decoders
+import JsonBackend
+from FakeQualtricsServer import FakeQualtricsData, startServer
+from LNPIQualtrics import CsvStreamWriter, LNPIQualtrics, Profiler, SyncState, iterJsonArray, main
+
+@pytest.fixture
+def server():
+    data = FakeQualtricsData(surveys=3, responses=20, mailingLists=2, contacts=12)
+    server = startServer(data=data, pageSize=5, exportDuration=0.2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def client(server, **kwargs):
+    httpConfig = {'BACKOFF_BASE': 0.01}
+    return LNPIQualtrics('token', 'fake', 'POOL_fake', baseUrl=server.baseUrl,
+                         httpConfig=httpConfig, **kwargs)
+
+def test_lists_follow_next_page(server):
+    qc = client(server)
+    assert len(qc.getMailingLists()) == 2
+    assert [survey['id'] for survey in qc.getSurveyList()] == \
+        [survey['id'] for survey in server.data.surveys]
+    # 12 contacts over pages of 5
+    contacts = qc.getContactsMailingList('CG_fake0000000001')
+    assert len(contacts) == 12
+    assert qc.getSurveyByIndex(3)['id'] == 'SV_fake0000000003'
+    assert qc.getSurveyByIndex(4) is None
+
+def test_contact_lookup_ids_keep_order(server):
+    qc = client(server)
+    contacts = qc.getContactsMailingList('CG_fake0000000001')
+    contacts = qc.addContactLookupIdToList('CG_fake0000000001', contacts, workers=4)
+    assert [contact['contactLookupId'] for contact in contacts] == \
+        ['CGC_' + contact['contactId'][len('CID_'):] for contact in contacts]
+
+def test_contact_lookup_reports_bad_responses(server, monkeypatch, capsys):
+    import FakeQualtricsServer
+    getContact = FakeQualtricsServer.FakeQualtricsHandler.getContact
+    def badContact(handler, data, directoryId, mailingListId, contactId):
+        # a 200 without a result for one contact and an unparsable body for another
+        if contactId.endswith('0000003'):
+            handler.sendJson(200, {})
+        elif contactId.endswith('0000005'):
+            handler.sendBytes(200, b'not json', 'application/json')
+        else:
+            getContact(handler, data, directoryId, mailingListId, contactId)
+    monkeypatch.setattr(FakeQualtricsServer.FakeQualtricsHandler, 'getContact', badContact)
+    qc = client(server)
+    contacts = qc.getContactsMailingList('CG_fake0000000001')
+    contacts = qc.addContactLookupIdToList('CG_fake0000000001', contacts, workers=4)
+    missing = [index for index, contact in enumerate(contacts) if contact['contactLookupId'] is None]
+    assert missing == [2, 4]
+    out = capsys.readouterr().out
+    assert 'subject index 3' in out and 'subject index 5' in out
+
+def test_export_decodes_responses(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    qc = client(server, dataframe=True)
+    dfFileName = qc.getResponses('SV_fake0000000001')
+    assert dfFileName is not None and os.path.exists(dfFileName)
+    df = pd.read_csv(dfFileName)
+    assert len(df) == 20
+    assert 'QN01_mood' in df.columns
+    assert 'SpatialSpan3_perc_accuracy' in df.columns
+    assert 'ist_dw_p_correct' in df.columns and 'dd_ed50_hours' in df.columns
+    assert qc.exportStats['SV_fake0000000001']['polls'] >= 1
+
+def incrementalRun(server, stateFile, surveyId='SV_fake0000000001'):
+    """
+    one --incremental run of a survey, returns the output file and the saved state
+    """
+    qc = client(server, syncState=SyncState(stateFile))
+    outputFile = qc.getResponsesIncremental(surveyId)
+    return outputFile, SyncState(stateFile).get(surveyId)
+
+def test_incremental_export_appends_new_responses(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stateFile = str(tmp_path / 'state.json')
+    surveyId = 'SV_fake0000000001'
+    # the first run exports everything and saves the state
+    outputFile, state = incrementalRun(server, stateFile)
+    assert state['continuationToken'] == f"CT_{surveyId}_20"
+    assert state['lastRecordedDate'] == server.data.responses[surveyId][-1]['values']['recordedDate']
+    assert state['outputFile'] == outputFile
+    assert len(pd.read_csv(outputFile)) == 20
+    # the next run appends only the new responses
+    server.data.addResponses(surveyId, 5)
+    assert incrementalRun(server, stateFile)[0] == outputFile
+    df = pd.read_csv(outputFile)
+    assert list(df['_recordId']) == [response['responseId'] for response in server.data.responses[surveyId]]
+    # a run without new responses leaves the file as it is
+    written = open(outputFile, 'rb').read()
+    outputFile, state = incrementalRun(server, stateFile)
+    assert open(outputFile, 'rb').read() == written
+    assert state['continuationToken'] == f"CT_{surveyId}_25"
+
+def test_incremental_export_falls_back_to_start_date(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stateFile = str(tmp_path / 'state.json')
+    surveyId = 'SV_fake0000000001'
+    outputFile, state = incrementalRun(server, stateFile)
+    # a new response recorded at the same time as the newest one exported,
+    # the startDate watermark is inclusive
+    responses = server.data.responses[surveyId]
+    boundary = copy.deepcopy(responses[-1])
+    boundary['responseId'] = boundary['values']['_recordId'] = 'R_fakeboundary01'
+    responses.append(boundary)
+    server.data.addResponses(surveyId, 2)
+    # the token is rejected, the export starts at lastRecordedDate
+    SyncState(stateFile).update(surveyId, continuationToken='CT_expired')
+    outputFile, state = incrementalRun(server, stateFile)
+    df = pd.read_csv(outputFile)
+    assert list(df['_recordId']) == [response['responseId'] for response in responses]
+    assert state['continuationToken'] == f"CT_{surveyId}_23"
+    assert state['lastRecordedDate'] == responses[-1]['values']['recordedDate']
+    # the responses at the watermark are not exported again
+    SyncState(stateFile).update(surveyId, continuationToken=None)
+    boundary = copy.deepcopy(responses[-1])
+    boundary['responseId'] = boundary['values']['_recordId'] = 'R_fakeboundary02'
+    responses.append(boundary)
+    outputFile, state = incrementalRun(server, stateFile)
+    df = pd.read_csv(outputFile)
+    assert list(df['_recordId']) == [response['responseId'] for response in responses]
+    assert sorted(state['watermarkIds']) == [responses[-2]['responseId'], 'R_fakeboundary02']
+
+def test_export_many_surveys(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    qc = client(server, dataframe=True, extref='Fake Mailing List 1')
+    surveyIds = ['SV_fake0000000001', 'SV_fake0000000002', 'SV_fake9999999999']
+    results = qc.getResponsesMany(surveyIds, maxExports=3)
+    assert results['SV_fake9999999999'] is None
+    for surveyId in surveyIds[:2]:
+        df = pd.read_csv(results[surveyId])
+        assert list(df['_recordId']) == [response['responseId'] for response in server.data.responses[surveyId]]
+        assert df['extRef'].notna().all()
+    # the exports share one lookup of the mailing list
+    assert server.requestCounts['GET /API/v3/directories/([^/]+)/mailinglists'] == 1
+    # each incremental export saves its own continuationToken
+    stateFile = str(tmp_path / 'state.json')
+    qc = client(server, syncState=SyncState(stateFile))
+    qc.getResponsesMany(surveyIds[:2])
+    for surveyId in surveyIds[:2]:
+        assert SyncState(stateFile).get(surveyId)['continuationToken'] == f"CT_{surveyId}_20"
+
+def test_main_exports_surveys_by_id_and_index(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.yaml').write_text(
+        f"account:\n  DATA_CENTER: fake\n  DEFAULT_DIRECTORY: POOL_fake\n  BASE_URL: {server.baseUrl}\n")
+    (tmp_path / 'token').write_text("QUALTRICS_APITOKEN=token\n")
+    options = dict(cmd='surveys', env='token', config_file='config.yaml', cache=False)
+    main(index=[1, 3], **options)
+    exported = lambda: sorted(re.sub(r'_\d{8}_\d{4}_df\.csv$', '', name)
+                              for name in os.listdir(tmp_path) if name.endswith('_df.csv'))
+    assert exported() == ['Fake_Survey_1', 'Fake_Survey_3']
+    main(surveyIds=['SV_fake0000000002'], **options)
+    assert exported() == ['Fake_Survey_1', 'Fake_Survey_2', 'Fake_Survey_3']
+    with pytest.raises(SystemExit):
+        main(index=[1, 4], **options)
+
+def test_retries_injected_errors(server):
+    server.errorRate = 0.3
+    server.retryAfter = 0.01
+    qc = client(server)
+    assert len(qc.getSurveyList()) == 3
+    assert len(qc.getContactsMailingList('CG_fake0000000002')) == 12
+    assert qc.scheduler.stats['retries'] > 0
+
+def test_export_start_is_only_retried_after_429(server):
+    server.errorRate = 1.0
+    server.errorStatus = 500
+    server.retryAfter = None
+    exportUrl = f"{server.baseUrl}/surveys/SV_fake0000000001/export-responses"
+    # the server may have started the export before failing
+    qc = client(server)
+    assert qc.request('POST', exportUrl, json={'format': 'json'}).status_code == 500
+    assert qc.scheduler.stats['requests'] == 1
+    assert qc.request('GET', f"{server.baseUrl}/surveys").status_code == 500
+    assert qc.scheduler.stats['requests'] == 1 + 6
+    server.errorStatus = 429
+    qc = client(server)
+    assert qc.request('POST', exportUrl, json={'format': 'json'}).status_code == 429
+    assert qc.scheduler.stats['requests'] == 6
+    # a long or malformed Retry-After is capped
+    response = requests.Response()
+    response.headers['Retry-After'] = '86400'
+    assert qc.scheduler.retryDelay(0, response) == 300
+    response.headers['Retry-After'] = 'nan'
+    assert qc.scheduler.retryDelay(0, response) < 1
+
+def test_export_poll_stops_at_client_error(server):
+    qc = client(server)
+    start = time.monotonic()
+    assert qc.exportResponsesProgress('SV_fake0000000001', 'ES_unknown') is None
+    assert time.monotonic() - start < 1
+    assert qc.exportStats['SV_fake0000000001']['polls'] == 1
+
+def test_export_poll_stops_at_deadline(server):
+    server.exportDuration = 30
+    qc = client(server, exportConfig={'POLL_MIN': 0.05, 'POLL_MAX': 0.2})
+    progressId = qc.exportResponsesStart('SV_fake0000000001')
+    start = time.monotonic()
+    assert qc.exportResponsesProgress('SV_fake0000000001', progressId, deadline=1) is None
+    assert 1 <= time.monotonic() - start < 2
+    # the interval grows from POLL_MIN to POLL_MAX
+    assert 4 < qc.exportStats['SV_fake0000000001']['polls'] < 20
+
+def test_json_array_items_across_chunks():
+    items = [12, 345, -6.25e-3, True, None, 'a, b]', {'n': [1, 2]}, [], 78]
+    text = json.dumps({'responses': items}, indent=1)
+    for chunkSize in range(1, 12):
+        assert list(iterJsonArray(io.StringIO(text), chunkSize=chunkSize)) == items
+    assert list(iterJsonArray(io.BytesIO(b'{"responses": [12, 345]}'), chunkSize=2)) == [12, 345]
+    with pytest.raises(ValueError):
+        list(iterJsonArray(io.StringIO('{"responses": [12 34]}'), chunkSize=2))
+
+def test_parallel_decode_matches_serial():
+    data = FakeQualtricsData(surveys=1, responses=50)
+    ddict = {'responses': data.responses['SV_fake0000000001']}
+    serial = LNPIQualtrics('token', 'fake', 'POOL_fake').decodeData(copy.deepcopy(ddict))
+    qc = LNPIQualtrics('token', 'fake', 'POOL_fake', jobs=2,
+                       decodeConfig={'MIN_PARALLEL': 0, 'CHUNK_SIZE': 7})
+    try:
+        assert qc.decodeData(copy.deepcopy(ddict)) == serial
+    finally:
+        qc.close()
+
+def test_decode_cache_reuses_results(tmp_path, monkeypatch):
+    data = FakeQualtricsData(surveys=1, responses=20)
+    ddict = {'responses': data.responses['SV_fake0000000001']}
+    expected = LNPIQualtrics('token', 'fake', 'POOL_fake').decodeData(copy.deepcopy(ddict))
+    qc = LNPIQualtrics('token', 'fake', 'POOL_fake', cacheDir=str(tmp_path))
+    assert qc.decodeData(copy.deepcopy(ddict)) == expected
+    qc.close()
+    # a second run gets every session from the cache
+    decoded = []
+    monkeypatch.setattr(decoders, 'decodeBatch', lambda task, sessions: decoded.append(task))
+    qc = LNPIQualtrics('token', 'fake', 'POOL_fake', cacheDir=str(tmp_path))
+    assert qc.decodeData(copy.deepcopy(ddict)) == expected
+    assert decoded == []
+    qc.close()
+
+def test_json_backends_read_and_write_nan():
+    # the stdlib json module of earlier versions wrote NaN literals
+    text = json.dumps({'a': float('nan'), 'b': [1.5, float('inf')]})
+    try:
+        for name in JsonBackend.BACKENDS:
+            JsonBackend.setBackend(name)
+            assert JsonBackend.loads(text)['b'][0] == 1.5
+            assert JsonBackend.loads(JsonBackend.dumps(JsonBackend.loads(text))) == \
+                {'a': None, 'b': [1.5, None]}
+    finally:
+        JsonBackend.setBackend(JsonBackend.BACKENDS[0])
+
+def test_pipeline_single_pass(server):
+    qc = client(server, extref='Fake Mailing List 1')
+    surveyInfo = server.data.surveyInfo['SV_fake0000000001']
+    responses = copy.deepcopy(server.data.responses['SV_fake0000000001'])
+    ddict = qc.compilePipeline(surveyInfo).run({'responses': responses})
+    values = ddict['responses'][0]['values']
+    assert 'QID1' not in values and 'QN01_mood' in values
+    assert isinstance(values['QN03_pain'], float)
+    assert values['extRef'].startswith('S')
+    assert 'GoStop' not in values or values['GoStop'] == '-1'
+
+def test_dataframe_schema(server):
+    qc = client(server)
+    surveyInfo = server.data.surveyInfo['SV_fake0000000001']
+    responses = copy.deepcopy(server.data.responses['SV_fake0000000001'])
+    ddict = qc.compilePipeline(surveyInfo).run({'responses': responses})
+    ddict['surveyInfo'] = surveyInfo
+    df = qc.createDataFrame(ddict)
+    assert isinstance(df['QN01_mood'].dtype, pd.CategoricalDtype)
+    assert df['gs_stop_total'].dtype == 'Int64'
+    assert df['SpatialSpan3_perc_accuracy'].dtype == 'float32'
+    assert str(df['recordedDate'].dtype).startswith('datetime64')
+
+def test_stream_matches_dataframe(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    qc = client(server, dataframe=True)
+    # the text of each value as written, the columns are in another order
+    expected = pd.read_csv(qc.getResponses('SV_fake0000000001'), index_col=0,
+                           dtype=str, keep_default_na=False)
+    qc = client(server, dataframe=True, stream=True, exportConfig={'STREAM_CHUNK': 3})
+    df = pd.read_csv(qc.getResponses('SV_fake0000000001'), index_col=0,
+                     dtype=str, keep_default_na=False)
+    assert sorted(df.columns) == sorted(expected.columns)
+    assert df[expected.columns].equals(expected)
+
+def test_stream_writes_values_like_dataframe(server, tmp_path):
+    qc = client(server)
+    # column a has no missing value in the first chunk
+    responses = [{'values': {'a': 1, 'b': 'x'}}, {'values': {'a': 2}},
+                 {'values': {'b': 'y'}}, {'values': {'a': 3, 'b': 'z'}}]
+    qc.writeDataFrame(qc.createDataFrame({'responses': responses}), str(tmp_path / 'full.csv'))
+    writer = CsvStreamWriter(str(tmp_path / 'stream.csv'), [])
+    for chunk in (responses[:2], responses[2:]):
+        writer.write(qc.createDataFrame({'responses': chunk}))
+    writer.close()
+    assert (tmp_path / 'stream.csv').read_bytes() == (tmp_path / 'full.csv').read_bytes()
+
+def test_parquet_output_keeps_dtypes(server, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.chdir(tmp_path)
+    qc = client(server, dataframe=True, outputConfig={'FORMAT': 'parquet'})
+    fileName = qc.getResponses('SV_fake0000000001')
+    assert fileName.endswith('_df.parquet')
+    df = pd.read_parquet(fileName)
+    assert len(df) == 20
+    assert df['gs_stop_total'].dtype == 'Int64'
+    assert df['SpatialSpan3_perc_accuracy'].dtype == 'float32'
+    assert str(df['recordedDate'].dtype).startswith('datetime64')
+    # the streamed file has the same rows and dtypes
+    qc = client(server, dataframe=True, stream=True, outputConfig={'FORMAT': 'parquet'},
+                exportConfig={'STREAM_CHUNK': 3})
+    streamed = pd.read_parquet(qc.getResponses('SV_fake0000000001'))
+    assert streamed[df.columns].equals(df)
+
+def test_profile_reports_stages(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profiler = Profiler(enabled=True, capture=['decode'])
+    qc = client(server, dataframe=True, profiler=profiler)
+    qc.getResponses('SV_fake0000000001')
+    results = profiler.results()
+    for stage in ['export_start', 'export_poll', 'download', 'parse', 'decode', 'dataframe', 'write_csv']:
+        assert results['stages'][stage]['calls'] >= 1
+    http = results['http']['export-responses']
+    assert http['requests'] >= 3 and http['bytes_received'] > 0
+    assert results['decoders']['GoStop']['sessions'] > 0
+    assert 'decode' in profiler.report()
+    profiler.dump('profile.json')
+    assert profiler.dumpCaptured('decode.prof') and os.path.exists('profile.json')
+
+def test_survey_listing_starts_lazily(server, tmp_path, monkeypatch, capsys):
+    # importing the module leaves pandas, numpy, yaml and the decoders for the
+    # commands that use them
+    code = "import sys, LNPIQualtrics; print(sorted(set(sys.modules) & {'pandas', 'numpy', 'yaml', 'decoders'}))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.stdout.strip() == '[]'
+    # listing the surveys does not fetch the mailing lists
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.yaml').write_text(
+        f"account:\n  DATA_CENTER: fake\n  DEFAULT_DIRECTORY: POOL_fake\n  BASE_URL: {server.baseUrl}\n")
+    (tmp_path / 'token').write_text("QUALTRICS_APITOKEN=token\n")
+    main(cmd='surveys', env='token', config_file='config.yaml', cache=False)
+    assert 'Title: Fake Survey' in capsys.readouterr().out
+    assert not [key for key in server.requestCounts if 'mailinglists' in key]
+
+def test_survey_index_skips_listing(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cacheDir = str(tmp_path / 'cache')
+    qc = client(server, cacheDir=cacheDir)
+    assert [survey['id'] for survey in qc.findSurveysByName('fake survey 2')] == ['SV_fake0000000002']
+    assert len(qc.findSurveysByName('Fake Survey *')) == 3
+    assert qc.findSurveysByName('No Such Survey') == []
+    listed = server.requestCounts['GET /API/v3/surveys']
+    # a later run finds the surveys in the index, the export does not list them
+    qc = client(server, cacheDir=cacheDir, dataframe=True)
+    assert qc.findSurveysByName('Fake Survey 3')[0]['id'] == 'SV_fake0000000003'
+    assert qc.getResponses('SV_fake0000000001') is not None
+    assert server.requestCounts['GET /API/v3/surveys'] == listed
+    # an index older than its ttl is read again
+    qc = client(server, cacheDir=cacheDir)
+    qc.surveyIndex.index['updated'] -= 86400
+    assert len(qc.getSurveyIndex()) == 3
+    assert server.requestCounts['GET /API/v3/surveys'] == listed + 1
+
+def test_survey_design_cache_hits_across_runs(server, tmp_path):
+    cacheDir = str(tmp_path / 'cache')
+    surveyId = 'SV_fake0000000002'
+    designs = lambda: server.requestCounts.get('GET /API/v3/surveys/([^/]+)', 0)
+    metadata = lambda: server.requestCounts.get('GET /API/v3/survey-definitions/([^/]+)/metadata', 0)
+    qc = client(server, cacheDir=cacheDir)
+    surveyInfo = qc.getSurveyInformation(surveyId)
+    qc.close()
+    assert (designs(), metadata()) == (1, 1)
+    assert os.path.exists(os.path.join(cacheDir, 'surveys', f"{surveyId}.json"))
+    # a new run checks the metadata and reads the design from disk
+    qc = client(server, cacheDir=cacheDir)
+    assert qc.getSurveyInformation(surveyId) == surveyInfo
+    qc.close()
+    assert (designs(), metadata()) == (1, 2)
+    # a run that read the survey list needs no metadata request
+    qc = client(server, cacheDir=cacheDir)
+    assert qc.getSurveyByIndex(2)['id'] == surveyId
+    assert qc.getSurveyInformation(surveyId) == surveyInfo
+    qc.close()
+    assert (designs(), metadata()) == (1, 2)
+    # without the cache the design is downloaded
+    qc = client(server)
+    assert qc.getSurveyInformation(surveyId) == surveyInfo
+    assert (designs(), metadata()) == (2, 2)
+
+def test_edited_design_is_not_served_from_cache(server, tmp_path):
+    cacheDir = str(tmp_path / 'cache')
+    surveyId = 'SV_fake0000000001'
+    # the survey list is read and saved in the survey index, so the design is
+    # cached against its lastModified
+    qc = client(server, cacheDir=cacheDir)
+    assert qc.findSurveysByName('Fake Survey 1')[0]['id'] == surveyId
+    assert qc.getSurveyInformation(surveyId)['questions']['QID1']['questionName'] == 'QN01_mood'
+    # the design is edited on the server
+    server.data.surveyInfo[surveyId]['questions']['QID1']['questionName'] = 'QN01_mood_v2'
+    server.data.surveys[0]['lastModified'] = '2024-04-01T12:00:00Z'
+    # a run by name checks the cached design against the survey metadata
+    qc = client(server, cacheDir=cacheDir)
+    assert qc.findSurveysByName('Fake Survey 1')[0]['id'] == surveyId
+    assert qc.getSurveyInformation(surveyId)['questions']['QID1']['questionName'] == 'QN01_mood_v2'
+    # a run reading the survey list sees the new lastModified
+    qc = client(server, cacheDir=cacheDir)
+    assert qc.getSurveyByIndex(1)['id'] == surveyId
+    assert qc.getSurveyInformation(surveyId)['questions']['QID1']['questionName'] == 'QN01_mood_v2'
+
+def test_survey_id_run_uses_cached_design(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.yaml').write_text(
+        f"account:\n  DATA_CENTER: fake\n  DEFAULT_DIRECTORY: POOL_fake\n  BASE_URL: {server.baseUrl}\n")
+    (tmp_path / 'token').write_text("QUALTRICS_APITOKEN=token\n")
+    for _ in range(2):
+        main(cmd='surveys', surveyIds=['SV_fake0000000001'], env='token', config_file='config.yaml')
+    # the second run checks the metadata and finds the design in the cache
+    assert server.requestCounts['GET /API/v3/surveys/([^/]+)'] == 1
+    assert server.requestCounts['GET /API/v3/survey-definitions/([^/]+)/metadata'] == 2
+    assert 'GET /API/v3/surveys' not in server.requestCounts
+
+def test_failed_page_fails_the_list(server, tmp_path, monkeypatch):
+    server.pageSize = 2
+    cacheDir = str(tmp_path / 'cache')
+    qc = client(server, cacheDir=cacheDir)
+    # every page after the first fails
+    getPage = qc.getPage
+    monkeypatch.setattr(qc, 'getPage', lambda pageUrl: None if 'offset=' in pageUrl else getPage(pageUrl))
+    assert qc.getSurveyList() is None
+    assert qc.getSurveyIndex(refresh=True) is None
+    assert not os.path.exists(os.path.join(cacheDir, 'survey_index.json'))
+    assert qc.getContactsMailingList('CG_fake0000000001') is None
+    assert qc.getSurveyByIndex(1)['id'] == 'SV_fake0000000001'
+    assert qc.getSurveyByIndex(3) is None
+    assert qc.getSurveysByIndex([1, 3]) == [qc.getSurveyByIndex(1), None]
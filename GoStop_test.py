@@ -0,0 +1,21 @@
+import json
+from decoders import GoStop
+from decoders.impulsivity_process import ImpulsivityProcess
+
+file = 'SampleData/GoStop.json'
+with open(file) as fp:
+    dlist = json.load(fp)
+
+obj = ImpulsivityProcess()
+
+# the batch scorer gives the same results as scoring each session,
+# including sessions cut short so the look ahead runs past the end
+sessions = [dlist, dlist[:-1], dlist[:-2], dlist[:-3], dlist[3:], dlist + dlist, []]
+expected = [obj.gostop_score(session) for session in sessions]
+result = obj.gostop_score_batch(sessions)
+assert result == expected, f"expected {expected}"
+assert result[0]['gs_stop_total'] == 4, f"expected 4"
+
+# the decoder returns the results by column
+columns = GoStop.decode_batch(sessions)
+assert columns['gs_stop_total'] == [info.get('gs_stop_total', None) for info in expected]
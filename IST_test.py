@@ -0,0 +1,45 @@
+import json
+from math import factorial
+from decoders import IST
+from decoders.impulsivity_process import ImpulsivityProcess
+
+file = 'SampleData/IST.json'
+with open(file) as fp:
+    dlist = json.load(fp)
+
+obj = ImpulsivityProcess()
+
+result = obj.ist_score(dlist)
+# 3 trials in each condition, one incorrect choice with decreasing wins
+assert result['ist_dw_trials'] == 3 and result['ist_fw_trials'] == 3, f"expected 3 trials"
+assert result['ist_dw_incorrect'] == 1, f"expected 1"
+assert result['ist_fw_opens'] == 20.0, f"expected 20.0"
+# the first trial opens 9 boxes of the chosen color and 7 of the other,
+# 4 of the 9 closed boxes must be the chosen color
+assert obj.ist_score(dlist[:3])['ist_dw_p_correct'] == 382 / 512, f"expected 382/512"
+
+# the binomial tables give the same values as the factorial formula
+for a in range(1, 30):
+    for z in range(1, a + 1):
+        total = factorial(a) // (factorial(z) * factorial(a - z))
+        favorable = sum(factorial(a) // (factorial(k) * factorial(a - k)) for k in range(1, z + 1))
+        assert obj.probability_of_at_least_one_correct(z, a) == favorable / total, f"z {z} a {a}"
+
+# the batch scorer gives the same results as scoring each session
+sessions = [dlist, dlist[:3], dlist[5:], dlist + dlist, []]
+expected = [obj.ist_score(session) for session in sessions]
+assert obj.ist_score_batch(sessions) == expected, f"expected {expected}"
+
+# the decoder returns the results by column
+columns = IST.decode_batch(sessions)
+assert columns['ist_fw_trials'] == [info.get('ist_fw_trials', None) for info in expected]
+
+# a pressed box missing from a short stimulus leaves the trial without the
+# probability of a correct choice instead of failing the session
+import copy
+short = copy.deepcopy(dlist)
+trial = next(entry for entry in short if 'pressed' in entry)
+trial['stimulus'] = trial['stimulus'][:10]
+assert obj.ist_trial(trial)[4:] == (0, 0, 0), f"expected (0, 0, 0)"
+assert obj.ist_score_batch([short]) == [obj.ist_score(short)]
+assert obj.ist_score(short)['ist_dw_trials'] == 3, f"expected 3 trials"
@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+
+"""
+
+JSON backend for LNPIQualtrics
+
+Uses orjson when it is installed, which parses and writes json several times
+faster than the json module of the standard library, and falls back to the
+standard library otherwise. The results are the same except for the layout
+of indented files, orjson indents by 2 spaces whatever indent is given.
+Both write nan and infinity as null, and the NaN literals in files written
+by earlier versions are read with the standard library.
+
+setBackend('json') selects the standard library, e.g. for benchmarks.
+
+"""
+
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__version_info__ = ('0', '1', '1')
+__version__ = '.'.join(__version_info__)
+version_history= \
+"""
+0.1.1 - nan and infinity are written as null by both backends, orjson falls back to
+        the json module for files with NaN literals
+0.1.0 - initial version, orjson with a fallback to the json module
+"""
+
+BACKENDS = ['orjson', 'json'] if orjson is not None else ['json']
+
+# name of the backend in use
+backend = BACKENDS[0]
+
+def setBackend(name):
+    """
+    select the backend, 'orjson' or 'json'
+    """
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"json backend {name} is not available, use one of {BACKENDS}")
+    backend = name
+
+def loads(data):
+    """
+    parse json from a str or bytes
+    """
+    if backend == 'orjson':
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN literals, orjson only reads standard json
+            pass
+    return json.loads(data)
+
+def withoutNan(obj):
+    """
+    copy of obj with the nan and infinite floats in its dicts, lists and
+    tuples replaced by None, as orjson writes them
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: withoutNan(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [withoutNan(value) for value in obj]
+    return obj
+
+def dumpb(obj, indent=None):
+    """
+    serialize obj to utf-8 encoded json bytes, indent gives an indented layout
+    """
+    if backend == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    try:
+        return json.dumps(obj, indent=indent, allow_nan=False).encode('utf-8')
+    except ValueError:
+        return json.dumps(withoutNan(obj), indent=indent).encode('utf-8')
+
+def dumps(obj, indent=None):
+    """
+    serialize obj to a json str
+    """
+    return dumpb(obj, indent=indent).decode('utf-8')
+
+def load(fp):
+    """
+    parse json from a file opened in text or binary mode
+    """
+    return loads(fp.read())
+
+def dump(obj, fp, indent=None):
+    """
+    write obj as json to a file opened in binary mode
+    """
+    fp.write(dumpb(obj, indent=indent))
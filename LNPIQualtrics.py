@@ -7,31 +7,125 @@ LNPI code for working with qualtrics
 Kelvin O. Lim
 """
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
 import sys
 import json
 # Setting user Parameters
 from dotenv import dotenv_values
 import argparse
 import pprint
-import pandas as pd
 import time
+import math
 import zipfile
 import io
 import os
 from datetime import datetime
-from decoders import *
-import numpy as np
+import JsonBackend
 import textwrap
-
-import yaml
+import tempfile
+import shutil
+import re
+import threading
+import random
+import email.utils
+import urllib.parse
+import itertools
+import hashlib
+import fnmatch
+import importlib.util
+import sqlite3
+import csv
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import contextlib
+
+# pandas, numpy, pyarrow, yaml and the decoders are imported by the functions
+# that use them, so -V and listing the surveys or mailing lists start quickly
+
+# resource is not available on Windows, the peak RSS is then not reported
+try:
+    import resource
+except ImportError:
+    resource = None
 
 pp = pprint.PrettyPrinter(indent=4)
 
 
-__version_info__ = ('0', '2', '6')
+__version_info__ = ('0', '2', '37')
 __version__ = '.'.join(__version_info__)
 version_history= \
 """
+0.2.37 - iterJsonArray reads on when a number is cut at the end of a chunk instead
+         of yielding the part before the cut
+0.2.36 - a contactLookupId response without the expected body fails only that
+         contact instead of the whole mailing list
+0.2.35 - a cached survey design is validated with the lastModified from the survey
+         metadata when the survey list was not read in the run, so exports by
+         surveyId or name do not download the design again
+0.2.34 - the concurrent exports of getResponsesMany keep their export state per
+         call and fetch the extref mailing list once
+0.2.33 - polling an export stops at a 4xx response other than 429 instead of
+         polling until DEADLINE
+0.2.32 - decoded results with nan are cached as null and returned with None like
+         the cached results
+0.2.31 - POST requests, e.g. starting an export, are only retried after a 429 or an
+         error before the connection was made, Retry-After is capped at
+         RETRY_AFTER_MAX in the http section of the config file
+0.2.30 - numeric columns without a dtype in the schema are float64, so a streamed
+         csv file writes them like the dataframe of the whole export
+0.2.29 - a list whose later page cannot be retrieved is an error instead of a
+         partial list, so it is not saved in the survey index or exported
+0.2.28 - --survey-name selects surveys by name, the survey list is cached in the survey
+         index for SURVEY_INDEX_TTL seconds so exports by name or surveyId do not
+         list all the surveys, --refresh-surveys reads the list again
+0.2.27 - pandas, numpy, pyarrow, yaml and the decoders are imported by the commands
+         that use them and only --cmd list fetches the mailing lists, -V starts in
+         about 0.2 sec instead of 0.8 sec
+0.2.26 - --profile reports the wall and cpu time and peak memory of each stage, the
+         api calls, bytes and errors by endpoint and the time of each decoder,
+         --profile-json writes it to a file, --profile-decode runs cProfile on decoding
+0.2.25 - --output-format parquet|feather writes the dataframe as a compressed columnar
+         file that keeps the dtypes, the dataframe is built column by column
+0.2.24 - --stream writes the _df.csv file in chunks as the export is read so the
+         whole export is never held in memory
+0.2.23 - the dataframe columns get dtypes from the survey design and the decoders,
+         categories for choice questions, nullable integers, float32 scores
+         and datetimes, which are written as YYYY-MM-DD HH:MM:SS+00:00
+0.2.22 - decoding, relabelling, delisting and the extref variable are applied to each
+         response in a single pass by a ResponsePipeline built once per survey
+0.2.21 - json is parsed and written through JsonBackend.py, which uses orjson when it
+         is installed and the json module otherwise
+0.2.20 - decoded task data is cached in .lnpi_cache/decode_cache.sqlite by decoder
+         version and a hash of the task data, so unchanged sessions are not
+         decoded again, DECODE_MAX_SIZE in the cache section limits its size
+0.2.19 - decoders have a decode_batch function which decodes a whole task column
+         at once, decodeData decodes each task column in one call
+0.2.18 - --jobs N decodes the task data in a pool of N processes, small exports
+         are still decoded serially
+0.2.17 - decoders are looked up in a registry built once by the decoders package,
+         only for the task columns present in the export, without eval
+0.2.16 - BASE_URL in the account section of the config file sets the api root,
+         added FakeQualtricsServer.py for testing without a qualtrics account
+0.2.15 - cache survey designs on disk, validated against lastModified from the
+         survey list, and only fetch each survey design once per run
+0.2.14 - stream the export download to a spooled temp file and parse the responses
+         one at a time instead of holding several copies of the export in memory
+0.2.13 - --incremental exports only new responses using the export continuationToken
+         or a recordedDate watermark, state is kept in lnpi_sync_state.json
+0.2.12 - export several surveys in one run with --index 1,4,7, --survey-id or
+         --all, the exports run concurrently up to --max-exports
+0.2.11 - throttle api calls per endpoint family with token buckets and retry
+         429/5xx responses with jittered backoff that respects Retry-After
+0.2.10 - adaptive export polling driven by percentComplete with a configurable
+         deadline (--deadline) replacing the fixed 2 sec poll and 20 sec limit
+0.2.9 - follow nextPage for mailing lists, contacts and surveys so long lists
+        are no longer truncated, survey lookup by index stops at the index
+0.2.8 - resolve contactLookupIds concurrently with --workers, failed lookups
+        are reported without aborting the list
+0.2.7 - use one pooled keep-alive requests session for all api calls,
+        pool size and timeout can be set in the http section of the config file
 0.2.6 - fixed bug in timezone conversion
 0.2.5 - when using a webfile, use the TimeZone to change the naive datetime to a timezone aware datetime
         this is found in the third row of the webfile. {"ImportId":"startDate","timeZone":"America/Chicago"}
@@ -55,6 +149,1089 @@ pyinstaller --hidden-import decoders.SpatialSpan --hidden-import decoders.Trails
 
 """
 
+# response fields in the order of a qualtrics export
+RESPONSE_FIELDS = [
+    'startDate', 'endDate', 'status', 'ipAddress', 'progress', 'duration',
+    'finished', 'recordedDate', '_recordId', 'recipientLastName',
+    'recipientFirstName', 'recipientEmail', 'externalDataReference',
+    'locationLatitude', 'locationLongitude', 'distributionChannel', 'userLanguage',
+]
+
+# dtypes of the response fields in every export, see compileSchema
+RESPONSE_DTYPES = {
+    'startDate': 'datetime',
+    'endDate': 'datetime',
+    'recordedDate': 'datetime',
+    'status': 'Int64',
+    'progress': 'Int64',
+    'duration': 'Int64',
+    'finished': 'Int64',
+    'distributionChannel': 'category',
+    'userLanguage': 'category',
+    '_recordId': 'string',
+    'recipientEmail': 'string',
+    'recipientFirstName': 'string',
+    'recipientLastName': 'string',
+    'externalDataReference': 'string',
+    'extRef': 'string',
+}
+
+# question selectors with a single answer, their columns are categoricals
+SINGLE_ANSWER_SELECTORS = ['SAVR', 'SAHR', 'SACOL', 'DL', 'SB', 'NPS']
+
+# suffix of the dataframe file for each output format, parquet and feather need pyarrow
+OUTPUT_SUFFIXES = {'csv': '_df.csv', 'parquet': '_df.parquet', 'feather': '_df.feather'}
+
+def iterJsonArray(fp, key='responses', chunkSize=1024*1024):
+    """
+    iterate over the items of the array under key in a json file, parsing
+    one item at a time
+
+    Only the top level object {"responses": [...]} of the qualtrics export
+    is supported, the key has to come before any other array in the file.
+    The items can be any json values, each is complete once the , or ]
+    after it has been read.
+
+    fp - binary or text file object
+    """
+    if not isinstance(fp, io.TextIOBase):
+        fp = io.TextIOWrapper(fp, encoding='utf-8')
+    decoder = json.JSONDecoder()
+
+    buffer = ''
+    eof = False
+
+    def read():
+        nonlocal buffer, eof
+        chunk = fp.read(chunkSize)
+        if chunk == '':
+            eof = True
+        buffer += chunk
+
+    # find the start of the array
+    while True:
+        start = buffer.find(f'"{key}"')
+        if start >= 0:
+            bracket = buffer.find('[', start)
+            if bracket >= 0:
+                pos = bracket + 1
+                break
+        if eof:
+            raise ValueError(f"no {key} array found")
+        read()
+
+    while True:
+        # skip the whitespace and the separating comma
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer = ''
+            pos = 0
+            read()
+        if pos >= len(buffer):
+            raise ValueError(f"{key} array is not terminated")
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+        if end is not None:
+            # a number cut at the end of a chunk decodes as a shorter number,
+            # the item is only complete when a , or ] follows it
+            after = end
+            while after < len(buffer) and buffer[after] in ' \t\r\n':
+                after += 1
+            if after < len(buffer) and buffer[after] in ',]':
+                yield item
+                pos = end
+                continue
+            if eof:
+                raise ValueError(f"{key} array item is not followed by , or ]")
+        # the item continues in the next chunk
+        buffer = buffer[pos:]
+        pos = 0
+        read()
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a default timeout, requests has no session wide timeout
+    """
+
+    def __init__(self, timeout=60, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+class TokenBucket:
+    """
+    Thread safe token bucket, allows rate requests per second on average
+    with bursts of up to burst requests
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        take a token, sleeping until one is available
+
+        returns the number of seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+class RequestScheduler:
+    """
+    Sends the api requests for LNPIQualtrics
+
+    Each endpoint family (mailinglists, contacts, surveys, export-responses)
+    is throttled by its own token bucket. Responses with a status in
+    RETRY_STATUS and connection errors are retried with jittered exponential
+    backoff, waiting at least as long as a Retry-After header asks, up to
+    RETRY_AFTER_MAX. The retries of a run are limited by a retry budget.
+
+    A request with a method that is not in IDEMPOTENT_METHODS, e.g. the
+    POST that starts an export, is only retried after a 429 or an error
+    before the connection was made, the server may have acted on it.
+
+    Counters of the requests, retries and time spent waiting are in stats,
+    each attempt is also added to the http profile of profiler.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    # requests per second and burst size for each endpoint family
+    DEFAULT_RATE_LIMITS = {
+        'mailinglists': [10, 20],
+        'contacts': [20, 40],
+        'surveys': [10, 20],
+        'export-responses': [5, 10],
+        'default': [10, 20],
+    }
+
+    def __init__(self, session, httpConfig=None, profiler=None):
+        if httpConfig is None:
+            httpConfig = {}
+        self.session = session
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.maxRetries = httpConfig.get('MAX_RETRIES', 5)
+        self.retryBudget = httpConfig.get('RETRY_BUDGET', 100)
+        self.backoffBase = httpConfig.get('BACKOFF_BASE', 0.5)
+        self.backoffMax = httpConfig.get('BACKOFF_MAX', 60)
+        self.retryAfterMax = httpConfig.get('RETRY_AFTER_MAX', 300)
+
+        rateLimits = dict(self.DEFAULT_RATE_LIMITS)
+        rateLimits.update(httpConfig.get('RATE_LIMITS', None) or {})
+        self.buckets = {family: TokenBucket(rate, burst)
+                        for family, (rate, burst) in rateLimits.items()}
+
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'throttleWait': 0.0,
+            'retryWait': 0.0,
+        }
+
+    def endpointFamily(self, url):
+        """
+        get the endpoint family of an api url
+        """
+        path = urllib.parse.urlparse(url).path
+        for family in ['export-responses', 'contacts', 'mailinglists', 'surveys']:
+            if f"/{family}" in path:
+                return family
+        return 'default'
+
+    def retryDelay(self, attempt, response=None):
+        """
+        seconds to wait before the next attempt, full jitter exponential backoff
+        which is raised to the Retry-After header if the response has one,
+        at most retryAfterMax seconds
+        """
+        delay = random.uniform(0, min(self.backoffMax, self.backoffBase * 2 ** attempt))
+        if response is not None:
+            retryAfter = response.headers.get('Retry-After', None)
+            if retryAfter is not None:
+                try:
+                    seconds = float(retryAfter)
+                except ValueError:
+                    # HTTP-date form
+                    try:
+                        retryDate = email.utils.parsedate_to_datetime(retryAfter)
+                        seconds = (retryDate - datetime.now(retryDate.tzinfo)).total_seconds()
+                    except (TypeError, ValueError):
+                        seconds = 0.0
+                if not math.isfinite(seconds):
+                    seconds = 0.0
+                delay = max(delay, min(seconds, self.retryAfterMax))
+        return delay
+
+    @staticmethod
+    def beforeConnection(error):
+        """
+        check that a connection error was raised before the connection was
+        made, so the server did not receive the request
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+            reason = getattr(error.args[0], 'reason', error.args[0])
+            return isinstance(reason, urllib3.exceptions.NewConnectionError)
+        return False
+
+    @staticmethod
+    def transferred(response, stream=False):
+        """
+        bytes sent and received by a request, the body of a streamed
+        response is counted as it is read, see downloadExportFile
+        """
+        if response is None:
+            return {'sent': 0, 'received': 0}
+        body = response.request.body if response.request is not None else None
+        received = 0 if stream else len(response.content or b'')
+        return {'sent': len(body or b''), 'received': received}
+
+    def request(self, method, url, **kwargs):
+        """
+        send a request, throttled and retried as needed
+
+        returns the last response, raises the last connection error if all
+        the attempts failed without a response
+        """
+        family = self.endpointFamily(url)
+        bucket = self.buckets.get(family, self.buckets['default'])
+
+        attempt = 0
+        while True:
+            waited = bucket.acquire()
+            response = None
+            error = None
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            if self.profiler.enabled:
+                self.profiler.request(family, time.perf_counter() - start, **self.transferred(response, kwargs.get('stream', False)),
+                                      error=error is not None or response.status_code >= 400,
+                                      waited=waited)
+
+            with self.lock:
+                self.stats['requests'] += 1
+                self.stats['throttleWait'] += waited
+                if method.upper() in self.IDEMPOTENT_METHODS:
+                    retry = error is not None or response.status_code in self.RETRY_STATUS
+                elif error is not None:
+                    retry = self.beforeConnection(error)
+                else:
+                    retry = response.status_code == 429
+                retry = retry and attempt < self.maxRetries and self.retryBudget > 0
+                if retry:
+                    self.retryBudget -= 1
+                    self.stats['retries'] += 1
+
+            if not retry:
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self.retryDelay(attempt, response)
+            with self.lock:
+                self.stats['retryWait'] += delay
+            reason = error if error is not None else response.status_code
+            print(f"Retrying {method} {url} in {delay:.1f} seconds ({reason})")
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+class Profiler:
+    """
+    Collects where the time of a run goes, see --profile
+
+    stages   - wall and cpu seconds of each stage of an export (export_poll,
+               download, parse, decode, relabel, delist, extref, dataframe,
+               write_csv ...), the cpu time is that of the thread running
+               the stage, and the peak RSS of the process at its end
+    http     - requests, errors, seconds, bytes sent and received and the
+               throttle wait of each endpoint family
+    decoders - calls, sessions, seconds parsing the task json and decoding,
+               and sessions found in the decode cache of each task
+
+    The stages named in capture are also run under cProfile, one at a time,
+    their statistics are joined in self.captured. A disabled profiler does
+    not time anything.
+    """
+
+    def __init__(self, enabled=False, capture=None):
+        self.enabled = enabled
+        self.capture = set(capture or []) if enabled else set()
+        self.lock = threading.Lock()
+        self.captureLock = threading.Lock()
+        self.captured = None
+        self.stages = {}
+        self.http = {}
+        self.decoders = {}
+        self.startWall = time.perf_counter()
+        self.startCpu = time.process_time()
+
+    @staticmethod
+    def peakRss():
+        """
+        peak resident memory of the process in MB, None where it is not
+        available
+        """
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KB elsewhere
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        context manager timing the code in it as the stage name
+        """
+        if not self.enabled:
+            yield
+            return
+        profile = None
+        if name in self.capture:
+            import cProfile
+            self.captureLock.acquire()
+            profile = cProfile.Profile()
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            if profile is not None:
+                profile.enable()
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+            if profile is not None:
+                if self.captured is None:
+                    import pstats
+                    self.captured = pstats.Stats(profile)
+                else:
+                    self.captured.add(profile)
+                self.captureLock.release()
+
+    def add(self, name, wall, cpu=0.0):
+        """
+        add a call of the stage name that took wall and cpu seconds
+        """
+        if not self.enabled:
+            return
+        peak = self.peakRss()
+        with self.lock:
+            stats = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_rss_mb': None})
+            stats['calls'] += 1
+            stats['wall'] += wall
+            stats['cpu'] += cpu
+            if peak is not None:
+                stats['peak_rss_mb'] = max(peak, stats['peak_rss_mb'] or 0.0)
+
+    def timed(self, name, func):
+        """
+        func timed as the stage name, func itself when disabled, used for
+        the stages of a ResponsePipeline which are called for each response
+        """
+        if not self.enabled:
+            return func
+        def timedFunc(*args, **kwargs):
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+        return timedFunc
+
+    def request(self, family, seconds, sent=0, received=0, error=False, waited=0.0):
+        """
+        add a request to an endpoint family
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.http.setdefault(family, {'requests': 0, 'errors': 0, 'seconds': 0.0,
+                                                  'bytes_sent': 0, 'bytes_received': 0,
+                                                  'throttle_wait': 0.0})
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['seconds'] += seconds
+            stats['bytes_sent'] += sent
+            stats['bytes_received'] += received
+            stats['throttle_wait'] += waited
+
+    def received(self, family, size):
+        """
+        add bytes of a streamed response body to an endpoint family
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.http[family]['bytes_received'] += size
+
+    def decoder(self, task, sessions, parseSeconds=0.0, decodeSeconds=0.0, cached=0):
+        """
+        add a call of the decoder of task on sessions sessions, cached
+        sessions were found in the decode cache and not decoded
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.decoders.setdefault(task, {'calls': 0, 'sessions': 0, 'parse_seconds': 0.0,
+                                                    'decode_seconds': 0.0, 'cached': 0})
+            if sessions:
+                stats['calls'] += 1
+            stats['sessions'] += sessions
+            stats['parse_seconds'] += parseSeconds
+            stats['decode_seconds'] += decodeSeconds
+            stats['cached'] += cached
+
+    def results(self):
+        """
+        the profile of the run as a dict which can be written as json
+        """
+        with self.lock:
+            return {
+                'version': __version__,
+                'wall': time.perf_counter() - self.startWall,
+                'cpu': time.process_time() - self.startCpu,
+                'peak_rss_mb': self.peakRss(),
+                'stages': {name: dict(stats) for name, stats in self.stages.items()},
+                'http': {name: dict(stats) for name, stats in self.http.items()},
+                'decoders': {name: dict(stats) for name, stats in self.decoders.items()},
+            }
+
+    def report(self, top=20):
+        """
+        the profile of the run as text, with the top functions by cumulative
+        time of the captured stages
+        """
+        results = self.results()
+        peak = results['peak_rss_mb']
+        lines = [f"Profile: wall {results['wall']:.2f} sec, cpu {results['cpu']:.2f} sec, "
+                 f"peak RSS {'n/a' if peak is None else f'{peak:.1f} MB'}"]
+        if results['stages']:
+            lines.append(f"  {'stage':24s} {'calls':>8s} {'wall sec':>10s} {'cpu sec':>10s} {'peak RSS MB':>12s}")
+            for name, stats in results['stages'].items():
+                peak = stats['peak_rss_mb']
+                lines.append(f"  {name:24s} {stats['calls']:8d} {stats['wall']:10.3f} {stats['cpu']:10.3f} "
+                             f"{'' if peak is None else f'{peak:.1f}':>12s}")
+        if results['http']:
+            lines.append(f"  {'endpoint':24s} {'requests':>8s} {'errors':>8s} {'sec':>10s} "
+                         f"{'sent KB':>10s} {'recv KB':>10s} {'throttle sec':>12s}")
+            for name, stats in results['http'].items():
+                lines.append(f"  {name:24s} {stats['requests']:8d} {stats['errors']:8d} {stats['seconds']:10.3f} "
+                             f"{stats['bytes_sent']/1e3:10.1f} {stats['bytes_received']/1e3:10.1f} "
+                             f"{stats['throttle_wait']:12.3f}")
+        if results['decoders']:
+            lines.append(f"  {'decoder':24s} {'calls':>8s} {'sessions':>8s} {'parse sec':>10s} "
+                         f"{'decode sec':>10s} {'cached':>8s}")
+            for name, stats in results['decoders'].items():
+                lines.append(f"  {name:24s} {stats['calls']:8d} {stats['sessions']:8d} "
+                             f"{stats['parse_seconds']:10.3f} {stats['decode_seconds']:10.3f} {stats['cached']:8d}")
+        if self.captured is not None:
+            stream = io.StringIO()
+            self.captured.stream = stream
+            self.captured.sort_stats('cumulative').print_stats(top)
+            lines.append(f"cProfile of {', '.join(sorted(self.capture))}, top {top} by cumulative time:")
+            lines.extend('  ' + line for line in stream.getvalue().strip('\n').splitlines())
+        return '\n'.join(lines)
+
+    def dump(self, fileName):
+        """
+        write the profile of the run to a json file
+        """
+        writeJsonAtomic(fileName, self.results(), indent=2)
+
+    def dumpCaptured(self, fileName):
+        """
+        write the cProfile statistics of the captured stages, they can be
+        read with pstats or snakeviz, returns False if nothing was captured
+        """
+        if self.captured is None:
+            return False
+        self.captured.dump_stats(fileName)
+        return True
+
+def writeJsonAtomic(fileName, data, indent=None):
+    """
+    write data to a json file, replacing it only once it is complete
+    """
+    dirName = os.path.dirname(fileName)
+    if dirName:
+        os.makedirs(dirName, exist_ok=True)
+    fd, tmpFileName = tempfile.mkstemp(dir=dirName or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            JsonBackend.dump(data, fp, indent=indent)
+        os.replace(tmpFileName, fileName)
+    except BaseException:
+        os.remove(tmpFileName)
+        raise
+
+class SyncState:
+    """
+    Local store of the incremental export state of each survey
+
+    The state is kept in a json file keyed by surveyId and written
+    atomically after each update.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.lock = threading.Lock()
+        self.state = {}
+        if os.path.exists(fileName):
+            with open(fileName, 'rb') as fp:
+                self.state = JsonBackend.load(fp)
+
+    def get(self, surveyId):
+        """
+        get a copy of the state for a survey, empty if never exported
+        """
+        with self.lock:
+            return dict(self.state.get(surveyId, {}))
+
+    def update(self, surveyId, **kwargs):
+        """
+        update the state for a survey and save the file
+        """
+        with self.lock:
+            self.state.setdefault(surveyId, {}).update(kwargs)
+            writeJsonAtomic(self.fileName, self.state, indent=4)
+
+class SurveyIndex:
+    """
+    Local copy of the survey list
+
+    Used to find surveys by name without listing all the surveys every
+    run, its lastModified is not used to validate the cached survey
+    designs. The list is kept in a json
+    file with the time it was read and the api root it came from, and is
+    used until it is ttl seconds old.
+    """
+
+    def __init__(self, fileName, ttl=86400, baseUrl=None):
+        self.fileName = fileName
+        self.ttl = ttl
+        self.baseUrl = baseUrl
+        self.lock = threading.Lock()
+        self.index = {}
+        if os.path.exists(fileName):
+            with open(fileName, 'rb') as fp:
+                self.index = JsonBackend.load(fp)
+
+    def surveys(self):
+        """
+        get the cached survey list, None if there is none, it is older
+        than ttl or it is for another api root
+        """
+        with self.lock:
+            if 'surveys' not in self.index or self.index.get('baseUrl', None) != self.baseUrl:
+                return None
+            if time.time() - self.index.get('updated', 0) >= self.ttl:
+                return None
+            return list(self.index['surveys'])
+
+    def update(self, surveys):
+        """
+        replace the cached survey list and save the file
+        """
+        with self.lock:
+            self.index = {'updated': time.time(), 'baseUrl': self.baseUrl, 'surveys': list(surveys)}
+            writeJsonAtomic(self.fileName, self.index)
+
+class DecodeCache:
+    """
+    Local store of decoded task data
+
+    The results of each session are kept in a sqlite database keyed by the
+    decoder, its version and a hash of the raw task data, so sessions seen in
+    earlier exports are not decoded again. Once the database holds more than
+    maxSize bytes of results the least recently used are removed.
+    """
+
+    def __init__(self, fileName, maxSize=256*1024*1024):
+        self.fileName = fileName
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+        # decoders whose results of other versions have been removed
+        self.checked = set()
+        dirName = os.path.dirname(fileName)
+        if dirName:
+            os.makedirs(dirName, exist_ok=True)
+        self.db = sqlite3.connect(fileName, timeout=30, check_same_thread=False)
+        with self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS decoded (
+                decoder TEXT, version TEXT, hash TEXT, result TEXT,
+                size INTEGER, used REAL,
+                PRIMARY KEY (decoder, version, hash))""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS decoded_used ON decoded (used)")
+            # maxSize may be smaller than in the last run
+            self.evict()
+
+    @staticmethod
+    def hash(tdata):
+        """
+        hash of the raw task data
+        """
+        return hashlib.blake2b(tdata.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, decoder, version, hashes):
+        """
+        get the cached results for hashes
+
+        returns a dict of hash to the dict of results of the session
+        """
+        found = {}
+        hashes = list(set(hashes))
+        with self.lock, self.db:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                rows = self.db.execute(
+                    f"SELECT hash, result FROM decoded WHERE decoder=? AND version=? AND hash IN ({marks})",
+                    [decoder, version] + chunk)
+                found.update((key, JsonBackend.loads(result)) for key, result in rows)
+                self.db.execute(
+                    f"UPDATE decoded SET used=? WHERE decoder=? AND version=? AND hash IN ({marks})",
+                    [time.time(), decoder, version] + chunk)
+        return found
+
+    def put(self, decoder, version, results):
+        """
+        add results, a list of (hash, dict of results of the session), and
+        remove the least recently used results if the cache is too big
+        """
+        now = time.time()
+        rows = []
+        for key, result in results:
+            text = JsonBackend.dumps(result)
+            rows.append((decoder, version, key, text, len(text), now))
+        with self.lock, self.db:
+            if decoder not in self.checked:
+                # results of other versions of the decoder are never used
+                self.db.execute("DELETE FROM decoded WHERE decoder=? AND version<>?",
+                                (decoder, version))
+                self.checked.add(decoder)
+            self.db.executemany("INSERT OR REPLACE INTO decoded VALUES (?,?,?,?,?,?)", rows)
+            self.evict()
+
+    def evict(self):
+        """
+        remove the least recently used results if there are more than maxSize
+        bytes, keeping up to 90% of maxSize
+        """
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM decoded").fetchone()[0]
+        if total > self.maxSize:
+            self.db.execute("""DELETE FROM decoded WHERE rowid IN (
+                SELECT rowid FROM (SELECT rowid,
+                    SUM(size) OVER (ORDER BY used DESC, rowid DESC) AS total
+                    FROM decoded) WHERE total > ?)""", (self.maxSize * 0.9,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class ResponsePipeline:
+    """
+    Transformations of the responses of a survey applied in a single pass
+
+    The pipeline is built once per survey, see LNPIQualtrics.compilePipeline,
+    from the task columns to decode and stages, functions which change the
+    values of one response in place. run() decodes each task column in one
+    call and then, for each response in turn, replaces its task data with
+    the decoded results and applies the stages.
+    """
+
+    def __init__(self, tasks=None, decodeColumn=None, stages=None, remove=True, profiler=None):
+        """
+        tasks        - names of the task columns to decode
+        decodeColumn - function(task, data) returning the results by column
+                       for the raw task data of the sessions
+        stages       - functions(values) applied to each response in order
+        remove       - remove the original task data from the responses
+        profiler     - Profiler timing the decoding as the decode stage
+        """
+        self.tasks = list(tasks or [])
+        self.decodeColumn = decodeColumn
+        self.stages = list(stages or [])
+        self.remove = remove
+        self.profiler = profiler if profiler is not None else Profiler()
+
+    @staticmethod
+    def relabelStage(labels):
+        """
+        stage renaming the keys in labels, e.g. {'QID40': 'QN01_mood'},
+        the renamed values move to the end of the response
+        """
+        def relabel(values):
+            for key in [key for key in values if key in labels]:
+                values[labels[key]] = values.pop(key)
+        return relabel
+
+    @staticmethod
+    def delistStage():
+        """
+        stage converting a list with a single item to a number, or the
+        item itself when it is not a number, other lists become None
+        """
+        def delist(values):
+            for key, value in values.items():
+                if type(value) is list:
+                    if len(value) == 1:
+                        try:
+                            values[key] = float(value[0])
+                        except (TypeError, ValueError):
+                            values[key] = value[0]
+                    else:
+                        values[key] = None
+        return delist
+
+    @staticmethod
+    def extRefStage(emailLookup, emailKey='recipientEmail'):
+        """
+        stage adding extRef, looked up by the email of the response
+        """
+        def extRef(values):
+            values['extRef'] = emailLookup.get(values.get(emailKey, None), None)
+        return extRef
+
+    def run(self, ddict):
+        """
+        transform the responses in ddict, returns {"responses": [...]}
+        """
+        responses = ddict['responses']
+
+        # decode each task column in one call
+        # values seen None and '-1', '{}
+        decoded = []
+        with self.profiler.stage('decode'):
+            for task in self.tasks:
+                positions = [-1] * len(responses)
+                data = []
+                for i, response in enumerate(responses):
+                    tdata = response['values'].get(task, None)
+                    if type(tdata) == str and tdata not in ['-1', '{}']:
+                        positions[i] = len(data)
+                        data.append(tdata)
+                if data:
+                    decoded.append((task, positions, self.decodeColumn(task, data)))
+
+        for i, response in enumerate(responses):
+            values = response['values']
+            for task, positions, results in decoded:
+                j = positions[i]
+                if j >= 0:
+                    for key, column in results.items():
+                        values[key] = column[j]
+                    # remove original data
+                    if self.remove:
+                        values.pop(task)
+            for stage in self.stages:
+                stage(values)
+
+        return {"responses": list(responses)}
+
+class CsvStreamWriter:
+    """
+    Writes a dataframe csv file chunk by chunk
+
+    The chunks are written to a temporary body file using the columns given
+    up front, columns found in a chunk that were not expected are added at
+    the end. close() writes the header and copies the body into the csv
+    file, keeping only the columns found in some chunk, so only one chunk
+    is held in memory at a time.
+    """
+
+    def __init__(self, fileName, columns, index=True):
+        self.fileName = fileName
+        self.columns = list(columns)
+        self.index = index
+        self.seen = set()
+        self.rows = 0
+        dirName = os.path.dirname(fileName)
+        fd, self.bodyFileName = tempfile.mkstemp(dir=dirName or '.', suffix='.tmp')
+        self.body = os.fdopen(fd, 'w', newline='', encoding='utf-8')
+
+    def write(self, df):
+        """
+        append the rows of df, numbered after the rows already written
+        """
+        for col in df.columns:
+            if col not in self.seen:
+                self.seen.add(col)
+                if col not in self.columns:
+                    self.columns.append(col)
+        df.index = range(self.rows, self.rows + len(df))
+        df.reindex(columns=self.columns).to_csv(self.body, header=False, index=self.index)
+        self.rows += len(df)
+
+    def close(self):
+        """
+        write the csv file with the header and the rows written so far
+        """
+        self.body.close()
+        columns = [col for col in self.columns if col in self.seen]
+        positions = [self.columns.index(col) for col in columns]
+        first = 1 if self.index else 0
+        dirName = os.path.dirname(self.fileName)
+        fd, tmpFileName = tempfile.mkstemp(dir=dirName or '.', suffix='.tmp')
+        try:
+            with open(self.bodyFileName, newline='', encoding='utf-8') as body, \
+                 os.fdopen(fd, 'w', newline='', encoding='utf-8') as fp:
+                writer = csv.writer(fp, lineterminator=os.linesep)
+                writer.writerow([''] * first + columns)
+                for row in csv.reader(body):
+                    # rows written before a column was added are shorter
+                    writer.writerow(row[:first] + [row[first + i] if first + i < len(row) else ''
+                                                   for i in positions])
+            os.replace(tmpFileName, self.fileName)
+        except BaseException:
+            os.remove(tmpFileName)
+            raise
+        finally:
+            os.remove(self.bodyFileName)
+
+    def discard(self):
+        """
+        remove the rows written so far without writing the csv file
+        """
+        self.body.close()
+        os.remove(self.bodyFileName)
+
+def outputFormat(fileName):
+    """
+    get the output format of a dataframe file from its suffix, default csv
+    """
+    for format, suffix in OUTPUT_SUFFIXES.items():
+        if fileName.endswith(os.path.splitext(suffix)[1]):
+            return format
+    return 'csv'
+
+def havePyarrow():
+    """
+    check that pyarrow, needed for the parquet and feather output formats,
+    is installed without importing it
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+def arrowTable(df):
+    """
+    convert a dataframe to an arrow table without its index
+
+    Columns arrow cannot convert, e.g. with numbers and text or with lists
+    of mixed values, are stored as strings.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow
+
+    try:
+        return pyarrow.Table.from_pandas(df, preserve_index=False)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, pyarrow.ArrowNotImplementedError):
+        pass
+    df = df.copy()
+    for col in df.columns:
+        try:
+            pyarrow.array(df[col], from_pandas=True)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, pyarrow.ArrowNotImplementedError):
+            df[col] = df[col].map(lambda value: value if value is None or value is pd.NA
+                                  or (isinstance(value, float) and np.isnan(value))
+                                  else str(value)).astype('string')
+    return pyarrow.Table.from_pandas(df, preserve_index=False)
+
+def writeArrowFile(df, fileName, compression='zstd'):
+    """
+    write a dataframe to a parquet or feather file, chosen by the suffix
+    of fileName
+
+    compression - zstd, lz4 or uncompressed
+    """
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    table = arrowTable(df)
+    if outputFormat(fileName) == 'feather':
+        pyarrow.feather.write_feather(table, fileName, compression=compression)
+    else:
+        pyarrow.parquet.write_table(table, fileName,
+                                    compression='none' if compression == 'uncompressed' else compression)
+
+class ParquetStreamWriter:
+    """
+    Writes a dataframe parquet file chunk by chunk
+
+    Each chunk is written to a temporary parquet file with the types arrow
+    gives its columns. close() finds a type for each column that holds the
+    values of all the chunks, e.g. a column without values in the first
+    chunk or with integers in one chunk and decimals in the next, and copies
+    the chunks one at a time into the parquet file as row groups. Columns
+    with types that cannot be combined are stored as strings. The columns
+    are in the order of CsvStreamWriter.
+    """
+
+    def __init__(self, fileName, columns, compression='zstd'):
+        self.fileName = fileName
+        self.columns = list(columns)
+        self.compression = 'none' if compression == 'uncompressed' else compression
+        self.seen = set()
+        self.rows = 0
+        self.chunkFileNames = []
+        dirName = os.path.dirname(fileName)
+        self.chunkDir = tempfile.mkdtemp(dir=dirName or '.', suffix='.tmp')
+
+    def write(self, df):
+        """
+        append the rows of df
+        """
+        import pyarrow.parquet
+
+        for col in df.columns:
+            if col not in self.seen:
+                self.seen.add(col)
+                if col not in self.columns:
+                    self.columns.append(col)
+        chunkFileName = os.path.join(self.chunkDir, f"{len(self.chunkFileNames)}.parquet")
+        pyarrow.parquet.write_table(arrowTable(df), chunkFileName, compression='none')
+        self.chunkFileNames.append(chunkFileName)
+        self.rows += len(df)
+
+    def unifiedSchema(self, schemas):
+        """
+        get the schema of the parquet file from the schemas of the chunks
+        """
+        import pyarrow
+
+        fields = []
+        columnsMeta = {}
+        for col in self.columns:
+            if col not in self.seen:
+                continue
+            types = [schema.field(col).type for schema in schemas
+                     if col in schema.names and schema.field(col).type != pyarrow.null()]
+            if not types:
+                fieldType = pyarrow.null()
+            else:
+                try:
+                    fieldType = pyarrow.unify_schemas([pyarrow.schema([(col, t)]) for t in types],
+                                                      promote_options='permissive').field(col).type
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                    fieldType = pyarrow.large_string()
+            fields.append(pyarrow.field(col, fieldType))
+            # pandas metadata of a chunk where the column has this type
+            for schema in schemas:
+                if col in schema.names and schema.field(col).type == fieldType:
+                    meta = JsonBackend.loads((schema.metadata or {}).get(b'pandas', b'{}'))
+                    for entry in meta.get('columns', []):
+                        if entry.get('name', None) == col:
+                            columnsMeta[col] = entry
+                    break
+
+        # the pandas metadata restores dtypes such as Int64 when it is read
+        meta = JsonBackend.loads((schemas[0].metadata or {}).get(b'pandas', b'{}'))
+        meta['columns'] = [columnsMeta[field.name] for field in fields if field.name in columnsMeta]
+        return pyarrow.schema(fields, metadata={b'pandas': JsonBackend.dumpb(meta)})
+
+    def close(self):
+        """
+        write the parquet file with the rows written so far
+        """
+        import pandas as pd
+        import pyarrow.parquet
+
+        try:
+            schemas = [pyarrow.parquet.read_schema(chunkFileName)
+                       for chunkFileName in self.chunkFileNames]
+            if not schemas:
+                schemas = [pyarrow.Table.from_pandas(pd.DataFrame(), preserve_index=False).schema]
+            schema = self.unifiedSchema(schemas)
+            dirName = os.path.dirname(self.fileName)
+            fd, tmpFileName = tempfile.mkstemp(dir=dirName or '.', suffix='.tmp')
+            os.close(fd)
+            try:
+                with pyarrow.parquet.ParquetWriter(tmpFileName, schema,
+                                                   compression=self.compression) as writer:
+                    for chunkFileName in self.chunkFileNames:
+                        table = pyarrow.parquet.read_table(chunkFileName)
+                        columns = []
+                        for field in schema:
+                            if field.name not in table.column_names:
+                                columns.append(pyarrow.nulls(len(table), field.type))
+                            elif table.schema.field(field.name).type == field.type:
+                                columns.append(table.column(field.name))
+                            elif pyarrow.types.is_dictionary(table.schema.field(field.name).type) \
+                                    and not pyarrow.types.is_dictionary(field.type):
+                                # categories stored as strings
+                                columns.append(table.column(field.name).cast(
+                                    table.schema.field(field.name).type.value_type).cast(field.type))
+                            else:
+                                columns.append(table.column(field.name).cast(field.type))
+                        writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+                os.replace(tmpFileName, self.fileName)
+            except BaseException:
+                os.remove(tmpFileName)
+                raise
+        finally:
+            shutil.rmtree(self.chunkDir, ignore_errors=True)
+
+    def discard(self):
+        """
+        remove the rows written so far without writing the parquet file
+        """
+        shutil.rmtree(self.chunkDir, ignore_errors=True)
+
+def decodeTaskChunk(chunk):
+    """
+    decode a chunk of task data, runs in the decodeData process pool
+
+    chunk - (task, list with the raw json string of each session)
+
+    returns the decoded results by column, see decoders.decodeBatch
+    """
+    import decoders
+
+    task, data = chunk
+    return decoders.decodeBatch(task, [JsonBackend.loads(tdata) for tdata in data])
+
+class IncompleteListError(Exception):
+    """
+    raised by iterPages when a page after the first could not be retrieved
+    """
+
 class LNPIQualtrics:
     
     """
@@ -64,8 +1241,12 @@ class LNPIQualtrics:
     
     def __init__(self, apiToken, dataCenter,directoryId,
                  verify=True,nodecode=False,rawdata=False,
-                 dataframe = False, extref=None,sublist=None):
-        
+                 dataframe = False, extref=None,sublist=None,
+                 httpConfig=None, exportConfig=None, syncState=None,
+                 cacheDir=None, baseUrl=None, jobs=1, decodeConfig=None,
+                 decodeCacheSize=256*1024*1024, stream=False, outputConfig=None,
+                 profiler=None, surveyIndexTtl=86400):
+
         self.apiToken = apiToken
         self.dataCenter = dataCenter
         self.directoryId = directoryId
@@ -75,35 +1256,203 @@ class LNPIQualtrics:
         self.dataframe = dataframe
         self.extref = extref
         self.sublist = sublist
-
-    def getMailingLists(self):
+        # root of the api, BASE_URL in the config file can point this at
+        # another server such as FakeQualtricsServer.py
+        if baseUrl is None:
+            baseUrl = f"https://{dataCenter}.qualtrics.com/API/v3"
+        self.baseUrl = baseUrl.rstrip('/')
+        # export polling settings, see exportResponsesProgress
+        self.exportConfig = exportConfig if exportConfig is not None else {}
+        self.exportStats = {}
+        # per survey state for incremental exports, see getResponsesIncremental
+        self.syncState = syncState
+        # survey designs are cached on disk under cacheDir, None disables
+        self.cacheDir = cacheDir
+        self.surveyInfoCache = {}
+        self.surveyLastModified = {}
+        # the survey list is cached in cacheDir/survey_index.json for
+        # surveyIndexTtl seconds, 0 disables, see getSurveyIndex
+        self.surveyIndex = None
+        if cacheDir is not None and surveyIndexTtl:
+            self.surveyIndex = SurveyIndex(os.path.join(cacheDir, 'survey_index.json'),
+                                           surveyIndexTtl, self.baseUrl)
+        self.surveyIndexRefreshed = False
+        self.surveyIndexLock = threading.Lock()
+        # decoded task data is cached in cacheDir/decode_cache.sqlite up to
+        # decodeCacheSize bytes, 0 disables
+        self.decodeCache = None
+        if cacheDir is not None and decodeCacheSize:
+            self.decodeCache = DecodeCache(os.path.join(cacheDir, 'decode_cache.sqlite'),
+                                           decodeCacheSize)
+        # task data is decoded in a pool of jobs processes, 1 decodes serially
+        self.jobs = jobs
+        self.decodeConfig = decodeConfig if decodeConfig is not None else {}
+        self.decodeExecutor = None
+        self.decodeLock = threading.Lock()
+        # write the dataframe csv chunk by chunk as the export is read
+        self.stream = stream
+        # format and compression of the dataframe file, see writeDataFrame
+        self.outputConfig = outputConfig if outputConfig is not None else {}
+        self.outputFormat = self.outputConfig.get('FORMAT', 'csv')
+        self.compression = self.outputConfig.get('COMPRESSION', 'zstd')
+        # email to extRef lookup for extref, see getExtRefLookup
+        self.extRefLookup = None
+        self.extRefLock = threading.Lock()
+        # times the stages, api calls and decoders of the run, see --profile
+        self.profiler = profiler if profiler is not None else Profiler()
+
+        # one pooled keep-alive session is shared by all the api calls
+        self.session = self.createSession(httpConfig)
+        # all the api calls are throttled and retried by the scheduler
+        self.scheduler = RequestScheduler(self.session, httpConfig, profiler=self.profiler)
+
+    def createSession(self, httpConfig=None):
         """
-        get a list of MailingList
+        create the http session used for all the api calls
 
-        /API/v3/directories/{directoryId}/mailinglists
- 
+        The connection pool keeps connections to the data center alive
+        so a run only does one TCP+TLS handshake instead of one per call.
+        The x-api-token header and verify setting are applied once here.
+
+        httpConfig - dict from the http section of config_qualtrics.yaml
+            POOL_CONNECTIONS - number of hosts to keep pools for, default 4
+            POOL_MAXSIZE - max connections kept per host, default 16
+            TIMEOUT - seconds to wait for a response, default 60
         """
-        baseUrl = "https://{0}.qualtrics.com/API/v3/directories/{1}/mailinglists?includeCount=true"\
-            .format(self.dataCenter, self.directoryId)
-        headers = {
+        if httpConfig is None:
+            httpConfig = {}
+
+        session = requests.Session()
+        adapter = TimeoutHTTPAdapter(
+            timeout=httpConfig.get('TIMEOUT', 60),
+            pool_connections=httpConfig.get('POOL_CONNECTIONS', 4),
+            pool_maxsize=httpConfig.get('POOL_MAXSIZE', 16),
+            pool_block=True)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        session.headers.update({
             "x-api-token": self.apiToken,
-            }
+            "Connection": "keep-alive",
+            })
+        session.verify = self.verify
+
+        return session
+
+    def close(self):
+        """
+        close the pooled connections, the decode processes and the decode cache
+        """
+        self.session.close()
+        if self.decodeCache is not None:
+            self.decodeCache.close()
+            self.decodeCache = None
+        if self.decodeExecutor is not None:
+            self.decodeExecutor.shutdown()
+            self.decodeExecutor = None
+
+    def request(self, method, url, **kwargs):
+        """
+        send an api request through the rate limited, retrying scheduler
+        """
+        return self.scheduler.request(method, url, **kwargs)
+
+    def getPage(self, pageUrl):
+        """
+        get one page of a paginated list endpoint
+
+        returns the 'result' dict which holds 'elements' and 'nextPage',
+        or None if the request failed
+        """
+        response = self.request('GET', pageUrl)
 
-        response = requests.get(baseUrl, headers=headers, verify=self.verify)
-        
         # if OK
         if response.status_code == 200:
-            # retrieve the CGC
             # convert to dict
-            ddict = json.loads(response.text)
-            mailingLists = ddict['result']['elements']
-            return mailingLists
+            ddict = JsonBackend.loads(response.content)
+            return ddict['result']
         else:
             print(f"Error: {response.status_code}")
             pp.pprint(response.content)
             return None
 
-    def getSurveyInformation(self, surveyId):
+    def iterPages(self, baseUrl, prefetch=False):
+        """
+        iterate over the pages of a paginated list endpoint
+
+        Follows result.nextPage lazily so only one page is held at a time
+        and the caller can stop early. Yields the 'result' dict of each page.
+
+        prefetch - request the next page in the background while the caller
+            consumes the current one
+
+        raises IncompleteListError if a page after the first could not be
+        retrieved, the pages already yielded are only part of the list
+        """
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page = self.getPage(baseUrl)
+            while page is not None:
+                nextPage = page.get('nextPage', None)
+                future = None
+                if executor is not None and nextPage:
+                    future = executor.submit(self.getPage, nextPage)
+                yield page
+                if not nextPage:
+                    break
+                if future is not None:
+                    page = future.result()
+                else:
+                    page = self.getPage(nextPage)
+                if page is None:
+                    print(f"Error: could not get {nextPage}, list is incomplete")
+                    raise IncompleteListError(nextPage)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def iterElements(self, baseUrl, prefetch=False):
+        """
+        iterate over the elements of all pages of a paginated list endpoint
+        """
+        for page in self.iterPages(baseUrl, prefetch=prefetch):
+            yield from page['elements']
+
+    def getElements(self, baseUrl, prefetch=False):
+        """
+        get the elements of all pages of a paginated list endpoint
+
+        returns None if any page could not be retrieved
+        """
+        elements = None
+        try:
+            for page in self.iterPages(baseUrl, prefetch=prefetch):
+                if elements is None:
+                    elements = []
+                elements.extend(page['elements'])
+        except IncompleteListError:
+            return None
+        return elements
+
+    def iterMailingLists(self, prefetch=False):
+        """
+        iterate over the MailingLists, following nextPage as needed
+        """
+        baseUrl = f"{self.baseUrl}/directories/{self.directoryId}/mailinglists?includeCount=true"
+        return self.iterElements(baseUrl, prefetch=prefetch)
+
+    def getMailingLists(self, prefetch=True):
+        """
+        get a list of MailingList
+
+        /API/v3/directories/{directoryId}/mailinglists
+ 
+        """
+        baseUrl = f"{self.baseUrl}/directories/{self.directoryId}/mailinglists?includeCount=true"
+        mailingLists = self.getElements(baseUrl, prefetch=prefetch)
+        return mailingLists
+
+    def getSurveyInformation(self, surveyId, refresh=False):
         """
         get the survey design, provides important information about the questions and 
         design of the survey which aid in its interpretation.
@@ -114,29 +1463,189 @@ class LNPIQualtrics:
         
         baseUrl = "https://{0}.qualtrics.com/API/v3/surveys".format(dataCenter)
         
-        format - output format, default json, others are df for dataframe
+        The survey design is kept for the rest of the run and, when there
+        is a cacheDir, on disk in cacheDir/surveys/{surveyId}.json. The disk
+        copy is used as long as the lastModified of the survey has not
+        changed, see getSurveyLastModified.
+
+        refresh - ignore the cached copies and download the survey design
         """
         
-        baseUrl = "https://{0}.qualtrics.com/API/v3/surveys/{1}".format(self.dataCenter, surveyId)
-        headers = {
-            "x-api-token": self.apiToken,
-            }
+        if not refresh and surveyId in self.surveyInfoCache:
+            return self.surveyInfoCache[surveyId]
+
+        lastModified = None
+        cacheFileName = None
+        if self.cacheDir is not None:
+            cacheFileName = os.path.join(self.cacheDir, 'surveys', f"{surveyId}.json")
+            lastModified = self.getSurveyLastModified(surveyId)
+            if not refresh and lastModified is not None and os.path.exists(cacheFileName):
+                with open(cacheFileName) as fp:
+                    cached = JsonBackend.load(fp)
+                if cached.get('lastModified', None) == lastModified:
+                    self.surveyInfoCache[surveyId] = cached['surveyInfo']
+                    return cached['surveyInfo']
 
-        response = requests.get(baseUrl, headers=headers,verify=self.verify)
+        baseUrl = f"{self.baseUrl}/surveys/{surveyId}"
+        response = self.request('GET', baseUrl)
         
         # if OK
         if response.status_code == 200:
             # retrieve the CGC
             # convert to dict
-            ddict = json.loads(response.text)
+            ddict = JsonBackend.loads(response.content)
             surveyInfo = ddict['result']
+            self.surveyInfoCache[surveyId] = surveyInfo
+            if cacheFileName is not None and lastModified is not None:
+                writeJsonAtomic(cacheFileName, {'lastModified': lastModified,
+                                                'surveyInfo': surveyInfo})
             return surveyInfo
         else:
             print(f"Error: {response.status_code}")
             pp.pprint(response.content)
             return None    
+
+    def getSurveyLastModified(self, surveyId):
+        """
+        get the lastModified of a survey from the api
+
+        It is the one seen when the survey list was read earlier in the run,
+        otherwise it is read from the survey metadata with a single small
+        request. The survey index is not used, it can be older than the
+        survey design.
+
+        API/v3/survey-definitions/{surveyId}/metadata
+
+        returns None if the metadata could not be retrieved, the survey
+        design is then downloaded
+        """
+        lastModified = self.surveyLastModified.get(surveyId, None)
+        if lastModified is not None:
+            return lastModified
+
+        baseUrl = f"{self.baseUrl}/survey-definitions/{surveyId}/metadata"
+        response = self.request('GET', baseUrl)
+        if response.status_code != 200:
+            print(f"Error: {response.status_code}")
+            pp.pprint(response.content)
+            return None
+        lastModified = JsonBackend.loads(response.content)['result'].get('LastModified', None)
+        self.surveyLastModified[surveyId] = lastModified
+        return lastModified
+
+    def getSurveyIndex(self, refresh=False):
+        """
+        get the list of surveys accessible for this user from the survey
+        index, the cached survey list in cacheDir/survey_index.json, used to
+        find surveys by name
+
+        The survey list is read and saved in the index when the index is
+        older than its ttl, SURVEY_INDEX_TTL in the cache section of the
+        config file, default one day, or with refresh. Without a cacheDir
+        the survey list is read once per run. The lastModified in the index
+        does not validate the cached survey designs, see getSurveyLastModified.
+
+        returns the list of surveys or None if the survey list failed
+        """
+        # the concurrent exports of getResponsesMany read the list once
+        with self.surveyIndexLock:
+            surveys = None
+            if not refresh:
+                if self.surveyIndex is not None:
+                    surveys = self.surveyIndex.surveys()
+                elif self.surveyIndexRefreshed:
+                    surveys = self.surveyLists
+            if surveys is None:
+                surveys = self.getSurveyList()
+                if surveys is None:
+                    return None
+                self.surveyIndexRefreshed = True
+                if self.surveyIndex is not None:
+                    self.surveyIndex.update(surveys)
+            return surveys
+
+    def findSurveysByName(self, name):
+        """
+        find the surveys with a name in the survey index
+
+        name - the name of the survey, matched exactly and then ignoring
+            case, or a pattern with the shell wildcards * ? [] matched
+            ignoring case, e.g. 'R34 EMA*'
+
+        The survey list is read again once per run when the cached index
+        has no match, for a survey created or renamed since it was saved.
+
+        returns the list of matching surveys or None if the survey list failed
+        """
+        def match(surveys):
+            if any(c in name for c in '*?['):
+                pattern = name.casefold()
+                return [survey for survey in surveys
+                        if fnmatch.fnmatchcase(survey['name'].casefold(), pattern)]
+            found = [survey for survey in surveys if survey['name'] == name]
+            if not found:
+                found = [survey for survey in surveys if survey['name'].casefold() == name.casefold()]
+            return found
+
+        surveys = self.getSurveyIndex()
+        if surveys is None:
+            return None
+        found = match(surveys)
+        if not found and not self.surveyIndexRefreshed:
+            surveys = self.getSurveyIndex(refresh=True)
+            if surveys is None:
+                return None
+            found = match(surveys)
+        return found
                 
-    def getSurveyList(self, format='json'):
+    def iterSurveyList(self, prefetch=False):
+        """
+        iterate over the Surveys accessible for this user, following nextPage
+        as needed. Stop iterating early to avoid requesting the later pages.
+        """
+        baseUrl = f"{self.baseUrl}/surveys"
+        for survey in self.iterElements(baseUrl, prefetch=prefetch):
+            # remember lastModified to validate the cached survey designs
+            self.surveyLastModified[survey['id']] = survey.get('lastModified', None)
+            yield survey
+
+    def getSurveyByIndex(self, index):
+        """
+        get the survey for the 1 based index used in the survey listing,
+        only the pages up to the index are requested
+
+        returns None if there is no survey with that index or the list
+        could not be retrieved up to it
+        """
+        if index is None or index < 1:
+            return None
+        surveys = itertools.islice(self.iterSurveyList(), index-1, None)
+        try:
+            return next(surveys, None)
+        except IncompleteListError:
+            return None
+
+    def getSurveysByIndex(self, indexes):
+        """
+        get the surveys for a list of 1 based indexes used in the survey
+        listing, only the pages up to the largest index are requested
+
+        returns a list in the order of indexes, None for an index with no survey
+        or one after a page that could not be retrieved
+        """
+        wanted = set(index for index in indexes if index is not None and index > 0)
+        found = {}
+        if wanted:
+            surveys = itertools.islice(self.iterSurveyList(prefetch=True), max(wanted))
+            try:
+                for i, survey in enumerate(surveys):
+                    if i+1 in wanted:
+                        found[i+1] = survey
+            except IncompleteListError:
+                pass
+        return [found.get(index, None) for index in indexes]
+
+    def getSurveyList(self, format='json', prefetch=True):
         """
         get a list of Surveys accessible for this user
 
@@ -147,33 +1656,24 @@ class LNPIQualtrics:
         format - output format, default json, others are df for dataframe
         """
         
-        baseUrl = "https://{0}.qualtrics.com/API/v3/surveys".format(self.dataCenter)
-        baseUrl = f"https://{self.dataCenter}.qualtrics.com/API/v3/surveys"
+        baseUrl = f"{self.baseUrl}/surveys"
 
-        headers = {
-            "x-api-token": self.apiToken,
-            }
+        lists = self.getElements(baseUrl, prefetch=prefetch)
 
-        response = requests.get(baseUrl, headers=headers, verify=self.verify)
-        
         # if OK
-        if response.status_code == 200:
-            # retrieve the CGC
-            # convert to dict
-            ddict = json.loads(response.text)
-            lists = ddict['result']['elements']
-            # convert to a df
-            df = pd.DataFrame(lists)
+        if lists is not None:
+            for survey in lists:
+                self.surveyLastModified[survey['id']] = survey.get('lastModified', None)
  
             self.surveyLists = lists
             if format == 'json':
                 output = lists
             elif format =='df':
-                output = df
+                # convert to a df
+                import pandas as pd
+                output = pd.DataFrame(lists)
             return output
         else:
-            print(f"Error: {response.status_code}")
-            pp.pprint(response.content)
             return None       
     
     def getDateTimeColumns(self, df):
@@ -194,7 +1694,7 @@ class LNPIQualtrics:
                 # get the json string
                 json_str = df[col].iloc[1]
                 # convert to a dict
-                json_dict = json.loads(json_str)
+                json_dict = JsonBackend.loads(json_str)
                 # check if timeZone is in the dict
                 if 'timeZone' in json_dict.keys():
                     # add to datetime_cols
@@ -215,19 +1715,14 @@ class LNPIQualtrics:
         API/v3/directories/{directoryId}/mailinglists/{mailingListId}/contacts/{contactId}
  
         """
-        baseUrl = "https://{0}.qualtrics.com/API/v3/directories/{1}/mailinglists/{2}/contacts/{3}"\
-            .format(self.dataCenter, self.directoryId, mailingListId, contactId)
-        headers = {
-            "x-api-token": self.apiToken,
-            }
-
-        response = requests.get(baseUrl, headers=headers, verify=self.verify)
+        baseUrl = f"{self.baseUrl}/directories/{self.directoryId}/mailinglists/{mailingListId}/contacts/{contactId}"
+        response = self.request('GET', baseUrl)
         
         # if OK
         if response.status_code == 200:
             # retrieve the CGC
             # convert to dict
-            ddict = json.loads(response.text)
+            ddict = JsonBackend.loads(response.content)
             contactLookupId = ddict['result']['contactLookupId']
             return contactLookupId
         else:
@@ -236,45 +1731,75 @@ class LNPIQualtrics:
             return None        
     
         
+    def iterContactsMailingList(self, mailingListId, prefetch=False):
+        """
+        iterate over the contacts in a mailingList, following nextPage as needed
+        """
+        baseUrl = f"{self.baseUrl}/directories/{self.directoryId}/mailinglists/{mailingListId}/contacts"
+        return self.iterElements(baseUrl, prefetch=prefetch)
+
     def getContactsMailingList(self,mailingListId,output='json'):
         
 
         directoryId = self.directoryId   # "POOL_3fAZGWRVfLKuxe3"
 
-        baseUrl = "https://{0}.qualtrics.com/API/v3/directories/{1}/mailinglists/{2}/contacts"\
-            .format(self.dataCenter, self.directoryId, mailingListId)
-        headers = {
-            "x-api-token": self.apiToken,
-            }
-
-        response = requests.get(baseUrl, headers=headers, verify=self.verify)
-        # print(response.text)
-
-        if response.status_code != 200:
-            print(f"Error: {response.status_code}")
-            pp.pprint(response.content)
-            return ModuleNotFoundError
+        baseUrl = f"{self.baseUrl}/directories/{self.directoryId}/mailinglists/{mailingListId}/contacts"
 
         if output == 'raw':
+            # first page only
+            response = self.request('GET', baseUrl)
+            if response.status_code != 200:
+                print(f"Error: {response.status_code}")
+                pp.pprint(response.content)
+                return None
             return response
         elif output == 'json':
-            # convert json into a dict
-            rawdict = json.loads(response.text)
-            return rawdict['result']['elements']
+            # all the pages
+            return self.getElements(baseUrl, prefetch=True)
         
-    def addContactLookupIdToList(self,mailingListId, mailingList):
+    def addContactLookupIdToList(self,mailingListId, mailingList, workers=1):
         """
         Add contactLookupId to each entry in mailing list
+
+        workers - number of lookups to run concurrently, 1 runs them serially.
+            The lookups share the pooled session so keep this at or below
+            POOL_MAXSIZE.
+
+        A failed lookup sets contactLookupId to None for that entry and is
+        reported at the end, the rest of the list is still resolved.
         """
-        
-        for index in range(len(mailingList)):
+
+        def lookup(index):
             # get the contactId for this entry
             contactId = mailingList[index]['contactId']
-            # get the contactLookupId
-            contactLookupId = self.getContactLookupId(mailingListId, contactId)
+            try:
+                # get the contactLookupId
+                return self.getContactLookupId(mailingListId, contactId), None
+            except requests.exceptions.RequestException as e:
+                return None, e
+            except (KeyError, TypeError, ValueError) as e:
+                # a 200 response without the expected body
+                return None, f"unexpected response {e!r}"
+
+        if workers > 1 and len(mailingList) > 1:
+            # results come back in the original list order
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lookup, range(len(mailingList))))
+        else:
+            results = [lookup(index) for index in range(len(mailingList))]
+
+        failures = []
+        for index, (contactLookupId, error) in enumerate(results):
             # add this to dictionary for this index
             mailingList[index]['contactLookupId'] = contactLookupId
+            if contactLookupId is None:
+                failures.append((index, error))
             pass
+
+        for index, error in failures:
+            reason = error if error is not None else "no contactLookupId returned"
+            print(f"Error: contactLookupId lookup failed for subject index {index+1} "
+                  f"{mailingList[index].get('email')} ({mailingList[index]['contactId']}): {reason}")
         return mailingList
        
     def generateDescriptions(self,df)->str:
@@ -310,6 +1835,9 @@ class LNPIQualtrics:
         Get the responses from a downloaded web csv file
         
         """
+        import numpy as np
+        import pandas as pd
+
         self.format = format
         
         # read in the file
@@ -336,14 +1864,14 @@ class LNPIQualtrics:
         # convert newdf to a json string
         json_str = newdf.to_json(orient="records")
         # convert to list
-        responses_list = json.loads(json_str)
+        responses_list = JsonBackend.loads(json_str)
             
         # create newFileName from webfile, replace .csv with json
         newFileName = webfile.replace('.csv','.json')   
         if self.rawdata:
             # write out the raw data to a json file
-            with open(newFileName, "w") as fp:
-                json.dump(responses_list, fp, indent=4)
+            with open(newFileName, "wb") as fp:
+                JsonBackend.dump(responses_list, fp, indent=4)
             
         # process the Responses
         # ddict = self.processResponses(surveyId, {"responses":responses_list})
@@ -358,44 +1886,13 @@ class LNPIQualtrics:
         # place into another dict with key of "responses"
         ddict = {}
         ddict['responses'] = new_responses
-        if self.nodecode == False:
-            ddict = self.decodeData(ddict)
-            pass
-
-        ddict = self.delistValues(ddict)
+        # decode, delist and add the extref variable in one pass, the web
+        # file already has the questionNames
+        pipeline = self.compilePipeline(decode=not self.nodecode, delist=True,
+                                        columns=newdf.columns, emailKey='RecipientEmail')
+        ddict = pipeline.run(ddict)
             
-        if self.extref:
-            # get the mailing list and add the extref variable,
-            # matching based on the email from mailing list and the survey
-            mailingLists = self.getMailingLists()
-            
-            mailingListId = None
-            for mailingListEntry in mailingLists:
-                # match the name with extref
-                if mailingListEntry['name'] == self.extref:
-                    mailingListId = mailingListEntry['mailingListId']
-                    # get the mailingList
-                    mailingList = self.getContactsMailingList(mailingListId)
-                    # create lookup dictionary  email, extref
-                    emailLookup = {}
-                    for item in mailingList:
-                        emailLookup[item['email']] = item['extRef']
-                        pass
-                    
-                    # do lookup of ddict['responses'][index]['recipientEmail']
-                    for index, data in enumerate(ddict['responses']):
-                        extRef = emailLookup.get(data['values']['RecipientEmail'], None)
-                        # add to ddict['responses'][index]['values']['extRef']
-                        if extRef is not None:
-                            abc_dummy = 1
-                            pass
-                        ddict['responses'][index]['values']['extRef'] = extRef
-                        pass
-            if mailingListId == None:
-                # error no match
-                print(f"Error, no mailingList with name {self.extref} was found. Please recheck the name")
-                sys.exit(1)
-        elif self.sublist:
+        if not self.extref and self.sublist:
             # use csv file mapping email to id
             ml_df = pd.read_csv(self.sublist)
             # convert into a dict
@@ -430,30 +1927,40 @@ class LNPIQualtrics:
             # output the 'values' as a csv using a dataframe
             df = self.createDataFrame(ddict)
             # change the name of the file
-            dfFileName = newFileName.replace(".json","_df.csv")
-            df.to_csv(dfFileName, index=False)
+            dfFileName = self.dataFrameFileName(newFileName)
+            self.writeDataFrame(df, dfFileName, index=False)
         pass
        
     def getResponses(self, surveyId, format='json'):
         """
         get the responses
+
+        returns the name of the output file or None if the export failed
         """
         
-        self.format = format
-        
+        if self.syncState is not None:
+            return self.getResponsesIncremental(surveyId, format=format)
+
         # start response request
-        progressId = self.exportResponsesStart(surveyId, format=self.format)
+        progressId = self.exportResponsesStart(surveyId, format=format)
+        if progressId == None:
+            return None
         # poll the request
-        fileId = self.exportResponsesProgress(surveyId, progressId)
+        fileId = self.exportResponsesPoll(surveyId, progressId)['fileId']
+        if fileId != None and self.stream and self.dataframe and not self.rawdata:
+            return self.getResponsesStream(surveyId, fileId)
         if fileId != None:
             # get the file
             # data = self.exportResponsesFile(surveyId, fileId=fileId)
-            responses_list, newFileName = self.getDownloadRest(surveyId, fileId = fileId)
+            download = self.getDownloadRest(surveyId, fileId = fileId)
+            if download == None:
+                return None
+            responses_list, newFileName = download
             
             if self.rawdata:
                 # write out the raw data to a json file
-                with open(newFileName, "w") as fp:
-                    json.dump(responses_list, fp, indent=4)
+                with self.profiler.stage('write_json'), open(newFileName, "wb") as fp:
+                    JsonBackend.dump(responses_list, fp, indent=4)
                 
             # process the Responses
             ddict = self.processResponses(surveyId, responses_list)
@@ -461,10 +1968,240 @@ class LNPIQualtrics:
                 # output the 'values' as a csv using a dataframe
                 df = self.createDataFrame(ddict)
                 # change the name of the file
-                dfFileName = newFileName.replace(".json","_df.csv")
-                df.to_csv(dfFileName)
-            pass
-        
+                dfFileName = self.dataFrameFileName(newFileName)
+                return self.writeDataFrame(df, dfFileName)
+            return newFileName
+        return None
+
+    def getResponsesStream(self, surveyId, fileId):
+        """
+        get the responses of an export and write them to the dataframe csv
+        file as they are read
+
+        The responses are read one at a time from the export, decoded,
+        relabelled, delisted and given the extref variable in chunks of
+        STREAM_CHUNK responses in the export section of the config file,
+        default 1000, and each chunk is written to the csv file before the
+        next is read. The columns are predicted from the survey design and
+        the decoders, see predictColumns.
+
+        returns the name of the csv file or None if the download failed
+        """
+        download = self.getDownloadRestStream(surveyId, fileId = fileId)
+        if download == None:
+            return None
+        responses, newFileName = download
+
+        surveyInfo = self.getSurveyInformation(surveyId)
+        pipeline = self.compilePipeline(surveyInfo, decode=not self.nodecode)
+        schema = self.compileSchema(surveyInfo) if surveyInfo is not None else {}
+        dfFileName = self.dataFrameFileName(newFileName)
+        if self.outputFormat == 'parquet':
+            writer = ParquetStreamWriter(dfFileName, self.predictColumns(surveyInfo),
+                                         compression=self.compression)
+        else:
+            writer = CsvStreamWriter(dfFileName, self.predictColumns(surveyInfo))
+        chunkSize = self.exportConfig.get('STREAM_CHUNK', 1000)
+        writeStage = f"write_{self.outputFormat}"
+        try:
+            while True:
+                with self.profiler.stage('parse'):
+                    chunk = list(itertools.islice(responses, chunkSize))
+                if not chunk:
+                    break
+                ddict = pipeline.run({'responses': chunk})
+                df = self.createDataFrame(ddict, schema=schema)
+                with self.profiler.stage(writeStage):
+                    writer.write(df)
+        except BaseException:
+            writer.discard()
+            raise
+        with self.profiler.stage(writeStage):
+            writer.close()
+        print(f"Wrote {writer.rows} responses for {surveyId} to {dfFileName}")
+        return dfFileName
+
+    def predictColumns(self, surveyInfo):
+        """
+        get the columns expected in the dataframe of a survey: the response
+        fields, the embedded data, the results of the decoders, the questions
+        and extRef
+        """
+        import decoders
+
+        columns = list(RESPONSE_FIELDS)
+        if surveyInfo is None:
+            return columns
+        for field in surveyInfo.get('embeddedData', None) or []:
+            name = field.get('name', None)
+            if name is not None and (self.nodecode or name not in decoders.DECODERS):
+                columns.append(name)
+        if not self.nodecode:
+            columns.extend(decoders.OUTPUT_DTYPES)
+        for qid, question in (surveyInfo.get('questions', None) or {}).items():
+            columns.append(question.get('questionName', qid) if not self.nodecode else qid)
+        if self.extref:
+            columns.append('extRef')
+        return columns
+
+    def getResponsesIncremental(self, surveyId, format='json'):
+        """
+        get only the responses recorded since the last run and append them
+        to the output file of the survey
+
+        The export is started with the continuationToken saved by the last
+        run. If there is no token, or it is rejected, the recordedDate of the
+        newest response already downloaded is used as a startDate watermark.
+        The first run exports everything and saves a token for the next.
+
+        The state of each survey is only saved after its output is written so
+        a failed run is picked up again by the next run.
+
+        returns the name of the output file or None if the export failed
+        """
+        state = self.syncState.get(surveyId)
+        continuationToken = state.get('continuationToken', None)
+        startDate = state.get('lastRecordedDate', None)
+
+        progressId = None
+        if continuationToken is not None:
+            progressId = self.exportResponsesStart(surveyId, format=format,
+                                                   continuationToken=continuationToken)
+            if progressId == None:
+                print(f"continuationToken for {surveyId} was not accepted, using startDate {startDate}")
+        if progressId == None:
+            progressId = self.exportResponsesStart(surveyId, format=format, startDate=startDate,
+                                                   allowContinuation=True)
+        if progressId == None:
+            return None
+
+        poll = self.exportResponsesPoll(surveyId, progressId)
+        fileId = poll['fileId']
+        if fileId == None:
+            return None
+        download = self.getDownloadRest(surveyId, fileId = fileId)
+        if download == None:
+            return None
+        responses_list, newFileName = download
+
+        # the startDate watermark is inclusive, drop the responses at the
+        # watermark that were already downloaded
+        seenIds = set(state.get('watermarkIds', []))
+        responses = [response for response in responses_list['responses']
+                     if response.get('responseId', None) not in seenIds]
+        responses_list['responses'] = responses
+
+        # newest recordedDate and the responses recorded at that time
+        lastRecordedDate = startDate
+        watermarkIds = list(seenIds)
+        for response in responses:
+            recordedDate = response['values'].get('recordedDate', None)
+            if recordedDate is None:
+                continue
+            if lastRecordedDate is None or recordedDate > lastRecordedDate:
+                lastRecordedDate = recordedDate
+                watermarkIds = []
+            if recordedDate == lastRecordedDate:
+                watermarkIds.append(response.get('responseId', None))
+
+        # output file name without the date time so each run appends to it
+        outputFile = state.get('outputFile', None)
+        if outputFile is None:
+            outputFile = self.dataFrameFileName(re.sub(r'_\d{8}_\d{4}(\.\w+)$', r'\1', newFileName))
+
+        if len(responses) == 0:
+            print(f"No new responses for {surveyId}")
+        else:
+            if self.rawdata:
+                # write out the raw data of this run to a json file
+                with self.profiler.stage('write_json'), open(newFileName, "wb") as fp:
+                    JsonBackend.dump(responses_list, fp, indent=4)
+
+            # process the new Responses and append them
+            ddict = self.processResponses(surveyId, responses_list)
+            df = self.createDataFrame(ddict)
+            self.appendDataFrame(df, outputFile)
+            print(f"Appended {len(responses)} new responses for {surveyId} to {outputFile}")
+
+        self.syncState.update(surveyId,
+                              continuationToken=poll['continuationToken'],
+                              lastRecordedDate=lastRecordedDate,
+                              watermarkIds=watermarkIds,
+                              outputFile=outputFile,
+                              lastRun=datetime.now().isoformat())
+        return outputFile
+
+    def appendDataFrame(self, df, fileName):
+        """
+        append the rows of df to a csv file, creating it if needed
+
+        The new rows are aligned to the columns already in the file. If df
+        has columns that are not in the file, the file is rewritten with the
+        new columns added at the end. The csv file has no index column, the
+        row numbers of each run would start at 0 again. Parquet and feather
+        files are always rewritten, choice columns keep the categories of
+        both.
+        """
+        import pandas as pd
+
+        if not os.path.exists(fileName):
+            self.writeDataFrame(df, fileName, index=False)
+            return
+
+        if outputFormat(fileName) != 'csv':
+            olddf = self.readDataFrame(fileName)
+            if olddf is None:
+                return
+            newdf = pd.concat([olddf, df], ignore_index=True)
+            for col in newdf.columns:
+                if col in olddf.columns and col in df.columns and \
+                        isinstance(olddf[col].dtype, pd.CategoricalDtype) and \
+                        isinstance(df[col].dtype, pd.CategoricalDtype):
+                    categories = list(olddf[col].cat.categories)
+                    categories += [c for c in df[col].cat.categories if c not in categories]
+                    newdf[col] = pd.Categorical(newdf[col], categories=categories)
+            self.writeDataFrame(newdf, fileName, index=False)
+            return
+
+        with self.profiler.stage('write_csv'):
+            columns = list(pd.read_csv(fileName, nrows=0).columns)
+            newColumns = [col for col in df.columns if col not in columns]
+            if newColumns:
+                olddf = pd.read_csv(fileName)
+                pd.concat([olddf, df], ignore_index=True)[columns + newColumns]\
+                    .to_csv(fileName, index=False)
+            else:
+                df.reindex(columns=columns).to_csv(fileName, mode='a', header=False, index=False)
+
+    def getResponsesMany(self, surveyIds, format='json', maxExports=4):
+        """
+        get the responses for several surveys in parallel
+
+        Up to maxExports exports are started at once and polled concurrently,
+        each is downloaded and decoded as soon as it completes and the next
+        survey's export is started in its place. The exports share the
+        pooled session and the rate limits of the scheduler.
+
+        returns a dict of surveyId to output file name, None for a failed export
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, maxExports)) as executor:
+            futures = {executor.submit(self.getResponses, surveyId, format): surveyId
+                       for surveyId in surveyIds}
+            for future in as_completed(futures):
+                surveyId = futures[future]
+                try:
+                    results[surveyId] = future.result()
+                except Exception as e:
+                    print(f"Error: export of {surveyId} failed: {e}")
+                    results[surveyId] = None
+                if results[surveyId] != None:
+                    print(f"Survey {surveyId} written to {results[surveyId]}")
+
+        failed = [surveyId for surveyId in surveyIds if results[surveyId] == None]
+        if failed:
+            print(f"Error: export failed for {', '.join(failed)}")
+        return results        
 
         
     """
@@ -493,22 +2230,38 @@ class LNPIQualtrics:
             }
         }     
     """
-    def exportResponsesStart(self, surveyId, format='json'):
+    def exportResponsesStart(self, surveyId, format='json',
+                             continuationToken=None, startDate=None, allowContinuation=False):
+        """
+        start the response export
+
+        continuationToken - only export responses recorded since the export
+            that returned this token
+        startDate - only export responses recorded on or after this ISO 8601
+            datetime, used when there is no continuationToken
+        allowContinuation - ask for a continuationToken for the next export,
+            it is returned with the fileId by exportResponsesProgress
+        """
         
-        baseUrl = f"https://{self.dataCenter}.qualtrics.com/API/v3/surveys/{surveyId}/export-responses"
-        headers = {
-            "x-api-token": self.apiToken,
-        }
+        baseUrl = f"{self.baseUrl}/surveys/{surveyId}/export-responses"
         
         data = {
             "format": format
         }
-        response = requests.request("POST", baseUrl, json=data, headers=headers,verify=self.verify)
+        if continuationToken is not None:
+            data['continuationToken'] = continuationToken
+        else:
+            if startDate is not None:
+                data['startDate'] = startDate
+            if allowContinuation:
+                data['allowContinuation'] = True
+        with self.profiler.stage('export_start'):
+            response = self.request('POST', baseUrl, json=data)
         
         # if OK
         if response.status_code == 200:
             # convert to dict
-            ddict = json.loads(response.text)
+            ddict = JsonBackend.loads(response.content)
             # get the progressId for next step
             self.progressId = ddict['result']['progressId']
             return self.progressId
@@ -537,47 +2290,112 @@ class LNPIQualtrics:
             }
         }
     """    
-    def exportResponsesProgress(self, surveyId, progressId=None):
+    def exportResponsesProgress(self, surveyId, progressId=None, deadline=None):
         """
         Poll export process until completed and have a fileId
+
+        returns the fileId or None if the export failed, see exportResponsesPoll
         """
-        
-        # set fileId to None
-        fileId = None
-        
         if progressId == None:
             # set
             progressId = self.progressId
+        fileId = self.exportResponsesPoll(surveyId, progressId, deadline=deadline)['fileId']
+        if fileId != None:
+            self.fileId = fileId
+        return fileId
+
+    def exportResponsesPoll(self, surveyId, progressId, deadline=None):
+        """
+        Poll export process until completed and have a fileId
+
+        Polling starts at POLL_MIN seconds. Once percentComplete is moving
+        the next poll is scheduled from the observed rate, at half of the
+        estimated time remaining, otherwise the interval doubles. The
+        interval at most doubles per poll and stays between POLL_MIN
+        and POLL_MAX. A 4xx response other than 429 stops the polling, it
+        will not succeed later.
+
+        deadline - seconds to wait for the export before giving up,
+            default DEADLINE from the export section of the config file
+
+        The observed latency and number of polls are also kept in
+        self.exportStats[surveyId].
+
+        returns a dict with the fileId, None if the export failed, the
+        continuationToken, present when the export was started with
+        allowContinuation, the latency in seconds and the number of polls
+        """
         
-        baseUrl = f"https://{self.dataCenter}.qualtrics.com/API/v3/surveys/{surveyId}/export-responses/{progressId}"
-        
-        headers = {
-            "x-api-token": self.apiToken,
-        }
-        
-        count = 0
-        # wait for 20 sec or fileId
-        while fileId == None and count < 20:
-            response = requests.get(baseUrl, headers=headers, verify=self.verify)
+        # set fileId to None
+        fileId = None
+        continuationToken = None
+
+        if deadline is None:
+            deadline = self.exportConfig.get('DEADLINE', 600)
+        pollMin = self.exportConfig.get('POLL_MIN', 0.25)
+        pollMax = self.exportConfig.get('POLL_MAX', 10)
+        
+        baseUrl = f"{self.baseUrl}/surveys/{surveyId}/export-responses/{progressId}"
+        
+        startTime = time.monotonic()
+        startCpu = time.thread_time()
+        lastTime = startTime
+        lastPercent = 0.0
+        interval = pollMin
+        polls = 0
+        elapsed = 0.0
+        # wait for the deadline or fileId
+        while fileId == None:
+            response = self.request('GET', baseUrl)
+            polls += 1
+            now = time.monotonic()
+            elapsed = now - startTime
         
             # if OK
             if response.status_code == 200:
                 # convert to dict
-                ddict = json.loads(response.text)
+                ddict = JsonBackend.loads(response.content)
+                result = ddict['result']
                 # check if there is fileId, means that export is completed
-                if "fileId" in ddict['result'].keys():
-                    fileId = ddict['result']['fileId']
-            
-            time.sleep(2)
-            count += 2   # increment the counter
+                if "fileId" in result.keys():
+                    fileId = result['fileId']
+                    # present when the export was started with allowContinuation
+                    continuationToken = result.get('continuationToken', None)
+                    break
+                if result.get('status', None) == 'failed':
+                    break
+
+                percent = float(result.get('percentComplete', 0.0) or 0.0)
+                if percent > lastPercent and now > lastTime:
+                    # estimate the time remaining from the progress rate
+                    rate = (percent - lastPercent) / (now - lastTime)
+                    remaining = (100.0 - percent) / rate
+                    interval = min(max(remaining / 2.0, pollMin), pollMax, interval * 2.0)
+                    lastPercent = percent
+                    lastTime = now
+                else:
+                    interval = min(interval * 2.0, pollMax)
+            elif 400 <= response.status_code < 500 and response.status_code != 429:
+                print(f"Error: {response.status_code} polling the export of {surveyId}")
+                break
+            else:
+                interval = min(interval * 2.0, pollMax)
+
+            if elapsed >= deadline:
+                break
+            # don't sleep past the deadline
+            time.sleep(min(interval, deadline - elapsed))
             
+        self.exportStats[surveyId] = {'latency': elapsed, 'polls': polls}
+        self.profiler.add('export_poll', elapsed, time.thread_time() - startCpu)
+
         if fileId != None:
-            self.fileId = fileId
-            return self.fileId
+            print(f"Export of {surveyId} completed in {elapsed:.1f} seconds after {polls} polls")
         else:
-            print(f"Error: No fileId after {count} seconds")
+            print(f"Error: No fileId after {elapsed:.1f} seconds")
             pp.pprint(response.content)
-            return None
+        return {'fileId': fileId, 'continuationToken': continuationToken,
+                'latency': elapsed, 'polls': polls}
             
     """    
     3. When progress is complete, get the file  Get Response Export File
@@ -598,16 +2416,12 @@ class LNPIQualtrics:
         if fileId == None:
             fileId = self.fileId
             
-        baseUrl = f"https://{self.dataCenter}.qualtrics.com/API/v3/surveys/{surveyId}/export-responses/{fileId}/file"
+        baseUrl = f"{self.baseUrl}/surveys/{surveyId}/export-responses/{fileId}/file"
         
-        headers = {
-            "x-api-token": self.apiToken,
-        }
-        response = requests.get(baseUrl, headers=headers, verify=self.verify)
+        zipFile = self.downloadExportFile(baseUrl)
         # if OK
-        if response.status_code == 200:
-            # file is in response.content
-            zf = zipfile.ZipFile(io.BytesIO(response.content))
+        if zipFile != None:
+            zf = zipfile.ZipFile(zipFile)
             # assume only one file
             origFileName = zf.filelist[0].filename
             
@@ -615,59 +2429,19 @@ class LNPIQualtrics:
             format = os.path.splitext(origFileName)[1]  # returns .json or .csv
             # create a datetime string for the filename
             dt = datetime.now()
-            str_date_time = dt.strftime("%Y%m%d_%H%M")
-            
-            # replace the spaces with _
-            newFileName = origFileName.replace(" ","_")
-            # replace {format} with datetime{format}
-            newFileName = newFileName.replace(f"{format}", f"_{str_date_time}{format}")
-
-            # extract the file
-            # open the file and read the contents 
-            with zf.open(origFileName) as myFile:
-                fileContents = myFile.read()
+            newFileName = self.exportFileName(origFileName, dt)
             
             if self.rawdata:
                 self.nodecode = True  # don't decode data
                 format = '.json'
                 
             if format=='.json':
-                # read json into a dict
-                ddict = json.loads(fileContents)
-                if self.nodecode == False:
-                    ddict = self.decodeData(ddict)
-                    ddict = self.relabelData(ddict, surveyInfo)
-                    # convert a list with single item to a number
-                    ddict = self.delistValues(ddict)
-                    
-                if self.extref:
-                    # get the mailing list and add the extref variable,
-                    # matching based on the email from mailing list and the survey
-                    mailingLists = self.getMailingLists()
-                    
-                    mailingListId = None
-                    for mailingListEntry in mailingLists:
-                        # match the name with extref
-                        if mailingListEntry['name'] == self.extref:
-                            mailingListId = mailingListEntry['mailingListId']
-                            # get the mailingList
-                            mailingList = self.getContactsMailingList(mailingListId)
-                            # create lookup dictionary  email, extref
-                            emailLookup = {}
-                            for item in mailingList:
-                                emailLookup[item['email']] = item['extRef']
-                                pass
-                            
-                            # do lookup of ddict['responses'][index]['recipientEmail']
-                            for index, data in enumerate(ddict['responses']):
-                                extRef = emailLookup.get(data['values']['recipientEmail'], None)
-                                # add to ddict['responses'][index]['values']['extRef']
-                                ddict['responses'][index]['values']['extRef'] = extRef
-                                pass
-                    if mailingListId == None:
-                        # error no match
-                        print(f"Error, no mailingList with name {self.extref} was found. Please recheck the name")
-                        sys.exit(1)
+                # read the responses record by record from the zip stream
+                with zf.open(origFileName) as myFile:
+                    ddict = {'responses': list(iterJsonArray(myFile))}
+                # decode, relabel, delist and add the extref variable in one pass
+                pipeline = self.compilePipeline(surveyInfo, decode=not self.nodecode)
+                ddict = pipeline.run(ddict)
                     
                 # add the surveyInfo
                 ddict['surveyInfo'] = surveyInfo
@@ -677,73 +2451,120 @@ class LNPIQualtrics:
                     # output the 'values' as a csv using a dataframe
                     df = self.createDataFrame(ddict)
                     # change the name of the file
-                    dfFileName = newFileName.replace(".json","_df.csv")
-                    df.to_csv(dfFileName)
+                    dfFileName = self.dataFrameFileName(newFileName)
+                    self.writeDataFrame(df, dfFileName)
                     
                 # output json with indents
-                with open(newFileName, mode='w') as newFile:
-                    json.dump(ddict, newFile, indent=4)
+                with open(newFileName, mode='wb') as newFile:
+                    JsonBackend.dump(ddict, newFile, indent=4)
                 pass
                 #zipfile.ZipFile(io.BytesIO(response.content)).extractall('.')
             elif format=='.csv':
-                with open(newFileName, mode='wb') as newfile:
-                    newfile.write(fileContents)
+                with zf.open(origFileName) as myFile, open(newFileName, mode='wb') as newfile:
+                    shutil.copyfileobj(myFile, newfile)
+            zipFile.close()
         else:
-            print(f"Error: {response.status_code}")
-            pp.pprint(response.content)
             return None     
 
-    def getDownloadRest(self, surveyId, fileId = None):
-        """ 
-        get the download through the REST API
+    def downloadExportFile(self, baseUrl):
+        """
+        stream the export zip file to a spooled temporary file
+
+        The download is written in chunks of CHUNK_SIZE bytes, it is kept in
+        memory up to SPOOL_SIZE bytes and rolled over to disk beyond that
+        (export section of the config file).
+
+        returns the temporary file positioned at the start, or None on error
+        """
+        chunkSize = self.exportConfig.get('CHUNK_SIZE', 1024*1024)
+        spoolSize = self.exportConfig.get('SPOOL_SIZE', 32*1024*1024)
+
+        family = self.scheduler.endpointFamily(baseUrl)
+        with self.profiler.stage('download'):
+            response = self.request('GET', baseUrl, stream=True)
+            # if OK
+            if response.status_code != 200:
+                print(f"Error: {response.status_code}")
+                pp.pprint(response.content)
+                return None
+
+            zipFile = tempfile.SpooledTemporaryFile(max_size=spoolSize)
+            try:
+                for chunk in response.iter_content(chunk_size=chunkSize):
+                    zipFile.write(chunk)
+                    self.profiler.received(family, len(chunk))
+            except requests.exceptions.RequestException as e:
+                print(f"Error: download of {baseUrl} failed: {e}")
+                zipFile.close()
+                return None
+            finally:
+                response.close()
+        zipFile.seek(0)
+        return zipFile
+
+    def exportFileName(self, origFileName, dt):
+        """
+        name of the output file for an export, the name of the file in the
+        zip with the spaces replaced and the date time added
+        """
+        # get the filetype from the file suffix
+        format = os.path.splitext(origFileName)[1]  # returns .json or .csv
+        str_date_time = dt.strftime("%Y%m%d_%H%M")
         
-        returns responses_list (dict) and the newFilename 
+        # replace the spaces with _
+        newFileName = origFileName.replace(" ","_")
+        # replace {format} with datetime{format}
+        newFileName = newFileName.replace(f"{format}", f"_{str_date_time}{format}")
+        return newFileName
+
+    def getDownloadRestStream(self, surveyId, fileId = None):
+        """ 
+        get the download through the REST API as a stream of responses
+
+        The export zip is streamed to a spooled temporary file and the
+        responses are parsed one at a time from the json in the zip, so only
+        the response being processed is held in memory.
+
+        returns an iterator over the responses and the newFilename, or None
         """
         
         if fileId == None:
             fileId = self.fileId
             
-        baseUrl = f"https://{self.dataCenter}.qualtrics.com/API/v3/surveys/{surveyId}/export-responses/{fileId}/file"
+        baseUrl = f"{self.baseUrl}/surveys/{surveyId}/export-responses/{fileId}/file"
+
+        zipFile = self.downloadExportFile(baseUrl)
+        if zipFile == None:
+            return None
+
+        zf = zipfile.ZipFile(zipFile)
+        # assume only one file
+        origFileName = zf.filelist[0].filename
+        newFileName = self.exportFileName(origFileName, datetime.now())
+
+        def responses():
+            try:
+                with zf.open(origFileName) as myFile:
+                    yield from iterJsonArray(myFile)
+            finally:
+                zipFile.close()
+
+        return responses(), newFileName
+
+    def getDownloadRest(self, surveyId, fileId = None):
+        """ 
+        get the download through the REST API
         
-        headers = {
-            "x-api-token": self.apiToken,
-        }
-        response = requests.get(baseUrl, headers=headers, verify=self.verify)
-        # if OK
-        if response.status_code == 200:
-            # file is in response.content
-            zf = zipfile.ZipFile(io.BytesIO(response.content))
-            # assume only one file
-            origFileName = zf.filelist[0].filename
-            
-            # get the filetype from the file suffix
-            format = os.path.splitext(origFileName)[1]  # returns .json or .csv
-            # create a datetime string for the filename
-            dt = datetime.now()
-            str_date_time = dt.strftime("%Y%m%d_%H%M")
-            
-            # replace the spaces with _
-            newFileName = origFileName.replace(" ","_")
-            # replace {format} with datetime{format}
-            newFileName = newFileName.replace(f"{format}", f"_{str_date_time}{format}")
-
-            # extract the file
-            # open the file and read the contents 
-            with zf.open(origFileName) as myFile:
-                fileContents = myFile.read()
-            
-            if self.rawdata:
-                # self.nodecode = True  # don't decode data
-                format = '.json'
-                
-            if format=='.json':
-                # read json into a dict
-                ddict = json.loads(fileContents) 
+        returns responses_list (dict) and the newFilename 
+        """
+        
+        download = self.getDownloadRestStream(surveyId, fileId = fileId)
+        if download == None:
+            return None
+        responses, newFileName = download
 
-        else:
-            print(f"Error: {response.status_code}")
-            pp.pprint(response.content)
-            return None    
+        with self.profiler.stage('parse'):
+            ddict = {'responses': list(responses)}
                         
         return ddict, newFileName
     
@@ -755,42 +2576,9 @@ class LNPIQualtrics:
         surveyInfo = self.getSurveyInformation(surveyId)
         
         if format == 'json':        
-            if self.nodecode == False:
-                ddict = self.decodeData(ddict)
-                ddict = self.relabelData(ddict, surveyInfo)
-                # convert a list with single item to a number
-                ddict = self.delistValues(ddict)
-                
-            if self.extref:
-                # get the mailing list and add the extref variable,
-                # matching based on the email from mailing list and the survey
-                mailingLists = self.getMailingLists()
-                
-                mailingListId = None
-                for mailingListEntry in mailingLists:
-                    # match the name with extref
-                    if mailingListEntry['name'] == self.extref:
-                        mailingListId = mailingListEntry['mailingListId']
-                        # get the mailingList
-                        mailingList = self.getContactsMailingList(mailingListId)
-                        # create lookup dictionary  email, extref
-                        emailLookup = {}
-                        for item in mailingList:
-                            emailLookup[item['email']] = item['extRef']
-                            pass
-                        
-                        # do lookup of ddict['responses'][index]['recipientEmail']
-                        for index, data in enumerate(ddict['responses']):
-                            # get subject email if it exists
-                            subj_email = data['values'].get('recipientEmail',None)
-                            extRef = emailLookup.get(subj_email, None) 
-                            # add to ddict['responses'][index]['values']['extRef']
-                            ddict['responses'][index]['values']['extRef'] = extRef
-                            pass
-                if mailingListId == None:
-                    # error no match
-                    print(f"Error, no mailingList with name {self.extref} was found. Please recheck the name")
-                    sys.exit(1)
+            # decode, relabel, delist and add the extref variable in one pass
+            pipeline = self.compilePipeline(surveyInfo, decode=not self.nodecode)
+            ddict = pipeline.run(ddict)
                 
             # add the surveyInfo
             dt = datetime.now()
@@ -816,7 +2604,7 @@ class LNPIQualtrics:
             if self.extref:
                 # get the mailing list and add the extref variable,
                 # matching based on the email from mailing list and the survey
-                mailingLists = self.getMailingLists()
+                mailingLists = self.getMailingLists() or []
                 
                 mailingListId = None
                 for mailingListEntry in mailingLists:
@@ -850,16 +2638,162 @@ class LNPIQualtrics:
         return ddict
 
     
-    def createDataFrame(self, ddict):
+    def createDataFrame(self, ddict, schema=None):
         """
         Create a dataframe from the values in each response
         
+        schema - dict of column name to dtype, see compileSchema, default is
+            compiled from ddict['surveyInfo'] when it is there
+
+        Numeric columns without a dtype in the schema are float64, pandas
+        would infer int64 or float64 from the values of each chunk of a
+        streamed export.
         """    
-        rows = []  # hold list of dict
-        for response in ddict['responses']:
-            rows.append(response['values'])
-                        
-        df = pd.DataFrame.from_dict(rows)             
+        import numpy as np
+        import pandas as pd
+
+        with self.profiler.stage('dataframe'):
+            # build the columns directly, a column is padded with NaN for the
+            # responses without a value
+            columns = {}
+            count = 0
+            for response in ddict['responses']:
+                for key, value in response['values'].items():
+                    column = columns.get(key, None)
+                    if column is None:
+                        column = columns[key] = []
+                    if len(column) < count:
+                        column.extend([np.nan] * (count - len(column)))
+                    column.append(value)
+                count += 1
+            for column in columns.values():
+                if len(column) < count:
+                    column.extend([np.nan] * (count - len(column)))
+
+            df = pd.DataFrame(columns, index=pd.RangeIndex(count))
+            if schema is None and ddict.get('surveyInfo', None) is not None:
+                schema = self.compileSchema(ddict['surveyInfo'])
+            if schema:
+                df = self.applySchema(df, schema)
+            for col in df.columns:
+                if col not in (schema or {}) and pd.api.types.is_numeric_dtype(df[col]) \
+                        and not pd.api.types.is_bool_dtype(df[col]):
+                    df[col] = df[col].astype('float64')
+        return df
+
+    def dataFrameFileName(self, newFileName):
+        """
+        get the name of the dataframe file for the json file newFileName,
+        e.g. xxx_df.csv or xxx_df.parquet for the output format
+        """
+        return newFileName.replace(".json", OUTPUT_SUFFIXES.get(self.outputFormat, '_df.csv'))
+
+    def writeDataFrame(self, df, fileName, index=True):
+        """
+        write df to a csv, parquet or feather file, chosen by the suffix of
+        fileName
+
+        Parquet and feather files keep the dtypes of the columns and are
+        compressed with COMPRESSION in the output section of the config
+        file, default zstd. They need pyarrow, index is only written to
+        csv files.
+
+        returns fileName or None if the file could not be written
+        """
+        format = outputFormat(fileName)
+        if format != 'csv' and not havePyarrow():
+            print(f"Error: the {format} output format needs pyarrow, pip install pyarrow")
+            return None
+        with self.profiler.stage(f"write_{format}"):
+            if format == 'csv':
+                df.to_csv(fileName, index=index)
+            else:
+                writeArrowFile(df, fileName, compression=self.compression)
+        return fileName
+
+    def readDataFrame(self, fileName):
+        """
+        read a csv, parquet or feather file written by writeDataFrame
+
+        returns the dataframe or None if it could not be read
+        """
+        import pandas as pd
+
+        format = outputFormat(fileName)
+        if format == 'csv':
+            return pd.read_csv(fileName)
+        if not havePyarrow():
+            print(f"Error: the {format} output format needs pyarrow, pip install pyarrow")
+            return None
+        if format == 'feather':
+            return pd.read_feather(fileName)
+        return pd.read_parquet(fileName)
+
+    def compileSchema(self, surveyInfo):
+        """
+        get the dtypes of the columns of the responses of a survey
+
+        The response fields have fixed dtypes, see RESPONSE_DTYPES, the
+        decoded task results have the dtypes declared by their decoders and
+        the questions get a dtype from their questionType:
+            MC with a single answer - category of the choice recodes
+            TE - string
+            Slider - float32
+
+        returns a dict of column name to dtype, 'datetime' for datetime
+        columns and a CategoricalDtype for choice questions
+        """
+        import pandas as pd
+        import decoders
+
+        schema = dict(RESPONSE_DTYPES)
+        schema.update(decoders.OUTPUT_DTYPES)
+        for qid, question in (surveyInfo.get('questions', None) or {}).items():
+            name = question.get('questionName', qid)
+            questionType = question.get('questionType', None) or {}
+            if questionType.get('type', None) == 'MC' and \
+                    questionType.get('selector', None) in SINGLE_ANSWER_SELECTORS:
+                recodes = [choice.get('recode', key) for key, choice in
+                           (question.get('choices', None) or {}).items()]
+                schema[name] = pd.CategoricalDtype(recodes)
+            elif questionType.get('type', None) == 'TE':
+                schema[name] = 'string'
+            elif questionType.get('type', None) == 'Slider':
+                schema[name] = 'float32'
+        return schema
+
+    def applySchema(self, df, schema):
+        """
+        convert the columns of df to the dtypes in schema
+
+        Choice columns keep values that are not one of the choices, the
+        categories are the numeric recodes and any other values found. A
+        column that cannot be converted keeps the dtype inferred by pandas.
+        """
+        import pandas as pd
+
+        for col, dtype in schema.items():
+            if col not in df.columns:
+                continue
+            try:
+                if isinstance(dtype, pd.CategoricalDtype):
+                    values = pd.to_numeric(df[col], errors='coerce')
+                    if values.isna().equals(df[col].isna()):
+                        # numeric values, use the recodes as categories
+                        recodes = pd.to_numeric(pd.Series(list(dtype.categories), dtype=object),
+                                                errors='coerce').dropna()
+                        categories = sorted(set(recodes) | set(values.dropna()))
+                        df[col] = pd.Categorical(values, categories=categories)
+                    else:
+                        df[col] = df[col].astype('category')
+                elif dtype == 'datetime':
+                    df[col] = pd.to_datetime(df[col], utc=True, format='ISO8601')
+                elif dtype == 'Int64':
+                    df[col] = pd.to_numeric(df[col]).astype('Int64')
+                else:
+                    df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                pass
         return df
     
     def relabelData(self, ddict, surveyInfo):
@@ -871,28 +2805,14 @@ class LNPIQualtrics:
         Args:
             ddict (list of dicts): survey data from qualtrics 
         """
-        newdict = {"responses": []}
-        
-        for response in ddict['responses']:
-            # make a copy of original since we are changing the keys!
-            origResponseValuesKeys = list(response['values'].keys())
-            for dataKey in origResponseValuesKeys:
+        pipeline = ResponsePipeline(stages=[ResponsePipeline.relabelStage(self.questionLabels(surveyInfo))])
+        return pipeline.run(ddict)
 
-                # for debugging scipain data                    
-                # if dataKey in ['QID73','QID76','QID77']:
-                #     xyz = 1
-                #     pass
-                
-                if dataKey in surveyInfo['questions'].keys():
-                    # get the newLabel
-                    newLabel = surveyInfo['questions'][dataKey]['questionName']
-                    # relabel
-                    response['values'][newLabel] = response['values'].pop(dataKey)
-                pass
-        
-            newdict['responses'].append(response)
-             
-        return newdict
+    def questionLabels(self, surveyInfo):
+        """
+        map of QID to questionName for the questions in surveyInfo
+        """
+        return {qid: question['questionName'] for qid, question in surveyInfo['questions'].items()}
     
     def delistValues(self, ddict):
         """
@@ -905,105 +2825,319 @@ class LNPIQualtrics:
         Args:
             ddict (list of dicts): survey data from qualtrics 
         """
-        newdict = {"responses": []}
-        
-        for response in ddict['responses']:
+        pipeline = ResponsePipeline(stages=[ResponsePipeline.delistStage()])
+        return pipeline.run(ddict)
 
-            for key in response['values'].keys():
-                # check if value is a list
-                if type(response['values'][key]) is list:
-                    if len(response['values'][key]) == 1:
-                        # convert the first element of the list to a number
-                        response['values'][key] = float(response['values'][key][0])
-                        pass
-                    else:
-                        response['values'][key] = None
-                        
-            newdict['responses'].append(response)
-             
-        return newdict
+    def getExtRefLookup(self):
+        """
+        get the lookup of email to extRef from the mailing list named by
+        extref, it is fetched once per run
+        """
+        # the concurrent exports of getResponsesMany wait for the first
+        with self.extRefLock:
+            if self.extRefLookup is None:
+                with self.profiler.stage('extref_lookup'):
+                    mailingLists = self.getMailingLists() or []
+
+                    mailingListId = None
+                    for mailingListEntry in mailingLists:
+                        # match the name with extref
+                        if mailingListEntry['name'] == self.extref:
+                            mailingListId = mailingListEntry['mailingListId']
+                            # get the mailingList
+                            mailingList = self.getContactsMailingList(mailingListId)
+                            if mailingList == None:
+                                print(f"Error, could not get the mailingList {self.extref}")
+                                sys.exit(1)
+                            # create lookup dictionary  email, extref
+                            emailLookup = {}
+                            for item in mailingList:
+                                emailLookup[item['email']] = item['extRef']
+                if mailingListId == None:
+                    # error no match
+                    print(f"Error, no mailingList with name {self.extref} was found. Please recheck the name")
+                    sys.exit(1)
+                self.extRefLookup = emailLookup
+            return self.extRefLookup
+
+    def compilePipeline(self, surveyInfo=None, decode=True, delist=None, columns=None,
+                        emailKey='recipientEmail', remove=True):
+        """
+        build the ResponsePipeline for the responses of a survey
+
+        surveyInfo - survey design, questions are relabelled with their
+            questionName, None skips the relabelling
+        decode - decode the task data and relabel and delist the values
+        delist - convert lists with a single item to a number, default decode
+        columns - the columns of the export, default all the task columns
+            with a decoder
+        emailKey - key of the response email used to add the extref variable
+        remove - remove the original task data from the responses
+
+        With extref, the extref variable is added from the mailing list by
+        matching the email from the mailing list and the survey.
+        """
+        import decoders
+
+        if delist is None:
+            delist = decode
+        tasks = []
+        stages = []
+        if decode:
+            tasks = decoders.getDecoders(decoders.DECODERS if columns is None else columns)
+            if surveyInfo is not None:
+                stages.append(self.profiler.timed(
+                    'relabel', ResponsePipeline.relabelStage(self.questionLabels(surveyInfo))))
+        if delist:
+            stages.append(self.profiler.timed('delist', ResponsePipeline.delistStage()))
+        if self.extref:
+            stages.append(self.profiler.timed(
+                'extref', ResponsePipeline.extRefStage(self.getExtRefLookup(), emailKey)))
+
+        decodeColumn = self.decodeColumn if self.decodeCache is None else self.decodeCached
+        return ResponsePipeline(tasks=tasks, decodeColumn=decodeColumn, stages=stages,
+                                remove=remove, profiler=self.profiler)
         
-    def decodeData(self, ddict, remove=True):
+    def decodeData(self, ddict, remove=True, columns=None):
         """
         Decode task data using modules in decoders
         
         ddict  - the dictionary containing the json data from the task
         remove - flag to remove the original column from the response
+        columns - the columns of the export, e.g. the header of a webfile,
+            default is all the task columns with a decoder
+
+        Only the decoders for task columns present in the export are used.
+        With jobs > 1 the task data is decoded in a process pool, see
+        decodeParallel, the results are the same as decoding serially.
+        Sessions found in the decode cache are not decoded again.
         """
-        
-        def get_module_names(package_name='decoders'):
-            import pkgutil
-            package = __import__(package_name)
-            module_names = [name for _, name, _ in pkgutil.walk_packages(package.__path__)]
+        import decoders
 
-            for module_name in module_names:
-                #print(module_name)
-                pass
-            return module_names
-        
-        tasks = get_module_names()
-        
-        newdict = {"responses": []}
-        
-        for response in ddict['responses']:
-            
-            for task in tasks:
-                # check if task data is here
-                # values seen None and '-1', '{}
-                # check if tdata is a str
-                tdata = response['values'].get(task, None)
-                if tdata in ['-1','{}']:
-                #if tdata == '-1':
-                    # set to None
-                    tdata = None
-                if type(tdata) == str:
-                #if tdata is not None or (tdata != '-1'):
-                #if task in response['values'].keys():
-                    # get the json string and convert into a dict
-                    taskData = json.loads(response['values'][task]) 
-                    
-                    # call the method for this data
-                    result = eval(f"{task}.decode(taskData)")
-                    # append result
-                    response['values'].update(result)
+        pipeline = ResponsePipeline(
+            tasks=decoders.getDecoders(decoders.DECODERS if columns is None else columns),
+            decodeColumn=self.decodeColumn if self.decodeCache is None else self.decodeCached,
+            remove=remove, profiler=self.profiler)
+        return pipeline.run(ddict)
 
-                    # remove original data
-                    if remove:
-                        response['values'].pop(task)                    
-            newdict['responses'].append(response)
-            pass
-        
-        return newdict
+    def decodeColumn(self, task, data):
+        """
+        decode a column of task data
+
+        task - name of the task column
+        data - list with the raw json string of each session
+
+        returns the results by column, see decoders.decodeBatch
+        """
+        import decoders
+
+        results = None
+        start = time.perf_counter()
+        if self.jobs > 1 and len(data) >= self.decodeConfig.get('MIN_PARALLEL', 200):
+            results = self.decodeParallel(task, data)
+            if results is not None:
+                # the pool parses and decodes, its time is all decode time
+                self.profiler.decoder(task, len(data), decodeSeconds=time.perf_counter() - start)
+        if results is None:
+            # decode serially, for small exports or when the pool failed
+            start = time.perf_counter()
+            sessions = [JsonBackend.loads(tdata) for tdata in data]
+            parsed = time.perf_counter()
+            results = decoders.decodeBatch(task, sessions)
+            self.profiler.decoder(task, len(data), parseSeconds=parsed - start,
+                                  decodeSeconds=time.perf_counter() - parsed)
+        return results
+
+    def decodeCached(self, task, data):
+        """
+        decode a column of task data, using the decode cache
+
+        Only the sessions not in the cache for the current version of the
+        decoder are decoded, and their results are added to the cache. nan
+        results are None, as they are read from the cache.
+        returns the results by column, see decoders.decodeBatch
+        """
+        import decoders
+
+        version = decoders.VERSIONS[task]
+        hashes = [DecodeCache.hash(tdata) for tdata in data]
+        found = self.decodeCache.get(task, version, hashes)
+        self.profiler.decoder(task, 0, cached=sum(1 for key in hashes if key in found))
+
+        # decode each new session once
+        missing = {}
+        for key, tdata in zip(hashes, data):
+            if key not in found:
+                missing.setdefault(key, tdata)
+        if missing:
+            results = self.decodeColumn(task, list(missing.values()))
+            # the results of each session
+            sessions = [JsonBackend.withoutNan({key: column[i] for key, column in results.items()})
+                        for i in range(len(missing))]
+            decoded = dict(zip(missing.keys(), sessions))
+            self.decodeCache.put(task, version, decoded.items())
+            found.update(decoded)
+
+        return decoders.toColumns([found[key] for key in hashes])
+
+    def decodeParallel(self, task, data):
+        """
+        decode a column of task data in a pool of self.jobs processes
+
+        task - name of the task column
+        data - list with the raw json string of each session
+
+        The sessions are sent to the pool in chunks, CHUNK_SIZE in the decode
+        section of the config file or enough for about 4 chunks per process,
+        and the results are joined back in the order of data.
+        returns the results by column, see decoders.decodeBatch, or None if
+        the pool could not decode them, the caller then decodes serially
+        """
+        chunkSize = self.decodeConfig.get('CHUNK_SIZE', None)
+        if not chunkSize:
+            chunkSize = max(1, -(-len(data) // (self.jobs * 4)))
+        chunks = [(task, data[i:i + chunkSize]) for i in range(0, len(data), chunkSize)]
+
+        executor = None
+        try:
+            with self.decodeLock:
+                # the pool is started once and kept until close
+                if self.decodeExecutor is None:
+                    self.decodeExecutor = ProcessPoolExecutor(max_workers=self.jobs)
+                executor = self.decodeExecutor
+            results = {}
+            done = 0
+            for (task, chunk), chunkResults in zip(chunks, executor.map(decodeTaskChunk, chunks)):
+                # keys missing from a chunk are None for its sessions
+                for key in chunkResults:
+                    if key not in results:
+                        results[key] = [None] * done
+                for key, column in results.items():
+                    column.extend(chunkResults.get(key, [None] * len(chunk)))
+                done += len(chunk)
+        except (BrokenProcessPool, OSError) as e:
+            print(f"Error: parallel decode failed, decoding serially: {e}")
+            with self.decodeLock:
+                if executor is not None and self.decodeExecutor is executor:
+                    self.decodeExecutor = None
+            if executor is not None:
+                executor.shutdown(wait=False)
+            return None
+
+        return results
 
 def main(cmd='all', index=None, verbose=3,env='.env', format='json',
         nodecode = False, rawdata=False, extref=None,webfile=None,sublist=None,
-        config_file = 'config_qualtrics.yaml'               
+        config_file = 'config_qualtrics.yaml', workers=8, deadline=None,
+        surveyIds=None, allSurveys=False, maxExports=4,
+        incremental=False, stateFile='lnpi_sync_state.json', cache=True,
+        jobs=None, stream=False, outputFormat=None,
+        profile=False, profileJson=None, profileDecode=None,
+        surveyNames=None, refreshSurveys=False
     ):
     
+    # --profile-json and --profile-decode imply --profile
+    profiler = Profiler(enabled=profile or profileJson is not None or profileDecode is not None,
+                        capture=['decode'] if profileDecode is not None else None)
+
+    # index may be a list of survey indexes to export several surveys
+    if isinstance(index, list):
+        indexes = index
+    else:
+        indexes = [index] if index is not None else []
+    index = indexes[0] if indexes else None
+    
     environ = dotenv_values(env)
 
     apiToken = environ['QUALTRICS_APITOKEN']
     
     # read these from the yaml config file
+    import yaml
     with open(config_file) as fp:
         config=yaml.safe_load(fp)
         
     dataCenter = config['account']['DATA_CENTER']
     directoryId = config['account']['DEFAULT_DIRECTORY']
     verify = config['account'].get('VERIFY',True)
+    baseUrl = config['account'].get('BASE_URL', None)
+    # optional connection pool settings
+    httpConfig = config.get('http', None)
+    # optional export polling settings, --deadline overrides DEADLINE
+    exportConfig = dict(config.get('export', None) or {})
+    if deadline is not None:
+        exportConfig['DEADLINE'] = deadline
     
+    # optional cache settings
+    cacheConfig = config.get('cache', None) or {}
+    cacheDir = cacheConfig.get('DIR', '.lnpi_cache') if cache else None
+
+    # optional decode settings, --jobs overrides JOBS
+    decodeConfig = config.get('decode', None) or {}
+    if jobs is None:
+        jobs = decodeConfig.get('JOBS', 1)
+
+    # optional output settings, --output-format overrides FORMAT
+    outputConfig = dict(config.get('output', None) or {})
+    if outputFormat is not None:
+        outputConfig['FORMAT'] = outputFormat
+    outputConfig.setdefault('FORMAT', 'csv')
+    if outputConfig['FORMAT'] not in OUTPUT_SUFFIXES:
+        print(f"Error, unknown output format {outputConfig['FORMAT']}, use one of {', '.join(OUTPUT_SUFFIXES)}")
+        sys.exit(1)
+    if outputConfig['FORMAT'] != 'csv' and not havePyarrow():
+        print(f"Error, the {outputConfig['FORMAT']} output format needs pyarrow, pip install pyarrow")
+        sys.exit(1)
+    if stream and outputConfig['FORMAT'] == 'feather':
+        print("--stream writes csv and parquet files, the feather file is written in one piece")
+        stream = False
+
+    # incremental exports keep their state between runs
+    syncState = SyncState(stateFile) if incremental else None
+
     qc = LNPIQualtrics(apiToken, dataCenter,directoryId, verify=verify,
                        nodecode=nodecode, rawdata=rawdata, 
                        dataframe=True, extref = extref,sublist=sublist,
+                       httpConfig=httpConfig, exportConfig=exportConfig,
+                       syncState=syncState, cacheDir=cacheDir, baseUrl=baseUrl,
+                       jobs=jobs, decodeConfig=decodeConfig,
+                       decodeCacheSize=cacheConfig.get('DECODE_MAX_SIZE', 256*1024*1024),
+                       stream=stream, outputConfig=outputConfig, profiler=profiler,
+                       surveyIndexTtl=cacheConfig.get('SURVEY_INDEX_TTL', 86400),
                     )
     
-    mailingLists = qc.getMailingLists()  
-
     pp = pprint.PrettyPrinter(indent=4)
-    
-    if mailingLists == None:
-        print(f"Error, no mailingLists found")
-        sys.exit(1)
+
+    # only the list command needs the mailingLists
+    mailingLists = None
+    if cmd == 'list':
+        mailingLists = qc.getMailingLists()
+        if mailingLists == None:
+            print(f"Error, no mailingLists found")
+            sys.exit(1)
+
+    if refreshSurveys:
+        # read the survey list now and save it in the survey index
+        if qc.getSurveyIndex(refresh=True) == None:
+            print(f"Error, no surveys found")
+            sys.exit(1)
+
+    if surveyNames:
+        # find the surveys by name in the survey index, a name must match one
+        # survey, a pattern with wildcards may match several
+        surveyIds = list(surveyIds or [])
+        for name in surveyNames:
+            surveys = qc.findSurveysByName(name)
+            if surveys == None:
+                print(f"Error, no surveys found")
+                sys.exit(1)
+            if len(surveys) == 0:
+                print(f"Error, no survey named {name} was found")
+                sys.exit(1)
+            if len(surveys) > 1 and not any(c in name for c in '*?['):
+                print(f"Error, {len(surveys)} surveys are named {name}: "
+                      f"{', '.join(survey['id'] for survey in surveys)}, use --survey-id")
+                sys.exit(1)
+            surveyIds += [survey['id'] for survey in surveys if survey['id'] not in surveyIds]
 
     if cmd == 'list' and index==None:
         # get the list of mailingLists
@@ -1017,7 +3151,11 @@ def main(cmd='all', index=None, verbose=3,env='.env', format='json',
         # get the mailingListId fro the specified index
         mailingListId = mailingLists[index-1]['mailingListId']
         mailingList = qc.getContactsMailingList(mailingListId)
-        updatedMailingList = qc.addContactLookupIdToList(mailingListId, mailingList)
+        if mailingList == None:
+            print(f"Error, could not get the mailingList {mailingLists[index-1]['name']}")
+            sys.exit(1)
+        updatedMailingList = qc.addContactLookupIdToList(mailingListId, mailingList,
+                                                         workers=workers)
         
         # print out the contents
         #pp = pprint.PrettyPrinter(indent=4)
@@ -1028,27 +3166,56 @@ def main(cmd='all', index=None, verbose=3,env='.env', format='json',
             pp.pprint(updatedMailingList[i])
     elif cmd == 'surveys' and webfile != None:
         
-        # retrieve surveys accessible by the user
-        surveyLists = qc.getSurveyList()
-        
-        # get the surveyId for the index
-        surveyId = surveyLists[index-1]['id']
+        if surveyIds:
+            surveyId = surveyIds[0]
+        else:
+            # get the surveyId for the index, stops listing once it is found
+            survey = qc.getSurveyByIndex(index)
+            if survey is None:
+                print(f"Error, no survey with index {index} was found")
+                sys.exit(1)
+            surveyId = survey['id']
         
         qc.getResponsesWebFile(surveyId, webfile, format=format)
+
+    elif cmd == 'surveys' and (surveyIds or allSurveys or len(indexes) > 1):
+        # export several surveys in one run
+        if allSurveys:
+            # the full list is read and saved in the survey index
+            surveyLists = qc.getSurveyIndex(refresh=True)
+            if surveyLists == None:
+                print(f"Error, no surveys found")
+                sys.exit(1)
+            exportIds = [survey['id'] for survey in surveyLists]
+        else:
+            exportIds = list(surveyIds or [])
+            if indexes:
+                for i, survey in zip(indexes, qc.getSurveysByIndex(indexes)):
+                    if survey is None:
+                        print(f"Error, no survey with index {i} was found")
+                        sys.exit(1)
+                    exportIds.append(survey['id'])
+
+        # start the exports together and process each as it completes
+        qc.getResponsesMany(exportIds, format=format, maxExports=maxExports)
         
     elif cmd == 'surveys' and index==None:
-        # retrieve surveys accessible by the user
-        surveyLists = qc.getSurveyList()
-        
-        # print out the contents
-        #pp = pprint.PrettyPrinter(indent=4)
-        for i in range(len(surveyLists)):
-            print(f"Surveyindex: {i+1} Title: {surveyLists[i]['name']}") 
+        # retrieve surveys accessible by the user, printing each page
+        # while the next one is requested
+        try:
+            for i, survey in enumerate(qc.iterSurveyList(prefetch=True)):
+                print(f"Surveyindex: {i+1} Title: {survey['name']}") 
+        except IncompleteListError:
+            print(f"Error, the survey list is incomplete")
+            sys.exit(1)
 
 
     elif cmd == 'surveyslong' and index==None:
         # retrieve surveys accessible by the user
         surveyLists = qc.getSurveyList()
+        if surveyLists == None:
+            print(f"Error, no surveys found")
+            sys.exit(1)
         
         # print out the contents
         #pp = pprint.PrettyPrinter(indent=4)
@@ -1059,20 +3226,58 @@ def main(cmd='all', index=None, verbose=3,env='.env', format='json',
             pp.pprint(surveyLists[i])
             
     elif cmd == 'surveys':
-        # retrieve surveys accessible by the user
-        surveyLists = qc.getSurveyList()
-        
-        # get the surveyId for the index
-        surveyId = surveyLists[index-1]['id']
+        # get the surveyId for the index, stops listing once it is found
+        survey = qc.getSurveyByIndex(index)
+        if survey is None:
+            print(f"Error, no survey with index {index} was found")
+            sys.exit(1)
+        surveyId = survey['id']
 
         # get the responses
         qc.getResponses(surveyId, format=format)
 
+    stats = qc.scheduler.stats
+    if stats['retries'] > 0 or stats['throttleWait'] > 0:
+        print(f"Requests: {stats['requests']} retries: {stats['retries']} "
+              f"retry wait: {stats['retryWait']:.1f} sec throttle wait: {stats['throttleWait']:.1f} sec")
+
+    qc.close()
+
+    if profiler.enabled:
+        print(profiler.report())
+        if profileJson is not None:
+            profiler.dump(profileJson)
+            print(f"Profile written to {profileJson}")
+        if profileDecode is not None:
+            if profiler.dumpCaptured(profileDecode):
+                print(f"cProfile statistics of the decode stage written to {profileDecode}")
+            else:
+                print("Nothing was decoded, no cProfile statistics written")
     pass
 
 
 
+def parseIndexes(text):
+    """
+    parse the --index argument, a single index or a comma separated list
+    """
+    try:
+        indexes = [int(item) for item in text.split(',') if item.strip() != '']
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid index list: {text}")
+    if len(indexes) == 0:
+        raise argparse.ArgumentTypeError(f"invalid index list: {text}")
+    return indexes
+
+def parseSurveyIds(text):
+    """
+    parse the --survey-id argument, a comma separated list of surveyIds
+    """
+    return [item.strip() for item in text.split(',') if item.strip() != '']
+
 if __name__ == "__main__":
+    # needed for the --jobs decode processes in a pyinstaller executable
+    multiprocessing.freeze_support()
     
     description = textwrap.dedent('''\
     Gets information about MailingLists and Surveys. 
@@ -1107,6 +3312,21 @@ if __name__ == "__main__":
 
     $ LNPIQualtrics --index 1 --rawdata
     This will retrieve the raw data for the survey with the index 1. Output is in a json file.
+
+    $ LNPIQualtrics --index 1 --incremental
+    This will retrieve only the responses recorded since the last --incremental run and
+    append them to the survey's _df.csv file. The state of each survey is kept in
+    lnpi_sync_state.json, delete the survey's entry to export everything again.
+
+    $ LNPIQualtrics --index 1,4,7 --max-exports 3
+    This will export the surveys with the index 1, 4 and 7 at the same time. Each survey
+    is downloaded and decoded as soon as its export completes. Use --survey-id SV_abc,SV_def
+    to give the surveyIds instead or --all to export all the surveys.
+
+    $ LNPIQualtrics --survey-name 'R34 EMA spinal cord injury'
+    This will export the survey with that name. The index shifts when surveys are added,
+    scheduled jobs should use --survey-name or --survey-id. The survey list is cached in
+    .lnpi_cache/survey_index.json for a day, --refresh-surveys reads it again.
   
     $ LNPIQualtrics --cmd list
     Without the --cmd list argument, the list of accessible mailingLists are listed with their index. 
@@ -1130,9 +3350,56 @@ if __name__ == "__main__":
     parser.add_argument("--env", type = str,
                      help="name of file containing api token in the current directory, default qualtrics_token",
                       default="qualtrics_token") 
-    parser.add_argument("--index", type = int,
-                     help="index number of mailingList to print",
+    parser.add_argument("--index", type = parseIndexes,
+                     help="index number of mailingList to print or survey to export,\n"
+                          "a comma separated list such as 1,4,7 exports several surveys",
+                      default=None) 
+    parser.add_argument("--survey-id", type = parseSurveyIds, dest='survey_id',
+                     help="comma separated list of surveyIds to export, e.g. SV_abc,SV_def",
+                      default=None) 
+    parser.add_argument("--survey-name", type = str, dest='survey_name', action='append',
+                     help="name of a survey to export, can be repeated, matched exactly, then\n"
+                          "ignoring case, or a pattern with * ? [] such as 'R34 EMA*'",
+                      default=None)
+    parser.add_argument("--refresh-surveys", dest='refresh_surveys',
+                        help="read the survey list again instead of using the survey index\n"
+                             "cached for SURVEY_INDEX_TTL seconds", action='store_true')
+    parser.add_argument("--all", help="export all the surveys accessible by the user",
+                        action='store_true')
+    parser.add_argument("--max-exports", type=int, dest='max_exports',
+                     help="number of survey exports to run at the same time, default 4",
+                      default=4) 
+    parser.add_argument("--workers", type=int,
+                     help="number of concurrent contactLookupId lookups for --cmd list --index, default 8",
+                      default=8) 
+    parser.add_argument("--jobs", type=int,
+                     help="number of processes decoding the task data, default JOBS in the config file or 1",
+                      default=None) 
+    parser.add_argument("--stream", help="write the _df.csv file in chunks as the export is read,\n"
+                        "for exports too big to hold in memory", action='store_true')
+    parser.add_argument("--output-format", type=str, dest='output_format',
+                        choices=list(OUTPUT_SUFFIXES),
+                        help="format of the dataframe file, parquet and feather keep the dtypes\n"
+                             "and need pyarrow, default FORMAT in the config file or csv",
+                        default=None)
+    parser.add_argument("--profile", help="report the time of each stage, the api calls by endpoint,\n"
+                        "the decoders and the peak memory at the end of the run", action='store_true')
+    parser.add_argument("--profile-json", type=str, dest='profile_json',
+                        help="write the --profile report to this json file, implies --profile", default=None)
+    parser.add_argument("--profile-decode", type=str, dest='profile_decode',
+                        help="run the decode stage under cProfile and write its statistics to this\n"
+                             "file for pstats or snakeviz, implies --profile", default=None)
+    parser.add_argument("--deadline", type=float,
+                     help="seconds to wait for a response export to complete, default DEADLINE in the config file or 600",
                       default=None) 
+    parser.add_argument("--incremental", help="only export the responses recorded since the last run\n"
+                        "and append them to the survey's _df.csv file, which has no\n"
+                        "index column unlike the _df.csv file of a full export", action='store_true')
+    parser.add_argument("--state-file", type=str, dest='state_file',
+                     help="file holding the state of incremental exports, default lnpi_sync_state.json",
+                      default='lnpi_sync_state.json') 
+    parser.add_argument("--no-cache", dest='cache', help="do not use the on disk caches of survey designs and decoded task data",
+                        action='store_false')
     parser.add_argument("--verbose", type=int, help="verbose level default 3",
                          default=3)   
     parser.add_argument("--cmd", type=str, help="command to run, [all, list, surveys], default surveys",
@@ -1168,7 +3435,23 @@ if __name__ == "__main__":
                 extref = args.extref,  
                 webfile = args.webfile,
                 sublist = args.sublist,
-                config_file=args.config
+                config_file=args.config,
+                workers=args.workers,
+                deadline=args.deadline,
+                surveyIds=args.survey_id,
+                allSurveys=args.all,
+                maxExports=args.max_exports,
+                incremental=args.incremental,
+                stateFile=args.state_file,
+                cache=args.cache,
+                jobs=args.jobs,
+                stream=args.stream,
+                outputFormat=args.output_format,
+                profile=args.profile,
+                profileJson=args.profile_json,
+                profileDecode=args.profile_decode,
+                surveyNames=args.survey_name,
+                refreshSurveys=args.refresh_surveys,
 
             )
         
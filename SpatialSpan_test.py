@@ -18,4 +18,7 @@ assert result['SpatialSpan3_perc_accuracy'] == 1.0, f"expected 1.0"
 result2 = SpatialSpan.decode(-1)
 assert result2['SpatialSpan3_perc_accuracy'] == None, f"expected None"
 
-pass
\ No newline at end of file
+pass
+# decode_batch gives the same results by column
+result3 = SpatialSpan.decode_batch([dlist, -1])
+assert result3['SpatialSpan3_perc_accuracy'] == [1.0, None], f"expected [1.0, None]"
@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+
+"""
+
+Benchmark of the JsonBackend backends on generated exports
+
+Times the json work of an export for each backend: parsing the task data of
+every response and writing the indented output file. The export file itself
+is parsed one response at a time by iterJsonArray with the json module of
+the standard library whatever the backend, so it is not timed here.
+
+$ python benchmarks/json_benchmark.py --responses 1000,10000
+
+"""
+
+import argparse
+import os
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import JsonBackend
+from FakeQualtricsServer import FakeQualtricsData
+
+TASKS = ['SpatialSpan', 'TrailsAB', 'GoStop']
+
+def best(func, repeat):
+    """
+    best time of repeat calls of func in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchmark(responses, repeat=3):
+    """
+    time each backend on an export of responses responses
+
+    returns a dict of backend to a dict of step to seconds
+    """
+    data = FakeQualtricsData(surveys=1, responses=responses)
+    ddict = {'responses': data.responses['SV_fake0000000001']}
+    JsonBackend.setBackend('json')
+    export = JsonBackend.dumpb(ddict)
+    cells = [response['values'][task] for response in ddict['responses']
+             for task in TASKS if response['values'].get(task, '-1') != '-1']
+
+    results = {}
+    for backend in JsonBackend.BACKENDS:
+        JsonBackend.setBackend(backend)
+        results[backend] = {
+            'tasks': best(lambda: [JsonBackend.loads(cell) for cell in cells], repeat),
+            'output': best(lambda: JsonBackend.dumpb(ddict, indent=4), repeat),
+        }
+    JsonBackend.setBackend(JsonBackend.BACKENDS[0])
+    return results, len(export)
+
+def main(sizes, repeat=3):
+    for responses in sizes:
+        results, size = benchmark(responses, repeat=repeat)
+        print(f"{responses} responses, export {size/1e6:.1f} MB")
+        for backend, steps in results.items():
+            line = '  '.join(f"{step} {seconds*1000:8.1f} ms" for step, seconds in steps.items())
+            print(f"  {backend:7s} {line}")
+        if 'orjson' in results:
+            speedup = {step: results['json'][step] / results['orjson'][step]
+                       for step in results['json']}
+            line = '  '.join(f"{step} {value:5.1f}x" for step, value in speedup.items())
+            print(f"  speedup {line}")
+
+if __name__ == "__main__":
+
+    description = textwrap.dedent('''\
+        Benchmark of the json backends on generated exports.
+
+        $ python benchmarks/json_benchmark.py --responses 1000,10000
+    ''')
+
+    parser = argparse.ArgumentParser(
+        description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--responses", type=str,
+                        help="comma separated export sizes in responses, default 1000,10000",
+                        default='1000,10000')
+    parser.add_argument("--repeat", type=int, help="runs of each step, the best is reported, default 3",
+                        default=3)
+    args = parser.parse_args()
+
+    main([int(item) for item in args.responses.split(',')], repeat=args.repeat)
@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+
+"""
+
+Benchmark of the decoders and the response pipeline on synthetic exports
+
+Generates exports with benchmarks/synthetic.py and times each stage of
+processing an export, one stage at a time as processResponses_orig did
+and in the single pass of the ResponsePipeline:
+
+  parse      - reading the responses from the export file, iterJsonArray
+  decode     - decodeData
+  relabel    - relabelData
+  delist     - delistValues
+  dataframe  - createDataFrame with the survey schema
+  write_csv  - writing the _df.csv file
+  pipeline   - decode, relabel and delist in one ResponsePipeline pass
+
+and each decoder on the parsed sessions of its task (decoder:GoStop ...).
+Each stage is run --repeat times, default 3, and the best time is
+reported, a single run is too noisy to compare with the baseline. The
+throughput in responses (sessions for a decoder) per second and the
+peak memory allocated by each stage are reported. The peak memory comes
+from a second run under tracemalloc so it does not slow the timed run.
+
+The results are compared with the baseline in pipeline_baseline.json and
+the benchmark exits with status 1 when a stage is slower, or uses more
+memory, than the baseline by more than --tolerance. The times of the
+baseline are scaled by a calibration loop run on both machines.
+
+$ python benchmarks/pipeline_benchmark.py --responses 1000,10000
+$ python benchmarks/pipeline_benchmark.py --responses 1000,10000 --save-baseline
+
+An export takes about 33 KB per response with all the tasks and the run
+about 250 KB of memory per response, 100000 responses need about 25 GB,
+use --tasks to benchmark fewer tasks on a smaller machine.
+
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import textwrap
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import decoders
+import JsonBackend
+from LNPIQualtrics import LNPIQualtrics, iterJsonArray
+from synthetic import TASKS, generateExport
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_baseline.json')
+
+def calibrate(repeat=15):
+    """
+    best time of a fixed pure python workload, used to scale the baseline
+    times to the speed of this machine
+    """
+    text = json.dumps([{'rt': i, 'correct': i % 3 == 0, 'type': 'target'} for i in range(2000)])
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(40):
+            entries = [dict(entry) for entry in json.loads(text)]
+            sum(entry['rt'] for entry in entries if entry['correct'])
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+class StageRecorder:
+    """
+    Runs the stages of a benchmark and records the seconds, or with memory
+    the peak bytes allocated by tracemalloc, of each stage
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.results = {}
+
+    def run(self, name, func, *args):
+        """
+        run func(*args) as the stage name and return its result
+        """
+        gc.collect()
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = func(*args)
+            self.results[name] = tracemalloc.get_traced_memory()[1] - before
+        else:
+            start = time.perf_counter()
+            result = func(*args)
+            self.results[name] = time.perf_counter() - start
+        return result
+
+def runStages(recorder, export, surveyInfo, tasks):
+    """
+    run the stages on an export, each stage gets the result of the last
+    """
+    qc = LNPIQualtrics('token', 'fake', 'POOL_fake')
+    parse = lambda: {'responses': list(iterJsonArray(io.BytesIO(export)))}
+    schema = qc.compileSchema(surveyInfo)
+
+    # one stage at a time
+    ddict = recorder.run('parse', parse)
+    ddict = recorder.run('decode', qc.decodeData, ddict)
+    ddict = recorder.run('relabel', qc.relabelData, ddict, surveyInfo)
+    ddict = recorder.run('delist', qc.delistValues, ddict)
+    df = recorder.run('dataframe', qc.createDataFrame, ddict, schema)
+    del ddict
+    with tempfile.TemporaryDirectory() as tmpDir:
+        recorder.run('write_csv', df.to_csv, os.path.join(tmpDir, 'benchmark_df.csv'))
+    del df
+
+    # the single pass
+    ddict = parse()
+    pipeline = qc.compilePipeline(surveyInfo)
+    recorder.run('pipeline', pipeline.run, ddict)
+    del ddict, pipeline
+
+    # each decoder on the parsed sessions of its task
+    responses = parse()['responses']
+    for task in tasks:
+        if task not in decoders.MODULES:
+            continue
+        sessions = [JsonBackend.loads(response['values'][task]) for response in responses
+                    if response['values'].get(task, '-1') != '-1']
+        recorder.run(f"decoder:{task}", decoders.decodeBatch, task, sessions)
+        recorder.results[f"decoder:{task}:sessions"] = len(sessions)
+    del responses
+    qc.close()
+
+def benchmark(responses, tasks=TASKS, repeat=3, memory=True, seed=0):
+    """
+    benchmark an export of responses responses
+
+    returns a dict of stage to a dict with seconds, throughput per second
+    and peak_mb
+    """
+    surveyInfo, export = generateExport(responses, tasks=tasks, seed=seed)
+
+    seconds = {}
+    for _ in range(repeat):
+        recorder = StageRecorder()
+        runStages(recorder, export, surveyInfo, tasks)
+        for name, value in recorder.results.items():
+            if not name.endswith(':sessions'):
+                seconds[name] = min(value, seconds.get(name, value))
+    counts = {name[:-len(':sessions')]: value for name, value in recorder.results.items()
+              if name.endswith(':sessions')}
+
+    peaks = {}
+    if memory:
+        recorder = StageRecorder(memory=True)
+        tracemalloc.start()
+        try:
+            runStages(recorder, export, surveyInfo, tasks)
+        finally:
+            tracemalloc.stop()
+        peaks = {name: value for name, value in recorder.results.items() if not name.endswith(':sessions')}
+
+    results = {}
+    for name, value in seconds.items():
+        count = counts.get(name, responses)
+        results[name] = {
+            'seconds': value,
+            'throughput': count / value if value > 0 else None,
+        }
+        if name in peaks:
+            results[name]['peak_mb'] = peaks[name] / 1e6
+    return results, len(export)
+
+def compare(results, baseline, scale, tolerance=0.25, minSeconds=0.05):
+    """
+    compare the results of one export size with its baseline
+
+    scale - calibration time of this machine over that of the baseline
+
+    returns a list of regression messages
+    """
+    regressions = []
+    for name, base in baseline.items():
+        if name not in results:
+            continue
+        result = results[name]
+        allowed = base['seconds'] * scale * (1 + tolerance) + minSeconds
+        if result['seconds'] > allowed:
+            regressions.append(f"{name} took {result['seconds']:.3f} sec, "
+                               f"baseline {base['seconds'] * scale:.3f} sec")
+        if 'peak_mb' in base and 'peak_mb' in result and \
+                result['peak_mb'] > base['peak_mb'] * (1 + tolerance) + 1:
+            regressions.append(f"{name} peak {result['peak_mb']:.1f} MB, "
+                               f"baseline {base['peak_mb']:.1f} MB")
+    return regressions
+
+def main(sizes, tasks=TASKS, repeat=3, memory=True, tolerance=0.25,
+         saveBaseline=False, baselineFile=BASELINE):
+    calibration = calibrate()
+    baseline = {}
+    if os.path.exists(baselineFile):
+        with open(baselineFile, 'rb') as fp:
+            baseline = JsonBackend.load(fp)
+
+    allResults = {}
+    for responses in sizes:
+        results, size = benchmark(responses, tasks=tasks, repeat=repeat, memory=memory)
+        allResults[str(responses)] = results
+        print(f"{responses} responses, export {size/1e6:.1f} MB")
+        for name, result in results.items():
+            line = f"  {name:26s} {result['seconds']:8.3f} sec"
+            if result['throughput'] is not None:
+                line += f" {result['throughput']:12,.0f} /sec"
+            if 'peak_mb' in result:
+                line += f" {result['peak_mb']:9.1f} MB"
+            print(line)
+
+    # calibrated again at the end, the faster of the two is less disturbed
+    # by other work on the machine
+    calibration = min(calibration, calibrate())
+    scale = calibration / baseline['calibration'] if baseline.get('calibration') else 1.0
+    regressions = []
+    for responses, results in allResults.items():
+        base = baseline.get('results', {}).get(responses, None)
+        if base is not None and not saveBaseline:
+            regressions += [f"{responses} responses: {message}"
+                            for message in compare(results, base, scale, tolerance=tolerance)]
+
+    if saveBaseline:
+        baseline.setdefault('results', {}).update(allResults)
+        baseline['calibration'] = calibration
+        baseline['tasks'] = tasks
+        with open(baselineFile, 'wb') as fp:
+            JsonBackend.dump(baseline, fp, indent=2)
+        print(f"Saved the baseline to {baselineFile}")
+        return 0
+
+    if not baseline:
+        print(f"No baseline in {baselineFile}, run with --save-baseline to create it")
+        return 0
+    if baseline.get('tasks', TASKS) != tasks:
+        print(f"The baseline was run with the tasks {','.join(baseline.get('tasks', TASKS))}, not compared")
+        return 0
+    if regressions:
+        print(f"Regressions against the baseline (tolerance {tolerance:.0%}, calibration scale {scale:.2f}):")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print(f"No regressions against the baseline (calibration scale {scale:.2f})")
+    return 0
+
+if __name__ == "__main__":
+
+    description = textwrap.dedent('''\
+        Benchmark of the decoders and the response pipeline on synthetic exports.
+
+        $ python benchmarks/pipeline_benchmark.py --responses 1000,10000
+        $ python benchmarks/pipeline_benchmark.py --responses 1000,10000 --save-baseline
+    ''')
+
+    parser = argparse.ArgumentParser(
+        description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--responses", type=str,
+                        help="comma separated export sizes in responses, default 1000,10000",
+                        default='1000,10000')
+    parser.add_argument("--tasks", type=str, help=f"comma separated tasks in the export, default {','.join(TASKS)}",
+                        default=','.join(TASKS))
+    parser.add_argument("--repeat", type=int, help="runs of each stage, the best is reported, default 3",
+                        default=3)
+    parser.add_argument("--no-memory", dest='memory', help="do not measure the peak memory of the stages",
+                        action='store_false')
+    parser.add_argument("--tolerance", type=float,
+                        help="fraction a stage may be slower or larger than the baseline, default 0.25",
+                        default=0.25)
+    parser.add_argument("--save-baseline", dest='save_baseline', help="save the results as the baseline",
+                        action='store_true')
+    parser.add_argument("--baseline", type=str, help=f"baseline file, default {os.path.basename(BASELINE)}",
+                        default=BASELINE)
+    args = parser.parse_args()
+
+    sys.exit(main([int(item) for item in args.responses.split(',')], tasks=args.tasks.split(','),
+                  repeat=args.repeat, memory=args.memory, tolerance=args.tolerance,
+                  saveBaseline=args.save_baseline, baselineFile=args.baseline))
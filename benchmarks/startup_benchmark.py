@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+
+"""
+
+Benchmark of the startup time of the LNPIQualtrics command
+
+Times, as separate processes, the commands that should start quickly:
+
+  version - LNPIQualtrics.py -V
+  surveys - LNPIQualtrics.py --cmd surveys, listing the surveys of a
+            FakeQualtricsServer with --latency seconds added to each request
+
+The best of --repeat runs of each is reported and the benchmark exits with
+status 1 when one is slower than its target, --target-version and
+--target-surveys. Neither command should import pandas, numpy, yaml (-V)
+or the decoders, or fetch the mailing lists.
+
+$ python benchmarks/startup_benchmark.py
+$ python benchmarks/startup_benchmark.py --latency 0.1 --target-surveys 0.8
+
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FakeQualtricsServer import FakeQualtricsData, startServer
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LNPIQualtrics.py')
+
+def best(args, repeat, cwd=None):
+    """
+    best time of repeat runs of LNPIQualtrics.py with args in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, SCRIPT] + args, cwd=cwd,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"LNPIQualtrics.py {' '.join(args)} failed: {result.stderr.decode()}")
+    return min(times)
+
+def benchmark(repeat=5, latency=0.0):
+    """
+    time the commands, returns a dict of command to seconds and the
+    requests of each run of the survey listing by route
+    """
+    server = startServer(data=FakeQualtricsData(surveys=20, responses=1), latency=latency)
+    try:
+        with tempfile.TemporaryDirectory() as tmpDir:
+            with open(os.path.join(tmpDir, 'config_qualtrics.yaml'), 'w') as fp:
+                fp.write(textwrap.dedent(f'''\
+                    account:
+                      DATA_CENTER: fake
+                      DEFAULT_DIRECTORY: POOL_fake
+                      BASE_URL: {server.baseUrl}
+                '''))
+            with open(os.path.join(tmpDir, 'qualtrics_token'), 'w') as fp:
+                fp.write("QUALTRICS_APITOKEN=token\n")
+
+            results = {'version': best(['-V'], repeat, cwd=tmpDir)}
+            results['surveys'] = best(['--cmd', 'surveys', '--no-cache'], repeat, cwd=tmpDir)
+            requests = {key: count / repeat for key, count in server.requestCounts.items()}
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results, requests
+
+def main(repeat=5, latency=0.0, targets=None):
+    results, requests = benchmark(repeat=repeat, latency=latency)
+    slow = []
+    for name, seconds in results.items():
+        target = targets.get(name, None)
+        line = f"  {name:10s} {seconds:8.3f} sec"
+        if target is not None:
+            line += f"  target {target:.3f} sec"
+            if seconds > target:
+                slow.append(name)
+                line += "  SLOW"
+        print(line)
+    for key, count in requests.items():
+        print(f"  --cmd surveys requests {key}: {count:g}")
+    if slow:
+        print(f"Slower than the target: {', '.join(slow)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+
+    description = textwrap.dedent('''\
+        Benchmark of the startup time of LNPIQualtrics.py -V and --cmd surveys.
+
+        $ python benchmarks/startup_benchmark.py
+    ''')
+
+    parser = argparse.ArgumentParser(
+        description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--repeat", type=int, help="runs of each command, the best is reported, default 5",
+                        default=5)
+    parser.add_argument("--latency", type=float, help="seconds added to every request of the fake server, default 0",
+                        default=0.0)
+    parser.add_argument("--target-version", type=float, dest='target_version',
+                        help="seconds -V may take, default 0.4", default=0.4)
+    parser.add_argument("--target-surveys", type=float, dest='target_surveys',
+                        help="seconds --cmd surveys may take, default 0.6", default=0.6)
+    args = parser.parse_args()
+
+    sys.exit(main(repeat=args.repeat, latency=args.latency,
+                  targets={'version': args.target_version, 'surveys': args.target_surveys}))
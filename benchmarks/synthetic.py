@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+
+"""
+
+Synthetic exports for the benchmarks
+
+Builds exports of any size from the fake survey of FakeQualtricsServer.py
+with the task cells filled by sessions resampled from the sessions in
+SampleData, so every response has different task data as in a real export
+and the decoders see all their branches:
+
+  GoStop           - rt jittered, the correct flag of some responses flipped
+  SpatialSpan      - rt jittered, recall accuracy redrawn for the set size
+  IST              - trials drawn from the sample trials with a random
+                     number of the opened boxes, rt jittered
+  DelayDiscounting - delay index and choice of each trial redrawn
+  TrailsAB         - rt jittered
+
+$ python benchmarks/synthetic.py --responses 1000 --output export.json
+
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import textwrap
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import JsonBackend
+from FakeQualtricsServer import FakeQualtricsData, SampleData
+
+TASKS = ['GoStop', 'SpatialSpan', 'IST', 'DelayDiscounting', 'TrailsAB']
+
+# number of delays of the delay discounting task
+DELAYS = 31
+
+def loadSampleSessions():
+    """
+    load the sessions in SampleData, a dict of task to a list of sessions
+    """
+    sessions = {}
+    for task in ['GoStop', 'IST', 'DelayDiscounting']:
+        with open(os.path.join(SampleData, f"{task}.json")) as fp:
+            sessions[task] = [json.load(fp)]
+    sessions['SpatialSpan'] = []
+    for name in ['sspan01.json', 'sspan02.json']:
+        with open(os.path.join(SampleData, name)) as fp:
+            text = fp.read().strip()
+        # stored as a json encoded string, sspan01.json without the quotes
+        if not text.startswith('"'):
+            text = f'"{text}"'
+        sessions['SpatialSpan'].append(json.loads(json.loads(text)))
+    sessions['TrailsAB'] = [[
+        {'trial_type': 'trails', 'trailsType': 'A', 'time_elapsed': 21345, 'rt': 21000},
+        {'trial_type': 'trails', 'trailsType': 'B', 'time_elapsed': 45678, 'rt': 45000},
+    ]]
+    return sessions
+
+class SessionGenerator:
+    """
+    Resamples the sessions in SampleData into new sessions of each task,
+    the same seed gives the same sessions
+    """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.samples = loadSampleSessions()
+        # the IST trials of the samples, by the decreasing flag
+        self.istTrials = {}
+        for session in self.samples['IST']:
+            for entry in session:
+                if 'pressed' in entry:
+                    self.istTrials.setdefault(entry['decreasing'], []).append(entry)
+
+    def jitter(self, entry):
+        """
+        scale the rt of an entry by a random factor
+        """
+        if isinstance(entry.get('rt', None), (int, float)):
+            entry['rt'] = int(entry['rt'] * self.random.uniform(0.7, 1.3))
+
+    def session(self, task):
+        """
+        get a new session of task, a list of entries
+        """
+        session = copy.deepcopy(self.random.choice(self.samples[task]))
+        for index, entry in enumerate(session):
+            if task == 'GoStop':
+                # only responses are flipped, the scorer reads the rt of a
+                # correct target and of a fixation after a late target
+                if isinstance(entry.get('correct', None), bool) and self.random.random() < 0.05 and \
+                        isinstance(entry.get('rt', None), (int, float)):
+                    entry['correct'] = not entry['correct']
+            elif task == 'SpatialSpan':
+                if entry.get('trial_type', None) == 'spatial-span-recall' and 'set_size' in entry:
+                    entry['accuracy'] = self.random.randint(0, entry['set_size'])
+            elif task == 'IST':
+                if 'pressed' in entry:
+                    entry = copy.deepcopy(self.random.choice(self.istTrials[entry['decreasing']]))
+                    entry['pressed'] = entry['pressed'][:self.random.randint(1, len(entry['pressed']))]
+                    entry['response'] = self.random.randint(0, 1)
+                    session[index] = entry
+            elif task == 'DelayDiscounting':
+                if 'delay' in entry:
+                    entry['index'] = [self.random.randint(1, DELAYS), entry['index'][1]]
+                    entry['delay'] = self.random.random() < 0.5
+            self.jitter(entry)
+        return session
+
+def generateExport(responses, tasks=TASKS, seed=0, completed=0.9):
+    """
+    generate the export of the fake survey with responses responses
+
+    tasks     - tasks with a cell in each response, the others are '-1'
+    completed - fraction of the task cells with a session, the others are
+        '-1' as for a session that was not completed
+
+    returns (surveyInfo, export), export is the json of the export file
+    """
+    data = FakeQualtricsData(surveys=1, responses=responses, mailingLists=1, seed=seed)
+    surveyId = data.surveys[0]['id']
+    generator = SessionGenerator(seed=seed)
+    rng = random.Random(seed)
+    for response in data.responses[surveyId]:
+        values = response['values']
+        for task in TASKS:
+            if task not in values:
+                continue
+            if task in tasks and rng.random() < completed:
+                values[task] = JsonBackend.dumps(generator.session(task))
+            else:
+                values[task] = '-1'
+    export = JsonBackend.dumpb({'responses': data.responses[surveyId]})
+    return data.surveyInfo[surveyId], export
+
+if __name__ == "__main__":
+
+    description = textwrap.dedent('''\
+        Write a synthetic export file with sessions resampled from SampleData.
+
+        $ python benchmarks/synthetic.py --responses 1000 --output export.json
+    ''')
+
+    parser = argparse.ArgumentParser(
+        description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--responses", type=int, help="responses in the export, default 1000",
+                        default=1000)
+    parser.add_argument("--tasks", type=str, help=f"comma separated tasks, default {','.join(TASKS)}",
+                        default=','.join(TASKS))
+    parser.add_argument("--seed", type=int, help="random seed, default 0", default=0)
+    parser.add_argument("--output", type=str, help="export file to write, default export.json",
+                        default='export.json')
+    args = parser.parse_args()
+
+    surveyInfo, export = generateExport(args.responses, tasks=args.tasks.split(','), seed=args.seed)
+    with open(args.output, 'wb') as fp:
+        fp.write(export)
+    print(f"Wrote {args.responses} responses to {args.output}, {len(export)/1e6:.1f} MB")
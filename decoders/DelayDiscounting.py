@@ -0,0 +1,39 @@
+# function that accepts the json data and returns the result in a dict
+
+# bump the version when the decoded results change, cached results of
+# other versions are not used
+__version_info__ = ('0', '1', '0')
+__version__ = '.'.join(__version_info__)
+
+# dtype of each result, used for the columns of the dataframe
+OUTPUT_DTYPES = {
+    'dd_trials': 'Int64',
+    'dd_mean_rt': 'float32',
+    'dd_delay_index': 'Int64',
+    'dd_ed50_hours': 'float32',
+    'dd_log_ed50': 'float32',
+}
+
+from .impulsivity_process import ImpulsivityProcess
+
+# for DelayDiscounting
+def decode(jsonData, label='DelayDiscounting'):
+
+    # instantiate the object
+    obj = ImpulsivityProcess()
+
+    results = obj.delaydiscounting_score(jsonData)
+
+    return results
+
+# for a column of DelayDiscounting sessions, returns a list of values for each key
+def decode_batch(sessions, label='DelayDiscounting'):
+
+    from . import toColumns
+
+    obj = ImpulsivityProcess()
+
+    results = obj.delaydiscounting_score_batch(sessions)
+
+    # sessions without a delayed choice have no results
+    return toColumns(results)
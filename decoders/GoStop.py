@@ -1,6 +1,16 @@
 # function that accepts the json data and returns the result in a dict
 
-from statistics import mean
+# bump the version when the decoded results change, cached results of
+# other versions are not used
+__version_info__ = ('0', '1', '0')
+__version__ = '.'.join(__version_info__)
+
+# dtype of each result, used for the columns of the dataframe
+OUTPUT_DTYPES = {f"gs_{key}": 'Int64' for key in [
+    'novel_total', 'novel_correct', 'novel_incorrect',
+    'target_total', 'target_correct', 'target_late', 'target_incorrect',
+    'stop_total', 'stop_correct', 'stop_incorrect']}
+OUTPUT_DTYPES.update({'gs_mean_reaction_time': 'float32', 'gs_stop_incorrect_ratio': 'float32'})
 
 from .impulsivity_process import ImpulsivityProcess
 
@@ -13,3 +23,15 @@ def decode(jsonData, label='GoStop'):
     results = obj.gostop_score(jsonData)
 
     return results
+
+# for a column of GoStop sessions, returns a list of values for each key
+def decode_batch(sessions, label='GoStop'):
+
+    from . import toColumns
+
+    obj = ImpulsivityProcess()
+
+    results = obj.gostop_score_batch(sessions)
+
+    # sessions without a reaction time have no results
+    return toColumns(results)
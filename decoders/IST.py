@@ -0,0 +1,37 @@
+# function that accepts the json data and returns the result in a dict
+
+# bump the version when the decoded results change, cached results of
+# other versions are not used
+__version_info__ = ('0', '1', '0')
+__version__ = '.'.join(__version_info__)
+
+# dtype of each result, used for the columns of the dataframe
+OUTPUT_DTYPES = {}
+for condition in ['ist_dw', 'ist_fw']:
+    OUTPUT_DTYPES.update({f"{condition}_trials": 'Int64', f"{condition}_incorrect": 'Int64'})
+    OUTPUT_DTYPES.update({f"{condition}_{key}": 'float32'
+                          for key in ['opens', 'choicetime', 'latency', 'p_correct']})
+
+from .impulsivity_process import ImpulsivityProcess
+
+# for IST
+def decode(jsonData, label='IST'):
+
+    # instantiate the object
+    obj = ImpulsivityProcess()
+
+    results = obj.ist_score(jsonData)
+
+    return results
+
+# for a column of IST sessions, returns a list of values for each key
+def decode_batch(sessions, label='IST'):
+
+    from . import toColumns
+
+    obj = ImpulsivityProcess()
+
+    results = obj.ist_score_batch(sessions)
+
+    # sessions without trials have no results
+    return toColumns(results)
@@ -1,7 +1,17 @@
 # function that accepts the json data and returns the result in a dict
 
+# bump the version when the decoded results change, cached results of
+# other versions are not used
+__version_info__ = ('0', '1', '0')
+__version__ = '.'.join(__version_info__)
+
+# dtype of each result, used for the columns of the dataframe
+OUTPUT_DTYPES = {f"SpatialSpan{size}_perc_accuracy": 'float32' for size in ["3", "4", "5"]}
+
 from statistics import mean
 
+import numpy as np
+
 # for spatial scan
 def decode(jsonData, label='SpatialSpan'):
     
@@ -43,3 +53,45 @@ def decode(jsonData, label='SpatialSpan'):
                 newKey = f"{label}{key}_perc_accuracy"
                 results[newKey]=None
     return results
+
+# for a column of spatial span sessions, returns a list of values for each key
+def decode_batch(sessions, label='SpatialSpan'):
+
+    # accuracy of all the recall trials, with their session and set_size
+    sizes = ["3", "4", "5"]
+    sizeIndex = {size: i for i, size in enumerate(sizes)}
+    trialSession = []
+    trialSize = []
+    trialAccuracy = []
+    for i, jsonData in enumerate(sessions):
+        if type(jsonData) is list:
+            for item in jsonData:
+                if item['trial_type'] == 'spatial-span-recall' and 'set_size' in item:
+                    trialSession.append(i)
+                    trialSize.append(sizeIndex[str(item['set_size'])])
+                    trialAccuracy.append(item['accuracy'])
+
+    # sum and count the accuracy for each session and set_size
+    bins = np.array(trialSession, dtype=np.int64) * len(sizes) + np.array(trialSize, dtype=np.int64)
+    accuracy = np.array([value if isinstance(value, (int, float)) else np.nan
+                         for value in trialAccuracy], dtype=float)
+    total = np.bincount(bins, weights=accuracy, minlength=len(sessions) * len(sizes))
+    count = np.bincount(bins, minlength=len(sessions) * len(sizes))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentCorrect = total / count / np.array([float(size) for size in sizes] * len(sessions))
+    percentCorrect = percentCorrect.reshape(len(sessions), len(sizes))
+    count = count.reshape(len(sessions), len(sizes))
+
+    results = {f"{label}{size}_perc_accuracy": [None] * len(sessions) for size in sizes}
+    for j, size in enumerate(sizes):
+        column = results[f"{label}{size}_perc_accuracy"]
+        for i, value in enumerate(percentCorrect[:, j].tolist()):
+            if count[i, j] > 0:
+                column[i] = value
+
+    # accuracy that is not a number is left to decode to report
+    for i in set(trialSession[k] for k in np.flatnonzero(np.isnan(accuracy))):
+        for key, value in decode(sessions[i], label=label).items():
+            results[key][i] = value
+
+    return results
@@ -1,11 +1,17 @@
-import os
-import pandas as pd
-import statistics
-import json
+import numpy as np
 
 
 # function that accepts the json data and returns the result in a dict
 
+# bump the version when the decoded results change, cached results of
+# other versions are not used
+__version_info__ = ('0', '1', '0')
+__version__ = '.'.join(__version_info__)
+
+# dtype of each result, used for the columns of the dataframe
+OUTPUT_DTYPES = {f"Grid{trailsType}_{key}": 'float32'
+                 for trailsType in ['A', 'B'] for key in ['secs', 'secsinv']}
+
 
 def decode(gridData,label='Grid'):
     
@@ -40,3 +46,40 @@ def decode(gridData,label='Grid'):
         
 
 
+# for a column of trails sessions, returns a list of values for each key
+def decode_batch(sessions, label='Grid'):
+
+    # time_elapsed of the trails trials, the last one of each trailsType is used
+    last = {}
+    for i, gridData in enumerate(sessions):
+        if type(gridData) is list:
+            for item in gridData:
+                if item['trial_type'] == 'trails':
+                    last[(i, f"{label}{item['trailsType']}_secs")] = item['time_elapsed']
+        else:
+            # empty results
+            for trailsType in ['A', 'B']:
+                last[(i, f"{label}{trailsType}_secs")] = None
+
+    keys = {}
+    for i, key in last:
+        keys.update({key: None, key + "inv": None})
+    results = {key: [None] * len(sessions) for key in keys}
+
+    trials = [(i, key) for (i, key), value in last.items() if value is not None]
+    elapsed = [last[trial] for trial in trials]
+    if not all(isinstance(value, (int, float)) and value != 0 for value in elapsed):
+        # left to decode to report
+        for i in set(i for i, key in trials):
+            for key, value in decode(sessions[i], label=label).items():
+                results[key][i] = value
+        return results
+
+    # convert to seconds float and add the inverse so that higher values are better
+    secs = np.array(elapsed, dtype=float) / 1000.0
+    secsinv = 1.0 / secs
+    for (i, key), value, inv in zip(trials, secs.tolist(), secsinv.tolist()):
+        results[key][i] = value
+        results[key + "inv"][i] = inv
+
+    return results
@@ -1 +1,66 @@
-__all__ = ["SpatialSpan", "TrailsAB","GoStop"]
\ No newline at end of file
+# decoders for the cognitive task data found in survey responses
+#
+# Each module has a decode(jsonData) function which accepts the task data
+# and returns the results in a dict, and a decode_batch(sessions) function
+# which decodes a whole column of task data at once and returns the results
+# by column, see decodeBatch. The modules are imported here, rather than
+# found at run time, so the registry is built once at import time and
+# pyinstaller can see them.
+
+from . import SpatialSpan, TrailsAB, GoStop, IST, DelayDiscounting
+
+__all__ = ["SpatialSpan", "TrailsAB","GoStop", "IST", "DelayDiscounting"]
+
+# decoder module for each task, keyed by the name of the response column
+# holding the task data
+MODULES = {
+    "SpatialSpan": SpatialSpan,
+    "TrailsAB": TrailsAB,
+    "GoStop": GoStop,
+    "IST": IST,
+    "DelayDiscounting": DelayDiscounting,
+}
+
+# decode function for each task
+DECODERS = {task: module.decode for task, module in MODULES.items()}
+
+# version of each decoder, decoded results are cached by version
+VERSIONS = {task: module.__version__ for task, module in MODULES.items()}
+
+# dtype of each decoded result, for the columns of the dataframe
+OUTPUT_DTYPES = {key: dtype for module in MODULES.values()
+                 for key, dtype in getattr(module, 'OUTPUT_DTYPES', {}).items()}
+
+def getDecoders(columns):
+    """
+    get the decoders for the task columns present in columns
+
+    returns a dict of column name to decode function, in registry order
+    """
+    columns = set(columns)
+    return {task: decode for task, decode in DECODERS.items() if task in columns}
+
+def toColumns(results):
+    """
+    convert a list of decode results to a dict of output key to a list with
+    the value for each session, None where a session has no value for the key
+    """
+    keys = {}
+    for result in results:
+        keys.update(dict.fromkeys(result))
+    return {key: [result.get(key, None) for result in results] for key in keys}
+
+def decodeBatch(task, sessions):
+    """
+    decode a column of task data with the decoder for task
+
+    task     - name of the task column
+    sessions - list of the task data of each session, as returned by json.loads
+
+    returns a dict of output key to a list with the value for each session,
+    None where a session has no value for the key
+    """
+    module = MODULES[task]
+    if hasattr(module, 'decode_batch'):
+        return module.decode_batch(sessions)
+    return toColumns([module.decode(jsonData) for jsonData in sessions])
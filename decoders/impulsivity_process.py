@@ -9,9 +9,9 @@ import json
 from pathlib import Path
 import textwrap
 
-import pandas as pd
+import numpy as np
 
-from math import factorial
+from math import comb, log10
     
 """
 
@@ -19,16 +19,109 @@ from math import factorial
 
 """
 
-__version_info__ = ('0', '1', '0')
+__version_info__ = ('0', '1', '4')
 __version__ = '.'.join(__version_info__)
 
 version_history = \
 """
+0.1.4 - a trial with a pressed box missing from the stimulus is scored without the
+        probability of a correct choice instead of failing the export
+0.1.3 - pandas is only imported by read_csv so the decoders load without it
+0.1.2 - ist_score and delaydiscounting_score return their results, batch
+        scorers for both, binomial and delay tables are computed once
+0.1.1 - gostop_score_batch scores many GoStop sessions at once
 0.1.0 - initial version  
 """
     
 SampleData = 'SampleData'
 
+# codes for the entries scored by gostop_score_batch, anything else is 0
+GOSTOP_TYPES = {'novel': 1, 'target': 2, 'stop': 3}
+GOSTOP_CORRECT = {True: 1, False: 2}
+
+# boxes in the IST grid and the colors by the response code of the choice
+IST_BOXES = 25
+IST_COLORS = ['yellow', 'blue']
+# grid position of each box id found in pressed, e.g. s20
+IST_BOX_INDEX = {f"s{box}": box for box in range(IST_BOXES)}
+# result key prefix of each IST condition, by the decreasing flag of a trial
+IST_CONDITIONS = {True: 'ist_dw', False: 'ist_fw'}
+
+# binomial coefficients C(n, k) and their running sums over k, for n up to
+# the IST grid size, larger n are computed when needed
+BINOMIAL = [[comb(n, k) for k in range(n + 1)] for n in range(IST_BOXES + 1)]
+BINOMIAL_SUMS = [list(np.cumsum(row).tolist()) for row in BINOMIAL]
+
+# probability that the chosen color is the majority, by the number of
+# boxes opened of the chosen and of the other color, for each grid size
+IST_PROBABILITY = {}
+
+def ist_probability_table(boxes=IST_BOXES):
+    """
+    table of the probability that the chosen color is the majority of the
+    grid after opening a boxes of the chosen color and b of the other, each
+    closed box being either color with equal chance (Clark et al. 2006)
+
+    returns an array indexed by [a, b], computed once for each grid size
+    """
+    table = IST_PROBABILITY.get(boxes, None)
+    if table is None:
+        majority = boxes // 2 + 1
+        table = np.zeros((boxes + 1, boxes + 1))
+        for a in range(boxes + 1):
+            for b in range(boxes + 1 - a):
+                closed = boxes - a - b
+                need = max(0, majority - a)
+                if need <= closed:
+                    row = BINOMIAL[closed] if closed < len(BINOMIAL) else \
+                        [comb(closed, k) for k in range(closed + 1)]
+                    table[a, b] = sum(row[need:]) / 2 ** closed
+        IST_PROBABILITY[boxes] = table
+    return table
+
+# hours of each delay of the delay discounting task, by the index in the
+# task data, from Koffarnus and Bickel 2014, the index starts at 1
+DAY2HOURS = 24
+WEEK2HOURS = 7 * DAY2HOURS
+MONTH2HOURS = 30 * DAY2HOURS
+YEAR2HOURS = 365 * DAY2HOURS
+DELAY_HOURS = [
+    0, #
+    1, # 1 hour
+    2, # 2 hours
+    3, # 3 hours
+    4, # 4 hours
+    6, # 6 hours
+    9, # 9 hours
+    12, # 12 hours
+    1*DAY2HOURS, # 1 day
+    1.5*DAY2HOURS, # 1.5 days
+    2*DAY2HOURS, # 2 days
+    3*DAY2HOURS, # 3 days
+    4*DAY2HOURS, # 4 days
+    1*WEEK2HOURS, # 1 week
+    1.5*WEEK2HOURS, # 1.5 weeks
+    2*WEEK2HOURS, # 2 weeks
+    3*WEEK2HOURS, # 3 weeks
+    1*MONTH2HOURS, # 1 month
+    2*MONTH2HOURS, # 2 months
+    3*MONTH2HOURS, # 3 months
+    4*MONTH2HOURS, # 4 months
+    6*MONTH2HOURS, # 6 months
+    8*MONTH2HOURS, # 8 months
+    1*YEAR2HOURS, # 1 year
+    2*YEAR2HOURS, # 2 years
+    3*YEAR2HOURS, # 3 years
+    4*YEAR2HOURS, # 4 years
+    5*YEAR2HOURS, # 5 years
+    8*YEAR2HOURS, # 8 years
+    12*YEAR2HOURS, # 12 years
+    18*YEAR2HOURS, # 18 years
+    25*YEAR2HOURS, # 25 years
+]
+# log10 of the hours, 0 hours has none
+DELAY_LOG_HOURS = [log10(hours) if hours > 0 else None for hours in DELAY_HOURS]
+
 class ImpulsivityProcess:
     
     def __init__(self, **kwargs):
@@ -62,58 +155,180 @@ class ImpulsivityProcess:
             pass
 
 
+    def ist_trial(self, entry):
+        """
+        get the counts of an IST trial
+
+        Args:
+            entry - an entry of the IST task with a 'pressed' key
+
+        Returns:
+            (decreasing, opens, incorrect, choicetime, boxes, chosen, other),
+            boxes is the grid size, chosen and other the number of boxes of
+            the chosen color and of the other color that were opened, boxes
+            is 0 when they cannot be read from pressed and stimulus
+        """
+        opens = len(entry['pressed'])
+        # check if response is correct
+        incorrect = 0 if entry['correct'] == True else 1
+        choicetime = entry['rt']
+        decreasing = entry['decreasing'] == True
+
+        # calculate the number of target color boxes opened
+        # by reading the pressed list
+        boxes = chosen = other = 0
+        stimulus = entry.get('stimulus', None)
+        response = entry.get('response', None)
+        if isinstance(stimulus, list) and response in (0, 1):
+            try:
+                opened = {IST_BOX_INDEX.get(press[0], None) for press in entry['pressed']}
+                if None in opened:
+                    opened = {int(press[0][1:]) for press in entry['pressed']}
+                colors = [stimulus[box] for box in opened]
+            except (TypeError, ValueError, IndexError):
+                colors = None
+            if colors is not None:
+                boxes = len(stimulus)
+                chosen = colors.count(IST_COLORS[response])
+                other = len(colors) - chosen
+        return decreasing, opens, incorrect, choicetime, boxes, chosen, other
+
     def ist_score(self,ddict):
         """
         Analyze the IST task
 
         Two conditions:
-        1. DecreasingWin
-        2. FixedWin
+        1. DecreasingWin - ist_dw
+        2. FixedWin - ist_fw
         
-        rt - total time to make choice
+        for each condition with trials
+            trials - number of trials
+            opens - mean number of boxes opened
+            incorrect - number of incorrect choices
+            choicetime - mean rt, total time to make choice
+            latency - mean time per box opened
+            p_correct - mean probability that the chosen color was the majority
+                when the choice was made, see ist_probability_table
         Args:
             ddict  - dictionary of IST task
+
+        Returns:
+            dict of the results, empty without trials
         """
-        total_entries = len(ddict)
-        
         results = {}
-        for condition in ['DecreasingWin','FixedWin']:
+        for condition in IST_CONDITIONS.values():
             results[condition] = {}
             results[condition]['opens'] = []  # len of pressed
             results[condition]['incorrect'] = []  # correct
             results[condition]['choicetime'] = []  # rt
             results[condition]['latency'] = []  # latency
+            results[condition]['p_correct'] = []
                         
-        for index in range(total_entries):
-            entry = ddict[index]
+        for entry in ddict:
             # check if pressed is a key
             if 'pressed' in entry:
-                # data to use
-                opens = len(entry['pressed'])
-                # check if response is correct
-                if entry['correct'] == True:
-                    incorrect = 0
-                else:
-                    incorrect = 1
-            
-                choicetime = entry['rt']
-                
-                if entry['decreasing'] == True:
-                    condition = 'DecreasingWin'
-                else:
-                    condition = 'FixedWin'
-                    
+                decreasing, opens, incorrect, choicetime, boxes, chosen, other = self.ist_trial(entry)
+                condition = IST_CONDITIONS[decreasing]
                 results[condition]['opens'].append(opens)
                 results[condition]['incorrect'].append(incorrect)
                 results[condition]['choicetime'].append(choicetime)
                 # calculate metrics
-                latency = choicetime/opens 
-                results[condition]['latency'].append(latency)
-                
-                # calculate the number of target color boxes opened
-                # by reading the pressed list
-        
-        pass
+                if opens:
+                    results[condition]['latency'].append(choicetime / opens)
+                if boxes:
+                    results[condition]['p_correct'].append(
+                        float(ist_probability_table(boxes)[chosen, other]))
+
+        info = {}
+        for condition, values in results.items():
+            trials = len(values['opens'])
+            if trials == 0:
+                continue
+            info[f"{condition}_trials"] = trials
+            info[f"{condition}_opens"] = sum(values['opens']) / trials
+            info[f"{condition}_incorrect"] = sum(values['incorrect'])
+            info[f"{condition}_choicetime"] = sum(values['choicetime']) / trials
+            for key in ['latency', 'p_correct']:
+                if values[key]:
+                    info[f"{condition}_{key}"] = sum(values[key]) / len(values[key])
+        return info
+
+    def ist_score_batch(self, sessions):
+        """
+        Analyze many IST sessions at once
+
+        The trials of all the sessions are put in one table, the latency and
+        p_correct of every trial are computed over the table and the means of
+        each session and condition are summed with np.bincount, giving the
+        same info as ist_score for each session. Sessions that ist_trial
+        cannot read are passed to ist_score.
+
+        Args:
+            sessions - list of IST task data, each a list of entries
+
+        Returns:
+            list of the info dict for each session
+        """
+        conditions = [IST_CONDITIONS[True], IST_CONDITIONS[False]]
+        # one row per trial
+        session = []
+        rows = []
+        fallback = set()
+        for i, entries in enumerate(sessions):
+            try:
+                trials = [self.ist_trial(entry) for entry in entries if 'pressed' in entry]
+            except (TypeError, KeyError, AttributeError):
+                fallback.add(i)
+                continue
+            session.extend([i] * len(trials))
+            rows.extend(trials)
+
+        try:
+            table = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        except (TypeError, ValueError):
+            # values that are not numbers
+            return [self.ist_score(entries) for entries in sessions]
+        decreasing, opens, incorrect, choicetime, boxes, chosen, other = table.T
+        # the group of a trial is its session and condition
+        group = np.array(session, dtype=np.int64) * 2 + (decreasing == 0)
+        groups = len(sessions) * 2
+
+        latency = np.full(len(table), np.nan)
+        np.divide(choicetime, opens, out=latency, where=opens > 0)
+        p_correct = np.full(len(table), np.nan)
+        for size in np.unique(boxes[boxes > 0]).astype(int):
+            trial = boxes == size
+            p_correct[trial] = ist_probability_table(size)[chosen[trial].astype(int),
+                                                           other[trial].astype(int)]
+
+        total = lambda values: np.bincount(group, weights=values, minlength=groups).tolist()
+        trials = np.bincount(group, minlength=groups).tolist()
+        sums = {'opens': total(opens), 'incorrect': total(incorrect), 'choicetime': total(choicetime)}
+        counts = {}
+        for key, values in [('latency', latency), ('p_correct', p_correct)]:
+            present = ~np.isnan(values)
+            sums[key] = np.bincount(group[present], weights=values[present], minlength=groups).tolist()
+            counts[key] = np.bincount(group[present], minlength=groups).tolist()
+
+        results = []
+        for i, entries in enumerate(sessions):
+            if i in fallback:
+                results.append(self.ist_score(entries))
+                continue
+            info = {}
+            for c, condition in enumerate(conditions):
+                g = i * 2 + c
+                if trials[g] == 0:
+                    continue
+                info[f"{condition}_trials"] = trials[g]
+                info[f"{condition}_opens"] = sums['opens'][g] / trials[g]
+                info[f"{condition}_incorrect"] = int(sums['incorrect'][g])
+                info[f"{condition}_choicetime"] = sums['choicetime'][g] / trials[g]
+                for key in ['latency', 'p_correct']:
+                    if counts[key][g]:
+                        info[f"{condition}_{key}"] = sums[key][g] / counts[key][g]
+            results.append(info)
+        return results
     
     def test_probability_calculation(self):
         
@@ -139,13 +354,17 @@ class ImpulsivityProcess:
         """
         if z <= 0 or a <= 0:
             return 0  # Handle invalid input
-
-        total_combinations = factorial(a) // (factorial(z) * factorial(a - z))
-        favorable_combinations = 0
-
-        for k in range(1, z + 1):
-            binomial_coeff = factorial(a) // (factorial(k) * factorial(a - k))
-            favorable_combinations += binomial_coeff
+        if z > a:
+            raise ValueError(f"cannot open {z} boxes out of {a}")
+
+        # the coefficients come from the precomputed tables up to the grid size
+        if a < len(BINOMIAL):
+            total_combinations = BINOMIAL[a][z]
+            # sum of C(a, k) for k from 1 to z
+            favorable_combinations = BINOMIAL_SUMS[a][z] - 1
+        else:
+            total_combinations = comb(a, z)
+            favorable_combinations = sum(comb(a, k) for k in range(1, z + 1))
 
         probability = favorable_combinations / total_combinations
         return probability
@@ -168,7 +387,7 @@ class ImpulsivityProcess:
         if z <= 0 or a <= 0:
             return 0  # Handle invalid input
 
-        total_combinations = factorial(a) // (factorial(z) * factorial(a - z))
+        total_combinations = comb(a, z)
         unfavorable_combinations = 1  # Only one combination where none are the chosen color
 
         probability = 1 - (unfavorable_combinations / total_combinations) 
@@ -180,51 +399,9 @@ class ImpulsivityProcess:
         Koffarnus and Bickel paper 2014 
         
         """
-        # conversion factor to hours
-        day2hours = 24
-        week2hours = 7 * day2hours
-        month2hours = 30 * day2hours
-        year2hours = 365 * day2hours
-        
         # index used is one index so first entry of list is zero
-        
-        hours = [
-            0, # 
-            1, # 1 hour
-            2, # 2 hours
-            3, # 3 hours
-            4, # 4 hours
-            6, # 6 hours
-            9, # 9 hours
-            12, # 12 hours
-            1*day2hours, # 1 day
-            1.5*day2hours, # 1.5 days
-            2*day2hours, # 2 days
-            3*day2hours, # 3 days
-            4*day2hours, # 4 days
-            1*week2hours, # 1 week
-            1.5*week2hours, # 1.5 weeks
-            2*week2hours, # 2 weeks
-            3*week2hours, # 3 weeks
-            1*month2hours, # 1 month
-            2*month2hours, # 2 months
-            3*month2hours, # 3 months
-            4*month2hours, # 4 months
-            6*month2hours, # 6 months
-            8*month2hours, # 8 months
-            1*year2hours, # 1 year
-            2*year2hours, # 2 years
-            3*year2hours, # 3 years
-            4*year2hours, # 4 years
-            5*year2hours, # 5 years
-            8*year2hours, # 8 years
-            12*year2hours, # 12 years
-            18*year2hours, # 18 years
-            25*year2hours, # 25 years
-        ]
-        
-        if index < len(hours):
-            return hours[index]
+        if 0 <= index < len(DELAY_HOURS):
+            return DELAY_HOURS[index]
         else:
             # error
             return None
@@ -234,26 +411,119 @@ class ImpulsivityProcess:
         Analyze the delay discounting task
 
         Args:
-            ddict  - dictionary of IST task
+            ddict  - dictionary of delay discounting task
             
         Results:
-            ED50 - the effective delay at which the subjective value of the
-            reward is 50% of the immediate reward, we return the log transform of the time
+            dd_trials - number of trials
+            dd_mean_rt - mean rt of the trials
+            dd_delay_index - index of the delay of the last trial where the
+                delayed reward was chosen
+            dd_ed50_hours - the effective delay at which the subjective value of the
+                reward is 50% of the immediate reward, in hours
+            dd_log_ed50 - log10 of dd_ed50_hours
+            empty when the delayed reward was never chosen
         """
-        total_entries = len(ddict)
+        trials = [entry for entry in ddict if 'delay' in entry]
         # determine the ED50 value
         # iterate starting with last entry and identifying when entry['delay] == True
-        for index in range(total_entries-1,0,-1):
-            entry = ddict[index]
+        time_index = None
+        for entry in reversed(trials):
             if entry['delay'] == True:
                 # get the index number
                 time_index = entry['index'][0]
                 break
+        if time_index is None:
+            return {}
         
         # get the hours for the time_index
         hours = self.get_hours_for_delay_discounting(time_index)
-        
-        pass    
+        rts = [entry['rt'] for entry in trials if isinstance(entry.get('rt', None), (int, float))]
+        return {
+            'dd_trials': len(trials),
+            'dd_mean_rt': sum(rts) / len(rts) if rts else None,
+            'dd_delay_index': time_index,
+            'dd_ed50_hours': hours,
+            'dd_log_ed50': DELAY_LOG_HOURS[time_index] if hours is not None else None,
+        }
+
+    def delaydiscounting_score_batch(self, sessions):
+        """
+        Analyze many delay discounting sessions at once
+
+        The trials of all the sessions are put in one table, the last trial
+        with the delayed reward chosen is found for each session with
+        np.maximum.at and the delay tables are indexed with the result,
+        giving the same info as delaydiscounting_score for each session.
+        Sessions with trials that cannot be read are passed to
+        delaydiscounting_score.
+
+        Args:
+            sessions - list of delay discounting task data, each a list of entries
+
+        Returns:
+            list of the info dict for each session
+        """
+        # the session, delay chosen, delay index and rt of each trial, the
+        # columns are filled directly so no object is made per trial
+        session = []
+        delay = []
+        index = []
+        rt = []
+        fallback = set()
+        for i, entries in enumerate(sessions):
+            start = len(session)
+            try:
+                for entry in entries:
+                    if 'delay' in entry:
+                        chosen = entry['delay'] == True
+                        time_index = entry['index'][0] if chosen else 0
+                        if not isinstance(time_index, int):
+                            raise TypeError(time_index)
+                        value = entry.get('rt', None)
+                        session.append(i)
+                        delay.append(chosen)
+                        index.append(time_index)
+                        rt.append(value if isinstance(value, (int, float)) else np.nan)
+            except (TypeError, KeyError, IndexError, AttributeError):
+                fallback.add(i)
+                # drop the trials of the session read so far
+                for column in (session, delay, index, rt):
+                    del column[start:]
+
+        session = np.array(session, dtype=np.int64)
+        delay = np.array(delay, dtype=bool)
+        index = np.array(index, dtype=np.int64)
+        rt = np.array(rt, dtype=np.float64)
+        position = np.arange(len(session))
+
+        trials = np.bincount(session, minlength=len(sessions)).tolist()
+        has_rt = ~np.isnan(rt)
+        rt_sum = np.bincount(session[has_rt], weights=rt[has_rt], minlength=len(sessions)).tolist()
+        rt_count = np.bincount(session[has_rt], minlength=len(sessions)).tolist()
+        # position of the last trial with the delayed reward chosen, -1 for none
+        last = np.full(len(sessions), -1, dtype=np.int64)
+        np.maximum.at(last, session[delay], position[delay])
+        last = last.tolist()
+        index = index.tolist()
+
+        results = []
+        for i, entries in enumerate(sessions):
+            if i in fallback:
+                results.append(self.delaydiscounting_score(entries))
+                continue
+            if last[i] < 0:
+                results.append({})
+                continue
+            time_index = index[last[i]]
+            hours = DELAY_HOURS[time_index] if 0 <= time_index < len(DELAY_HOURS) else None
+            results.append({
+                'dd_trials': trials[i],
+                'dd_mean_rt': rt_sum[i] / rt_count[i] if rt_count[i] else None,
+                'dd_delay_index': time_index,
+                'dd_ed50_hours': hours,
+                'dd_log_ed50': DELAY_LOG_HOURS[time_index] if hours is not None else None,
+            })
+        return results
     
     def gostop_score(self,ddict):
         """
@@ -374,8 +644,150 @@ class ImpulsivityProcess:
             }
         
         return info
+
+    def gostop_score_batch(self, sessions):
+        """
+        Analyze many GoStop sessions at once
+
+        The entries of all the sessions are put in one table and scored with
+        shifts over the table instead of a loop over the entries, giving the
+        same info as gostop_score for each session. This includes its quirks,
+        the entry after a scored stop entry is always skipped and at the end
+        of a session the look ahead entries are the ones last looked at.
+        Sessions that gostop_score cannot score (missing rt, no stop entries
+        or no entry to look ahead to) are passed to gostop_score.
+
+        Args:
+            sessions - list of GoStop task data, each a list of entries
+
+        Returns:
+            list of the info dict for each session
+        """
+        sizes = np.array([len(session) for session in sessions], dtype=np.int64)
+        total = int(sizes.sum())
+        if total == 0:
+            return [{} for session in sessions]
+
+        # type and correct of each entry as small integer codes, the dict
+        # lookups compare the same as == in gostop_score
+        entries = [entry for session in sessions for entry in session]
+        try:
+            kind = np.array([GOSTOP_TYPES.get(entry.get('type'), 0) for entry in entries],
+                            dtype=np.int8)
+            correct = np.array([GOSTOP_CORRECT.get(entry.get('correct'), 0) for entry in entries],
+                               dtype=np.int8)
+        except TypeError:
+            # unhashable values
+            return [self.gostop_score(session) for session in sessions]
+        is_true = correct == 1
+        is_false = correct == 2
+
+        # position of each entry in the table and in its session
+        idx = np.arange(total)
+        session = np.repeat(np.arange(len(sessions)), sizes)
+        starts = np.cumsum(sizes) - sizes
+        pos = idx - starts[session]
+        last = (sizes - 1)[session]
+
+        # a run of stop entries is scored every other entry from its start
+        # and the entry after a scored stop entry is skipped
+        is_stop = kind == GOSTOP_TYPES['stop']
+        prev_stop = np.zeros(total, dtype=bool)
+        prev_stop[1:] = is_stop[:-1]
+        prev_stop[pos == 0] = False
+        run_start = np.maximum.accumulate(np.where(is_stop & ~prev_stop, idx, 0))
+        scored_stop = is_stop & ((idx - run_start) % 2 == 0)
+        scored = np.ones(total, dtype=bool)
+        scored[1:] = ~scored_stop[:-1]
+        scored[pos == 0] = True
+
+        # index of the last scored entry before each entry, -1 for none
+        last_scored = np.full(total, -1, dtype=np.int64)
+        last_scored[1:] = np.maximum.accumulate(np.where(scored, idx, -1))[:-1]
+        last_scored[last_scored < starts[session]] = -1
+
+        # look ahead entries, at the end of a session gostop_score uses the
+        # ones set when it scored an earlier entry
+        next1 = idx + 1
+        tail1 = pos == last
+        next1[tail1] = np.where(last_scored[tail1] >= 0, last_scored[tail1] + 1, -1)
+        next2 = idx + 2
+        tail2 = pos >= last - 1
+        before2 = np.full(len(sessions), -1, dtype=np.int64)
+        has2 = sizes >= 2
+        before2[has2] = last_scored[(starts + sizes - 2)[has2]]
+        before2 = before2[session]
+        next2[tail2] = np.where(before2[tail2] >= 0, before2[tail2] + 2, -1)
+
+        def ahead(values, index, missing):
+            return np.where(index >= 0, values[np.maximum(index, 0)], missing)
+
+        next1_false = ahead(is_false, next1, False)
+        next2_false = ahead(is_false, next2, False)
+
+        novel = scored & (kind == GOSTOP_TYPES['novel'])
+        target = scored & (kind == GOSTOP_TYPES['target'])
+        stop = scored & is_stop
+
+        novel_incorrect = novel & (is_false | (is_true & next1_false))
+        novel_correct = novel & is_true & ~next1_false
+        target_correct = target & is_true
+        target_late = target & ~is_true & next1_false
+        target_incorrect = target & ~is_true & ~next1_false
+        stop_incorrect = stop & (is_false | next1_false | next2_false)
+
+        # reaction times, late responses add 500 ms for the stimulus
+        # only the rt of these entries is read
+        has_rt = target_correct | target_late
+        rt_index = np.where(target_correct, idx, next1)[has_rt]
+        reaction_time = np.full(total, np.nan)
+        reaction_time[has_rt] = [rt if isinstance(rt, (int, float)) else np.nan
+                                 for rt in (entries[i].get('rt', None) for i in rt_index)]
+        reaction_time[target_late] += 500
+
+        # entries which need a look ahead entry that gostop_score never set
+        undefined = ((novel & is_true) | (target & ~is_true) | (stop & ~is_false)) & (next1 < 0)
+        undefined |= stop & ~is_false & ~next1_false & (next2 < 0)
+
+        count = lambda mask: np.bincount(session[mask], minlength=len(sessions))
+        counts = {
+            'gs_novel_total': count(novel),
+            'gs_novel_correct': count(novel_correct),
+            'gs_novel_incorrect': count(novel_incorrect),
+            'gs_target_total': count(target),
+            'gs_target_correct': count(target_correct),
+            'gs_target_late': count(target_late),
+            'gs_target_incorrect': count(target_incorrect),
+            'gs_stop_total': count(stop),
+            'gs_stop_correct': count(stop & ~stop_incorrect),
+            'gs_stop_incorrect': count(stop_incorrect),
+        }
+        rt_count = count(has_rt)
+        rt_sum = np.bincount(session[has_rt], weights=reaction_time[has_rt],
+                             minlength=len(sessions))
+        fallback = (count(undefined) > 0) | (count(has_rt & np.isnan(reaction_time)) > 0)
+        fallback |= (rt_count > 0) & (counts['gs_stop_total'] == 0)
+
+        counts = {key: value.tolist() for key, value in counts.items()}
+        rt_sum = rt_sum.tolist()
+        rt_count = rt_count.tolist()
+        results = []
+        for i, session_data in enumerate(sessions):
+            if fallback[i]:
+                results.append(self.gostop_score(session_data))
+            elif rt_count[i] == 0:
+                results.append({})
+            else:
+                info = {key: value[i] for key, value in counts.items()}
+                info['gs_mean_reaction_time'] = rt_sum[i] / rt_count[i]
+                info['gs_stop_incorrect_ratio'] = info['gs_stop_incorrect'] / info['gs_stop_total']
+                results.append(info)
+
+        return results
     
     def read_csv(self):
+        # pandas is only needed here, not by the decoders
+        import pandas as pd
         with open(self.config['csvfile'], 'r') as file:
             self.data = pd.read_csv(file)
         pass